@@ -0,0 +1,227 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG, close_pool
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+# Contribuição atual dos jogos informados, calculada a partir de shots e games
+NEW_CONTRIBUTIONS_SQL = """
+    DROP TABLE IF EXISTS new_player_contributions, new_team_contributions;
+
+    CREATE TEMP TABLE new_player_contributions ON COMMIT DROP AS
+    SELECT s.game_id, g.season, s.player_id, s.team_id,
+           COALESCE(s.shot_zone, 'unknown') AS shot_zone,
+           COALESCE(s.shot_quarter, '') AS shot_quarter,
+           count(*) AS attempts,
+           count(*) FILTER (WHERE s.shot_made) AS makes,
+           COALESCE(sum(s.shot_distance::numeric(8, 2)), 0) AS distance_sum
+    FROM shots s
+    JOIN games g ON g.id = s.game_id
+    WHERE s.game_id = ANY(%(game_ids)s) AND g.season IS NOT NULL AND s.player_id IS NOT NULL AND s.team_id IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6;
+
+    CREATE TEMP TABLE new_team_contributions ON COMMIT DROP AS
+    SELECT g.id AS game_id, g.season, side.team_id,
+           1 AS games_played,
+           (side.points_for > side.points_against)::int AS wins,
+           side.points_for, side.points_against
+    FROM games g
+    CROSS JOIN LATERAL (VALUES
+        (g.home_team_id, g.home_team_score, g.away_team_score),
+        (g.away_team_id, g.away_team_score, g.home_team_score)
+    ) AS side (team_id, points_for, points_against)
+    WHERE g.id = ANY(%(game_ids)s) AND g.season IS NOT NULL AND side.team_id IS NOT NULL AND side.points_for IS NOT NULL;
+"""
+
+# Delta = contribuição nova - contribuição guardada no snapshot, somado às tabelas da temporada
+APPLY_DELTA_SQL = """
+    INSERT INTO season_player_shot_totals AS t
+        (season, player_id, team_id, shot_zone, shot_quarter, attempts, makes, distance_sum)
+    SELECT season, player_id, team_id, shot_zone, shot_quarter, sum(attempts), sum(makes), sum(distance_sum)
+    FROM (
+        SELECT season, player_id, team_id, shot_zone, shot_quarter, attempts, makes, distance_sum
+        FROM new_player_contributions
+        UNION ALL
+        SELECT season, player_id, team_id, shot_zone, shot_quarter, -attempts, -makes, -distance_sum
+        FROM game_player_contributions WHERE game_id = ANY(%(game_ids)s)
+    ) AS delta
+    GROUP BY 1, 2, 3, 4, 5
+    HAVING sum(attempts) <> 0 OR sum(makes) <> 0 OR sum(distance_sum) <> 0
+    ON CONFLICT (season, player_id, team_id, shot_zone, shot_quarter) DO UPDATE SET
+        attempts = t.attempts + EXCLUDED.attempts,
+        makes = t.makes + EXCLUDED.makes,
+        distance_sum = t.distance_sum + EXCLUDED.distance_sum;
+
+    INSERT INTO season_player_totals AS t (season, player_id, team_id, games_played, attempts, makes)
+    SELECT season, player_id, team_id, sum(games_played), sum(attempts), sum(makes)
+    FROM (
+        SELECT game_id, season, player_id, team_id, 1 AS games_played, sum(attempts) AS attempts, sum(makes) AS makes
+        FROM new_player_contributions GROUP BY 1, 2, 3, 4
+        UNION ALL
+        SELECT game_id, season, player_id, team_id, -1, -sum(attempts), -sum(makes)
+        FROM game_player_contributions WHERE game_id = ANY(%(game_ids)s) GROUP BY 1, 2, 3, 4
+    ) AS delta
+    GROUP BY 1, 2, 3
+    HAVING sum(games_played) <> 0 OR sum(attempts) <> 0 OR sum(makes) <> 0
+    ON CONFLICT (season, player_id, team_id) DO UPDATE SET
+        games_played = t.games_played + EXCLUDED.games_played,
+        attempts = t.attempts + EXCLUDED.attempts,
+        makes = t.makes + EXCLUDED.makes;
+
+    INSERT INTO season_team_totals AS t (season, team_id, games_played, wins, points_for, points_against)
+    SELECT season, team_id, sum(games_played), sum(wins), sum(points_for), sum(points_against)
+    FROM (
+        SELECT season, team_id, games_played, wins, points_for, points_against
+        FROM new_team_contributions
+        UNION ALL
+        SELECT season, team_id, -games_played, -wins, -points_for, -points_against
+        FROM game_team_contributions WHERE game_id = ANY(%(game_ids)s)
+    ) AS delta
+    GROUP BY 1, 2
+    HAVING sum(games_played) <> 0 OR sum(wins) <> 0 OR sum(points_for) <> 0 OR sum(points_against) <> 0
+    ON CONFLICT (season, team_id) DO UPDATE SET
+        games_played = t.games_played + EXCLUDED.games_played,
+        wins = t.wins + EXCLUDED.wins,
+        points_for = t.points_for + EXCLUDED.points_for,
+        points_against = t.points_against + EXCLUDED.points_against;
+
+    -- Only keys the old snapshot contributed to can have dropped to zero; matching
+    -- them by primary key avoids scanning the whole season tables on every flush
+    DELETE FROM season_player_shot_totals t
+    USING (
+        SELECT DISTINCT season, player_id, team_id, shot_zone, shot_quarter
+        FROM game_player_contributions WHERE game_id = ANY(%(game_ids)s)
+    ) AS k
+    WHERE (t.season, t.player_id, t.team_id, t.shot_zone, t.shot_quarter)
+        = (k.season, k.player_id, k.team_id, k.shot_zone, k.shot_quarter)
+      AND t.attempts = 0;
+    DELETE FROM season_player_totals t
+    USING (
+        SELECT DISTINCT season, player_id, team_id
+        FROM game_player_contributions WHERE game_id = ANY(%(game_ids)s)
+    ) AS k
+    WHERE (t.season, t.player_id, t.team_id) = (k.season, k.player_id, k.team_id) AND t.games_played = 0;
+    DELETE FROM season_team_totals t
+    USING (
+        SELECT DISTINCT season, team_id
+        FROM game_team_contributions WHERE game_id = ANY(%(game_ids)s)
+    ) AS k
+    WHERE (t.season, t.team_id) = (k.season, k.team_id) AND t.games_played = 0;
+
+    DELETE FROM game_player_contributions WHERE game_id = ANY(%(game_ids)s);
+    INSERT INTO game_player_contributions SELECT * FROM new_player_contributions;
+    DELETE FROM game_team_contributions WHERE game_id = ANY(%(game_ids)s);
+    INSERT INTO game_team_contributions SELECT * FROM new_team_contributions;
+"""
+
+# Agregados recalculados do zero, na mesma forma das tabelas da temporada
+EXPECTED_SQL = {
+    'season_player_shot_totals': """
+        SELECT g.season, s.player_id, s.team_id, COALESCE(s.shot_zone, 'unknown'), COALESCE(s.shot_quarter, ''),
+               count(*), count(*) FILTER (WHERE s.shot_made), COALESCE(sum(s.shot_distance::numeric(8, 2)), 0)
+        FROM shots s JOIN games g ON g.id = s.game_id
+        WHERE g.season IS NOT NULL AND s.player_id IS NOT NULL AND s.team_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+    """,
+    'season_player_totals': """
+        SELECT g.season, s.player_id, s.team_id, count(DISTINCT s.game_id), count(*), count(*) FILTER (WHERE s.shot_made)
+        FROM shots s JOIN games g ON g.id = s.game_id
+        WHERE g.season IS NOT NULL AND s.player_id IS NOT NULL AND s.team_id IS NOT NULL
+        GROUP BY 1, 2, 3
+    """,
+    'season_team_totals': """
+        SELECT g.season, side.team_id, count(*), count(*) FILTER (WHERE side.points_for > side.points_against),
+               sum(side.points_for), sum(side.points_against)
+        FROM games g
+        CROSS JOIN LATERAL (VALUES
+            (g.home_team_id, g.home_team_score, g.away_team_score),
+            (g.away_team_id, g.away_team_score, g.home_team_score)
+        ) AS side (team_id, points_for, points_against)
+        WHERE g.season IS NOT NULL AND side.team_id IS NOT NULL AND side.points_for IS NOT NULL
+        GROUP BY 1, 2
+    """,
+}
+
+AGGREGATE_COLUMNS = {
+    'season_player_shot_totals': 'season, player_id, team_id, shot_zone, shot_quarter, attempts, makes, distance_sum',
+    'season_player_totals': 'season, player_id, team_id, games_played, attempts, makes',
+    'season_team_totals': 'season, team_id, games_played, wins, points_for, points_against',
+}
+
+
+def refresh_games(db, game_ids):
+    """
+    Atualiza os agregados da temporada para os jogos informados, dentro da
+    transação do chamador: subtrai a contribuição guardada de cada jogo, soma a
+    atual e substitui o snapshot. Reaplicar o mesmo jogo não altera os totais.
+    """
+    game_ids = sorted(set(game_ids))
+    if not game_ids:
+        return
+    params = {'game_ids': game_ids}
+    # Serializa escritores concorrentes dos mesmos jogos
+    db.cur.execute("SELECT id FROM games WHERE id = ANY(%(game_ids)s) ORDER BY id FOR UPDATE;", params)
+    db.cur.execute(NEW_CONTRIBUTIONS_SQL, params)
+    db.cur.execute(APPLY_DELTA_SQL, params)
+
+
+def verify(db):
+    """Compara cada tabela da temporada com o recálculo completo. Retorna {tabela: linhas divergentes}."""
+    mismatches = {}
+    for table, expected in EXPECTED_SQL.items():
+        columns = AGGREGATE_COLUMNS[table]
+        db.cur.execute(
+            f"""
+            SELECT count(*) FROM (
+                (SELECT {columns} FROM {table} EXCEPT ALL ({expected}))
+                UNION ALL
+                (({expected}) EXCEPT ALL SELECT {columns} FROM {table})
+            ) AS diff;
+            """
+        )
+        mismatches[table] = db.cur.fetchone()[0]
+    return mismatches
+
+
+def rebuild(db):
+    """Descarta agregados e snapshots e reaplica todos os jogos."""
+    db.cur.execute(
+        """
+        TRUNCATE season_player_shot_totals, season_player_totals, season_team_totals,
+                 game_player_contributions, game_team_contributions;
+        SELECT id FROM games;
+        """
+    )
+    game_ids = [row[0] for row in db.cur.fetchall()]
+    refresh_games(db, game_ids)
+    return len(game_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica ou reconstrói os agregados por temporada.")
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--fix', action='store_true', help="Com 'verify': reconstrói se houver divergências.")
+    args = parser.parse_args()
+    exit_code = 0
+    try:
+        with DatabaseManager(DB_CONFIG) as db:
+            if args.command == 'rebuild':
+                print(f"Agregados reconstruídos a partir de {rebuild(db)} jogo(s).")
+            else:
+                mismatches = verify(db)
+                for table, count in mismatches.items():
+                    print(f"{table}: {count} linha(s) divergente(s)")
+                if any(mismatches.values()):
+                    if args.fix:
+                        print(f"Agregados reconstruídos a partir de {rebuild(db)} jogo(s).")
+                    else:
+                        exit_code = 1
+    finally:
+        close_pool()
+    sys.exit(exit_code)
@@ -0,0 +1,149 @@
+from nbb.items import PlayerItem, TeamItem
+from nbb.db_manager import DatabaseManager, DB_CONFIG
+from nbb.spool import SpoolWriter
+from scrapy import Request
+from scrapy.pipelines.images import ImagesPipeline
+from itemadapter import ItemAdapter
+import datetime
+import hashlib
+import logging
+import sys
+from pathlib import PurePosixPath
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+
+# Campo de URL de origem e campo de chave local para cada tipo de item com imagem.
+ASSET_FIELDS = {
+    TeamItem: ('logo', 'logo_key'),
+    PlayerItem: ('player_photo', 'photo_key'),
+}
+
+
+class AssetsPipeline(ImagesPipeline):
+    """
+    Baixa logos de equipes e fotos de jogadores uma única vez por URL.
+
+    Os arquivos são endereçados pelo hash do conteúdo (a mesma foto aparece em
+    todos os jogos do jogador) e as miniaturas são geradas conforme IMAGES_THUMBS.
+    Roda depois do NbbPipeline: a chave local é gravada em teams/players pelo
+    próprio banco, casando o URL com a tabela 'assets' (ver insert_asset e link_assets).
+    Os dois lados repetem a ligação depois do próprio commit, em outra transação:
+    como a thread de escrita do NbbPipeline e este pipeline gravam ao mesmo tempo,
+    só o último a confirmar enxerga as duas linhas.
+    URLs já registradas na tabela 'assets' só são baixadas de novo depois de
+    ASSETS_EXPIRES dias.
+
+    Em modo spool (DB_SPOOL_DIR) os assets baixados vão para o spool, como as
+    demais linhas, e um banco indisponível só faz as imagens serem baixadas de novo.
+    """
+
+    def __init__(self, *args, crawler=None, **kwargs):
+        super().__init__(*args, crawler=crawler, **kwargs)
+        self.assets_expires = datetime.timedelta(days=crawler.settings.getint('ASSETS_EXPIRES', 90))
+        self.known_assets = None
+        self.recorded_urls = set()
+        spool_dir = crawler.settings.get('DB_SPOOL_DIR')
+        self.spool = SpoolWriter(spool_dir, crawler.settings.getint('DB_SPOOL_ROTATE_ROWS', 50000)) if spool_dir else None
+
+    def close_spider(self, spider):
+        if self.spool is not None:
+            self.spool.close()
+
+    def load_known_assets(self):
+        """Carrega (uma vez por crawl) o mapa URL -> chave local já registrado no banco."""
+        if self.known_assets is None:
+            try:
+                with DatabaseManager(DB_CONFIG) as db:
+                    self.known_assets = db.fetch_assets()
+            except (Exception, SystemExit) as e:
+                if self.spool is None:
+                    raise
+                logger.warning(f"Banco indisponível em modo spool; todos os assets serão baixados: {e}")
+                self.known_assets = {}
+            logger.info(f"{len(self.known_assets)} assets já registrados carregados do banco.")
+        return self.known_assets
+
+    def asset_fields(self, item):
+        for item_class, fields in ASSET_FIELDS.items():
+            if isinstance(item, item_class):
+                return fields
+        return None
+
+    def is_fresh(self, url):
+        known = self.load_known_assets().get(url)
+        if not known:
+            return False
+        _, fetched_at = known
+        return datetime.datetime.now(datetime.timezone.utc) - fetched_at < self.assets_expires
+
+    def get_media_requests(self, item, info):
+        fields = self.asset_fields(item)
+        if fields is None:
+            return []
+        url = ItemAdapter(item).get(fields[0])
+        if not url or self.is_fresh(url):
+            return []
+        return [Request(url)]
+
+    def media_to_download(self, request, info, *, item=None):
+        # A URL já foi filtrada em get_media_requests; aqui sempre baixamos.
+        return None
+
+    def content_hash(self, request, response=None):
+        if response is not None:
+            return hashlib.sha1(response.body).hexdigest()
+        return hashlib.sha1(request.url.encode('utf-8')).hexdigest()
+
+    def file_path(self, request, response=None, info=None, *, item=None):
+        return f"full/{self.content_hash(request, response)}.jpg"
+
+    def thumb_path(self, request, thumb_id, response=None, info=None, *, item=None):
+        return f"thumbs/{thumb_id}/{self.content_hash(request, response)}.jpg"
+
+    def item_completed(self, results, item, info):
+        fields = self.asset_fields(item)
+        if fields is None:
+            return item
+
+        adapter = ItemAdapter(item)
+        url_field, key_field = fields
+        url = adapter.get(url_field)
+        downloaded = [result for ok, result in results if ok]
+
+        if downloaded:
+            storage_key = downloaded[0]['path']
+            if url not in self.recorded_urls:
+                self.record_asset(url, storage_key)
+        elif url in self.load_known_assets():
+            storage_key = self.known_assets[url][0]
+        else:
+            storage_key = None
+
+        if storage_key:
+            adapter[key_field] = storage_key
+        return item
+
+    def record_asset(self, url, storage_key):
+        content_hash = PurePosixPath(storage_key).stem
+        if self.spool is not None:
+            self.spool.write('assets', (url, content_hash, storage_key))
+            self.recorded_urls.add(url)
+            self.known_assets[url] = (storage_key, datetime.datetime.now(datetime.timezone.utc))
+            return
+        try:
+            with DatabaseManager(DB_CONFIG) as db:
+                db.insert_asset(url, content_hash, storage_key)
+            # De novo depois do commit: equipes/jogadores que a thread de escrita confirmou
+            # enquanto este asset ainda não era visível só aparecem para um novo comando
+            with DatabaseManager(DB_CONFIG) as db:
+                db.link_asset(url, storage_key)
+            self.recorded_urls.add(url)
+            self.known_assets[url] = (storage_key, datetime.datetime.now(datetime.timezone.utc))
+        except Exception as e:
+            logger.error(f"Erro ao registrar asset '{url}': {e}", exc_info=True)
@@ -0,0 +1,215 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG, UPSERTS, TABLE_ORDER, close_pool
+from nbb import aggregates, shot_arrays
+from collections import OrderedDict
+import psycopg2
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+
+class BatchWriter:
+    """
+    Acumula linhas por tabela e as grava em lotes, uma transação por flush.
+
+    Um lote que falha é dividido ao meio (sob um SAVEPOINT) até isolar as linhas
+    problemáticas, que vão para a tabela dead_letters com o erro; o restante do
+    lote segue normalmente. Linhas com a mesma chave de conflito são deduplicadas
+    no buffer (a última vence), o que o ON CONFLICT DO UPDATE em lote exige.
+
+    Como shots não tem chave natural, os arremessos já gravados de um jogo são
+    substituídos no primeiro flush que o contém nesta execução; assim recoletar
+    um jogo não duplica seus arremessos nem os agregados da temporada. Pelo
+    mesmo motivo, shot_counts guarda o maior número de arremessos já gravado
+    de cada jogo: um jogo recoletado em vários flushes só é notificado como
+    'shots_appended' quando passa desse número.
+    """
+
+    def __init__(self):
+        self.buffers = {table: OrderedDict() if UPSERTS[table].conflict else [] for table in TABLE_ORDER}
+        self.replaced_games = set()
+        self.shot_counts = {}
+        self.pending = 0
+        self.written = 0
+        self.dead_lettered = 0
+
+    def add(self, table, row):
+        buffer = self.buffers[table]
+        if isinstance(buffer, list):
+            buffer.append(row)
+            self.pending += 1
+            return
+        key = UPSERTS[table].key(row)
+        if key not in buffer:
+            self.pending += 1
+        buffer[key] = row
+
+    def flush(self):
+        """Grava todas as linhas pendentes, tabelas pai antes das filhas. Retorna os ids de jogos afetados."""
+        if not self.pending:
+            return set()
+
+        written = dead_lettered = 0
+        game_ids = set()
+        replaced_games = game_ids_of('shots', self.buffers['shots']) - self.replaced_games
+        # Os assets são ligados depois do commit (ver link_assets)
+        team_ids = [row[0] for row in self.buffers['teams'].values()]
+        player_ids = [row[0] for row in self.buffers['players'].values()]
+        with DatabaseManager(DB_CONFIG) as db:
+            previous = {
+                game_id: (season, home_score, away_score, max(shot_count, self.shot_counts.get(game_id, 0)))
+                for game_id, (season, home_score, away_score, shot_count) in db.game_states(
+                    game_ids_of('games', self.buffers['games'].values()) | game_ids_of('shots', self.buffers['shots'])
+                ).items()
+            }
+            for table in TABLE_ORDER:
+                rows = list(self.buffers[table].values()) if isinstance(self.buffers[table], OrderedDict) else self.buffers[table]
+                if not rows:
+                    continue
+                if table == 'shots' and replaced_games:
+                    db.cur.execute("DELETE FROM shots WHERE game_id = ANY(%s);", (list(replaced_games),))
+                rejected = self.write_rows(db, table, rows)
+                written += len(rows) - len(rejected)
+                dead_lettered += len(rejected)
+                for row, error in rejected:
+                    db.insert_dead_letter(table, row, error)
+                # Só os jogos das linhas gravadas (ou dos arremessos substituídos): um jogo
+                # rejeitado não existe em games e não tem o que atualizar
+                game_ids.update(game_ids_of(table, written_rows(rows, rejected)))
+            game_ids |= replaced_games
+            changes = refresh_games(db, game_ids, previous) if game_ids else []
+
+        # Só descarta os buffers depois do commit: se o flush falhar por inteiro, as linhas são retentadas.
+        for buffer in self.buffers.values():
+            buffer.clear()
+        self.pending = 0
+        self.replaced_games |= replaced_games
+        for game_id, state in previous.items():
+            self.shot_counts[game_id] = state[3]
+        for change in changes:
+            self.shot_counts[change['game_id']] = max(change['shot_count'], self.shot_counts.get(change['game_id'], 0))
+        self.written += written
+        self.dead_lettered += dead_lettered
+        if dead_lettered:
+            logger.warning(f"{dead_lettered} linha(s) enviada(s) para dead_letters neste lote.")
+        if team_ids or player_ids:
+            self.link_assets(team_ids, player_ids)
+        return game_ids
+
+    def link_assets(self, team_ids, player_ids):
+        """
+        Liga os assets às equipes/jogadores do lote em uma transação posterior ao
+        commit: um asset confirmado pelo AssetsPipeline durante a escrita não era
+        visível para ela, e as linhas deste lote não eram visíveis para ele.
+        """
+        try:
+            with DatabaseManager(DB_CONFIG) as db:
+                db.link_assets(team_ids, player_ids)
+        except Exception as e:
+            logger.error(f"Erro ao ligar os assets de {len(team_ids)} equipe(s) e {len(player_ids)} jogador(es): {e}", exc_info=True)
+
+    def write_rows(self, db, table, rows):
+        """
+        Grava as linhas em um único comando; em caso de erro divide o lote ao meio
+        recursivamente. Retorna a lista de (linha, erro) das linhas rejeitadas.
+        """
+        db.cur.execute("SAVEPOINT nbb_batch;")
+        try:
+            db.write_batch(table, rows)
+            db.cur.execute("RELEASE SAVEPOINT nbb_batch;")
+            return []
+        except psycopg2.Error as e:
+            db.cur.execute("ROLLBACK TO SAVEPOINT nbb_batch;")
+            if len(rows) == 1:
+                logger.error(f"Linha rejeitada em '{table}': {e}. Linha: {rows[0]}")
+                return [(rows[0], e)]
+        middle = len(rows) // 2
+        return self.write_rows(db, table, rows[:middle]) + self.write_rows(db, table, rows[middle:])
+
+
+def refresh_games(db, game_ids, previous=None):
+    """
+    Atualiza, na mesma transação da escrita, tudo o que deriva dos jogos reescritos:
+    agregados da temporada, arremessos empacotados e as notificações de mudança
+    (previous: db.game_states() lido antes da escrita). Retorna as mudanças publicadas.
+    """
+    aggregates.refresh_games(db, game_ids)
+    shot_arrays.refresh_games(db, game_ids)
+    return db.touch_games(game_ids, previous)
+
+
+def written_rows(rows, rejected):
+    """As linhas do lote que não foram para dead_letters."""
+    rejected_ids = {id(row) for row, _ in rejected}
+    return [row for row in rows if id(row) not in rejected_ids]
+
+
+def game_ids_of(table, rows):
+    if table == 'games':
+        return {row[0] for row in rows}
+    if table == 'shots':
+        return {row[UPSERTS['shots'].columns.index('game_id')] for row in rows}
+    return set()
+
+
+def replay_dead_letters(table=None, limit=None):
+    """
+    Reaplica as linhas pendentes de dead_letters (tabelas pai primeiro). As que
+    entram são marcadas com replayed_at; as que falham de novo têm o erro e o
+    número de tentativas atualizados. Retorna (reaplicadas, ainda_pendentes).
+    """
+    tables = [table] if table else TABLE_ORDER
+    replayed = failed = 0
+    with DatabaseManager(DB_CONFIG) as db:
+        for table_name in tables:
+            columns = UPSERTS[table_name].columns
+            db.cur.execute(
+                """
+                SELECT id, payload FROM dead_letters
+                WHERE table_name = %s AND replayed_at IS NULL
+                ORDER BY id
+                LIMIT %s;
+                """,
+                (table_name, limit)
+            )
+            pending = [(dead_letter_id, tuple(payload.get(column) for column in columns)) for dead_letter_id, payload in db.cur.fetchall()]
+            previous = db.game_states(game_ids_of(table_name, [row for _, row in pending]))
+            game_ids = set()
+            for dead_letter_id, row in pending:
+                db.cur.execute("SAVEPOINT nbb_replay;")
+                try:
+                    db.upsert(table_name, row)
+                    db.cur.execute("RELEASE SAVEPOINT nbb_replay;")
+                except psycopg2.Error as e:
+                    db.cur.execute("ROLLBACK TO SAVEPOINT nbb_replay;")
+                    db.cur.execute(
+                        "UPDATE dead_letters SET error = %s, attempts = attempts + 1 WHERE id = %s;",
+                        (str(e).strip(), dead_letter_id)
+                    )
+                    failed += 1
+                    continue
+                db.cur.execute("UPDATE dead_letters SET replayed_at = now() WHERE id = %s;", (dead_letter_id,))
+                game_ids.update(game_ids_of(table_name, [row]))
+                replayed += 1
+            if game_ids:
+                refresh_games(db, game_ids, previous)
+    return replayed, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reaplica as linhas guardadas em dead_letters.")
+    parser.add_argument('command', choices=['replay'])
+    parser.add_argument('--table', choices=TABLE_ORDER, help="Reaplicar apenas esta tabela.")
+    parser.add_argument('--limit', type=int, help="Máximo de linhas por tabela.")
+    args = parser.parse_args()
+    try:
+        replayed, failed = replay_dead_letters(args.table, args.limit)
+        print(f"{replayed} linha(s) reaplicada(s), {failed} ainda pendente(s).")
+    finally:
+        close_pool()
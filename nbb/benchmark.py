@@ -0,0 +1,360 @@
+from nbb.db_manager import (
+    DatabaseManager, DB_CONFIG, UPSERTS, close_pool,
+    team_row, player_row, player_team_by_season_row, game_row, stats_row, shot_row,
+)
+from nbb.items import TeamItem, PlayerItem, GameItem, ShotItem
+from nbb.schema import migrate
+from nbb.shot_enrichment import ZONE_PAINT, ZONE_MID_RANGE, ZONE_CORNER_THREE, ZONE_ABOVE_BREAK_THREE
+from nbb.spool import copy_value
+from psycopg2 import sql
+import numpy as np
+import psycopg2
+import argparse
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+FORMAT_VERSION = 1
+
+# Método de escrita do DatabaseManager e conversão item -> linha de cada tabela, na ordem de escrita
+WRITE_METHODS = {
+    'teams': ('insert_team', team_row),
+    'players': ('insert_player', player_row),
+    'player_teams_by_season': ('insert_player_team_by_season', player_team_by_season_row),
+    'games': ('insert_game', game_row),
+    'player_stats': ('insert_stats', stats_row),
+    'shots': ('insert_shot', shot_row),
+}
+
+# per_row: INSERT textual (sem PREPARE), um commit por linha
+# prepared: os insert_* do DatabaseManager (EXECUTE do upsert preparado), um commit por linha
+# batched: write_batch (o caminho do BatchWriter), um commit por lote
+# copy: COPY para uma tabela temporária + INSERT ... SELECT (o caminho do spool), um commit por lote
+VARIANTS = ('per_row', 'prepared', 'batched', 'copy')
+ROW_VARIANTS = ('per_row', 'prepared')
+# cold: tabelas vazias (TRUNCATE); warm: a mesma temporada escrita de novo sobre as tabelas cheias
+STATES = ('cold', 'warm')
+
+QUARTERS = ('1', '2', '3', '4', 'Total')
+LINEUP_SIZE = 12
+ZONES = (ZONE_PAINT, ZONE_MID_RANGE, ZONE_CORNER_THREE, ZONE_ABOVE_BREAK_THREE)
+STATS_VALUE_COLUMNS = tuple(
+    column for column in UPSERTS['player_stats'].columns
+    if column not in ('player_id', 'game_id', 'team_id', 'quarter', 'minutes_played')
+)
+
+
+def synthetic_season(teams=18, players_per_team=15, games=300, shots_per_game=140, seed=0):
+    """
+    Itens de uma temporada sintética, por tabela (players e player_teams_by_season
+    usam os mesmos PlayerItems, como no pipeline). Em cada jogo, cada equipe escala
+    até LINEUP_SIZE jogadores do elenco. Determinística para a mesma seed.
+    """
+    rng = random.Random(seed)
+    season = 'NBB 2023/2024'
+    team_items = []
+    for number in range(teams):
+        logo = f"https://lnb.com.br/wp-content/uploads/logos/time-{number}.png"
+        team_items.append(TeamItem(id=hashlib.md5(logo.encode('utf-8')).hexdigest(), name=f"Time {number}", logo=logo))
+
+    player_items = []
+    rosters = {}
+    for team_number, team in enumerate(team_items):
+        rosters[team['id']] = []
+        for number in range(players_per_team):
+            player_id = 10000 + team_number * 100 + number
+            rosters[team['id']].append(player_id)
+            player_items.append(PlayerItem(
+                player_id=player_id, player_name=f"Jogador {player_id}", player_number=str(number + 4),
+                player_photo=f"https://lnb.com.br/wp-content/uploads/atletas/{player_id}.png",
+                player_team_id=team['id'], season=season,
+            ))
+
+    game_items, stats_items, shot_items = [], [], []
+    first_day = datetime.date(2023, 10, 1)
+    for number in range(games):
+        game_id = 80000 + number
+        home, away = rng.sample(team_items, 2)
+        game_items.append(GameItem(
+            game_id=game_id, game_date=first_day + datetime.timedelta(days=number // 4),
+            game_time=datetime.time(rng.choice((17, 19, 20)), 0),
+            home_team_id=home['id'], away_team_id=away['id'],
+            home_team_score=rng.randint(60, 110), away_team_score=rng.randint(60, 110),
+            round=f"{number // 9 + 1}ª Rodada", stage='Fase de Classificação', season=season,
+            arena=f"Ginásio {home['name']}", link=f"https://lnb.com.br/partidas/{game_id}/",
+        ))
+        lineups = {
+            team['id']: rng.sample(rosters[team['id']], min(LINEUP_SIZE, players_per_team)) for team in (home, away)
+        }
+        for team_id, lineup in lineups.items():
+            for player_id in lineup:
+                for quarter in QUARTERS:
+                    stats = {column: rng.randint(0, 10) for column in STATS_VALUE_COLUMNS}
+                    stats.update(player_id=player_id, game_id=game_id, team_id=team_id, quarter=quarter,
+                                 minutes_played=round(rng.uniform(0, 12), 1))
+                    stats_items.append(stats)
+        for _ in range(shots_per_game):
+            team_id = rng.choice((home['id'], away['id']))
+            made = rng.random() < 0.45
+            shot_items.append(ShotItem(
+                player_id=rng.choice(lineups[team_id]), game_id=game_id, team_id=team_id,
+                shot_quarter=rng.choice(QUARTERS[:4]),
+                shot_time=datetime.time(rng.randint(0, 9), rng.randint(0, 59)),
+                shot_type=f"shot {'made' if made else 'miss'} {rng.choice(('p2', 'p3'))}",
+                shot_x_location=round(rng.uniform(0, 100), 2), shot_y_location=round(rng.uniform(0, 100), 2),
+                shot_made=made, shot_distance=round(rng.uniform(0, 9), 2), shot_zone=rng.choice(ZONES),
+            ))
+
+    return {
+        'teams': team_items,
+        'players': player_items,
+        'player_teams_by_season': player_items,
+        'games': game_items,
+        'player_stats': stats_items,
+        'shots': shot_items,
+    }
+
+
+def season_subset(season, games):
+    """A temporada restrita aos primeiros jogos (equipes e jogadores inteiros, para as chaves estrangeiras)."""
+    game_ids = {item['game_id'] for item in season['games'][:games]}
+    subset = dict(season)
+    subset['games'] = season['games'][:games]
+    subset['player_stats'] = [item for item in season['player_stats'] if item['game_id'] in game_ids]
+    subset['shots'] = [item for item in season['shots'] if item['game_id'] in game_ids]
+    return subset
+
+
+def create_database(name):
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+
+def drop_database(name, maintenance_database):
+    conn = psycopg2.connect(**{**DB_CONFIG, 'database': maintenance_database})
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {};").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+
+def truncate(db):
+    db.cur.execute(f"TRUNCATE {', '.join(WRITE_METHODS)} CASCADE;")
+    db.conn.commit()
+
+
+def wal_lsn(db):
+    db.cur.execute("SELECT pg_current_wal_lsn();")
+    lsn = db.cur.fetchone()[0]
+    db.conn.commit()
+    return lsn
+
+
+def wal_bytes_since(db, lsn):
+    db.cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)::bigint;", (lsn,))
+    size = db.cur.fetchone()[0]
+    db.conn.commit()
+    return size
+
+
+def copy_batch(db, table, rows):
+    """Grava o lote como o spool load: COPY para uma tabela temporária e um único INSERT ... SELECT."""
+    upsert = UPSERTS[table]
+    columns = ', '.join(upsert.columns)
+    db.cur.execute(
+        f"""
+        CREATE TEMP TABLE nbb_benchmark_stage ON COMMIT DROP AS
+        SELECT {columns} FROM {table} WITH NO DATA;
+        """
+    )
+    data = io.StringIO(''.join('\t'.join(copy_value(value) for value in row) + '\n' for row in rows))
+    db.cur.copy_expert(f"COPY nbb_benchmark_stage ({columns}) FROM STDIN;", data)
+    db.cur.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM nbb_benchmark_stage{upsert.on_conflict};")
+
+
+def run_table(db, variant, table, items, batch_size):
+    """
+    Escreve os itens de uma tabela com a variante e mede o tempo de cada
+    operação com o seu commit (uma linha nas variantes por linha, um lote nas
+    demais) e o WAL gerado.
+    """
+    method, to_row = WRITE_METHODS[table]
+    upsert = UPSERTS[table]
+    rows = [to_row(item) for item in items]
+    latencies = []
+    lsn = wal_lsn(db)
+    started = time.perf_counter()
+    if variant in ROW_VARIANTS:
+        write = getattr(db, method)
+        for item, row in zip(items, rows):
+            operation_started = time.perf_counter()
+            if variant == 'prepared':
+                write(item)
+            else:
+                db.cur.execute(upsert.sql, (row,))
+            db.conn.commit()
+            latencies.append(time.perf_counter() - operation_started)
+    else:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            operation_started = time.perf_counter()
+            if variant == 'batched':
+                db.write_batch(table, batch)
+            else:
+                copy_batch(db, table, batch)
+            db.conn.commit()
+            latencies.append(time.perf_counter() - operation_started)
+    elapsed = time.perf_counter() - started
+    wal_bytes = wal_bytes_since(db, lsn)
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (0.0, 0.0)
+    return {
+        'rows': len(rows),
+        'commits': len(latencies),
+        'seconds': round(elapsed, 6),
+        'rows_per_s': round(len(rows) / elapsed, 1) if elapsed else None,
+        'commits_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {'p50': round(float(p50), 4), 'p99': round(float(p99), 4)},
+        'wal_bytes': wal_bytes,
+        'wal_bytes_per_row': round(wal_bytes / len(rows), 1) if rows else None,
+    }
+
+
+def run(season, variants=VARIANTS, batch_size=500, per_row_games=30):
+    """
+    Roda cada variante sobre a temporada, cold e depois warm, tabela a tabela na
+    ordem de escrita. As variantes por linha usam só os primeiros per_row_games
+    jogos (um commit por linha não termina em tempo útil com a temporada inteira).
+    Retorna a lista de resultados.
+    """
+    results = []
+    row_season = season_subset(season, per_row_games)
+    with DatabaseManager(DB_CONFIG) as db:
+        for variant in variants:
+            items_by_table = row_season if variant in ROW_VARIANTS else season
+            truncate(db)
+            for state in STATES:
+                for table in WRITE_METHODS:
+                    result = {'variant': variant, 'state': state, 'table': table,
+                              **run_table(db, variant, table, items_by_table[table], batch_size)}
+                    logger.info(
+                        f"{variant}/{state}/{table}: {result['rows']} linha(s), {result['rows_per_s']} linhas/s, "
+                        f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms, "
+                        f"{result['wal_bytes']} bytes de WAL"
+                    )
+                    results.append(result)
+    return results
+
+
+def server_info():
+    with DatabaseManager(DB_CONFIG) as db:
+        db.cur.execute("SHOW server_version;")
+        version = db.cur.fetchone()[0]
+        db.cur.execute("SELECT name, setting FROM pg_settings WHERE name IN ('fsync', 'synchronous_commit', 'wal_level', 'shared_buffers');")
+        settings = dict(db.cur.fetchall())
+    return {'server_version': version, 'settings': settings}
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current):
+    """Linhas de texto com a razão (atual / base) de linhas/s e p99 de cada variante/estado/tabela."""
+    def key(result):
+        return (result['variant'], result['state'], result['table'])
+
+    before = {key(result): result for result in baseline['results']}
+    lines = [f"{'variante/estado/tabela':<45} {'linhas/s':>12} {'x':>7} {'p99 ms':>10} {'x':>7}"]
+    for result in current['results']:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        speedup = result['rows_per_s'] / old['rows_per_s'] if old['rows_per_s'] else float('nan')
+        p99_ratio = result['latency_ms']['p99'] / old['latency_ms']['p99'] if old['latency_ms']['p99'] else float('nan')
+        lines.append(
+            f"{'/'.join(key(result)):<45} {result['rows_per_s']:>12} {speedup:>7.2f} "
+            f"{result['latency_ms']['p99']:>10} {p99_ratio:>7.2f}"
+        )
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks dos métodos de escrita do DatabaseManager, em um banco descartável criado no servidor de DB_HOST."
+    )
+    parser.add_argument('command', choices=['run', 'compare'])
+    parser.add_argument('results', nargs='*', help="Com 'compare': arquivo base e arquivo atual.")
+    parser.add_argument('--variant', action='append', choices=VARIANTS, help="Variante (pode repetir; padrão: todas).")
+    parser.add_argument('--teams', type=int, default=18)
+    parser.add_argument('--players-per-team', type=int, default=15)
+    parser.add_argument('--games', type=int, default=300)
+    parser.add_argument('--shots-per-game', type=int, default=140)
+    parser.add_argument('--per-row-games', type=int, default=30, help="Jogos usados nas variantes com um commit por linha.")
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get('DB_BATCH_SIZE', '500')))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='benchmarks')
+    parser.add_argument('--keep', action='store_true', help="Não apaga o banco do benchmark no fim.")
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        if len(args.results) != 2:
+            parser.error("'compare' recebe dois arquivos: base e atual.")
+        print('\n'.join(compare(load_results(args.results[0]), load_results(args.results[1]))))
+        sys.exit(0)
+
+    if args.players_per_team < 1:
+        parser.error("--players-per-team precisa ser pelo menos 1.")
+    args.variant = args.variant or list(VARIANTS)
+    season = synthetic_season(args.teams, args.players_per_team, args.games, args.shots_per_game, args.seed)
+    maintenance_database = DB_CONFIG['database']
+    database = f"nbb_benchmark_{os.getpid()}"
+    create_database(database)
+    # Tudo o que abre conexões (pool, migrate) lê DB_CONFIG no uso: daqui em diante, só o banco descartável
+    DB_CONFIG['database'] = database
+    started = datetime.datetime.now()
+    try:
+        migrate()
+        info = server_info()
+        results = run(season, args.variant, args.batch_size, args.per_row_games)
+    finally:
+        close_pool()
+        if args.keep:
+            logger.info(f"Banco do benchmark mantido: '{database}'.")
+        else:
+            drop_database(database, maintenance_database)
+
+    report = {
+        'format_version': FORMAT_VERSION,
+        'started_at': started.isoformat(timespec='seconds'),
+        **info,
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('command', 'results', 'output_dir', 'keep')},
+        'rows': {table: len(items) for table, items in season.items()},
+        'results': results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"write-{started:%Y%m%dT%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    logger.info(f"Resultados gravados em '{path}' ({datetime.datetime.now() - started}).")
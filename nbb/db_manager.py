@@ -1,13 +1,15 @@
 import psycopg2
-from psycopg2 import sql
-from psycopg2.errors import UniqueViolation, NotNullViolation, InFailedSqlTransaction
+from psycopg2.errors import NotNullViolation, InFailedSqlTransaction
 from itemadapter import ItemAdapter
-import hashlib
 import logging
 import os
 from psycopg2.pool import ThreadedConnectionPool
 from psycopg2 import OperationalError
+from psycopg2.extras import execute_batch
+from psycopg2.extensions import connection as BaseConnection
+import json
 import sys
+import threading
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -31,31 +33,233 @@ except KeyError as e:
     raise SystemExit(f"Variável de ambiente obrigatória ausente: {e}")
 
 
-try:
-    POOL = ThreadedConnectionPool(minconn=1, maxconn=32, **DB_CONFIG)
-    logger.info("Pool de conexões criado com sucesso.")
-except OperationalError as e:
-    logger.critical(f"Erro ao criar pool de conexões: {e}", exc_info=True)
-    raise SystemExit(f"Não foi possível criar o pool de conexões: {e}")
+class NbbConnection(BaseConnection):
+    """
+    Conexão que lembra quais comandos já preparou (PREPARE). O conjunto vive no
+    próprio objeto da conexão, então sobrevive às idas e vindas do pool
+    (getconn/putconn); uma conexão nova, criada pelo pool, começa vazia.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+POOL = None
+POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """
+    Cria o pool de conexões no primeiro uso, e não na importação: um crawl em
+    modo spool (DB_SPOOL_DIR) roda sem nunca abrir conexões com o banco.
+    """
+    global POOL
+    with POOL_LOCK:
+        if POOL is None:
+            try:
+                POOL = ThreadedConnectionPool(minconn=1, maxconn=32, connection_factory=NbbConnection, **DB_CONFIG)
+                logger.info("Pool de conexões criado com sucesso.")
+            except OperationalError as e:
+                logger.critical(f"Erro ao criar pool de conexões: {e}", exc_info=True)
+                raise SystemExit(f"Não foi possível criar o pool de conexões: {e}")
+        return POOL
+
+# Quantos EXECUTE do upsert preparado são enviados por ida ao servidor em write_batch
+BATCH_PAGE_SIZE = int(os.environ.get('DB_BATCH_PAGE_SIZE', '100'))
+
+# Canal NOTIFY em que o pipeline publica, após o commit, o que mudou em cada jogo (ver nbb.notifications)
+GAME_CHANGES_CHANNEL = 'nbb_game_changes'
+CHANGE_NEW_GAME = 'new_game'
+CHANGE_SCORE_UPDATE = 'score_update'
+CHANGE_SHOTS_APPENDED = 'shots_appended'
+CHANGE_GAME_UPDATED = 'game_updated'  # reescrito sem jogo novo, placar novo ou arremessos novos
+CHANGE_KINDS = (CHANGE_NEW_GAME, CHANGE_SCORE_UPDATE, CHANGE_SHOTS_APPENDED, CHANGE_GAME_UPDATED)
 
 def close_pool():
-    """Fecha todas as conexões do pool."""
-    if POOL:
-        POOL.closeall()
-        logger.info("Pool de conexões fechado.")
+    """Fecha todas as conexões do pool (um uso posterior cria um pool novo)."""
+    global POOL
+    with POOL_LOCK:
+        if POOL:
+            POOL.closeall()
+            POOL = None
+            logger.info("Pool de conexões fechado.")
+
+
+class Upsert:
+    """
+    Descreve o comando de escrita de uma tabela: colunas na ordem das linhas (tuplas)
+    e chave de conflito (update=False: linhas já existentes são mantidas, DO NOTHING).
+    O comando é preparado uma vez por conexão (prepare_sql, com $1..$n) e executado
+    pelo nome (execute_sql); sql (VALUES %s) é a forma textual equivalente.
+    """
+    def __init__(self, table, columns, conflict=(), update=True):
+        self.table = table
+        self.columns = columns
+        self.conflict = conflict
+        self.conflict_indexes = [columns.index(column) for column in conflict]
+
+        on_conflict = ''
+        if conflict and not update:
+            on_conflict = f" ON CONFLICT ({', '.join(conflict)}) DO NOTHING"
+        elif conflict:
+            updates = [f"{column} = EXCLUDED.{column}" for column in columns if column not in conflict]
+            on_conflict = f" ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {', '.join(updates)}"
+        self.on_conflict = on_conflict
+        insert = f"INSERT INTO {table} ({', '.join(columns)})"
+        self.sql = f"{insert} VALUES %s{on_conflict}"
+
+        self.statement = f"nbb_upsert_{table}"
+        placeholders = ', '.join(f"${index}" for index in range(1, len(columns) + 1))
+        self.prepare_sql = f"PREPARE {self.statement} AS {insert} VALUES ({placeholders}){on_conflict}"
+        self.execute_sql = f"EXECUTE {self.statement} ({', '.join(['%s'] * len(columns))})"
+
+    def key(self, row):
+        """Chave de conflito da linha (None para tabelas só de inserção, como shots)."""
+        if not self.conflict:
+            return None
+        return tuple(row[index] for index in self.conflict_indexes)
+
+
+STATS_COLUMNS = (
+    'player_id', 'game_id', 'team_id', 'quarter', 'minutes_played', 'assist',
+    'points_attempts', 'points_made', 'defensive_rebounds', 'offensive_rebounds',
+    'three_points_attempts', 'three_points_made', 'two_points_attempts', 'two_points_made',
+    'free_throws_attempts', 'free_throws_made', 'steals', 'blocks',
+    'fouls_committed', 'fouls_received', 'total_errors', 'dunks',
+    'plus_minus_while_on_court', 'efficiency',
+)
+
+UPSERTS = {
+    # O primeiro id associado a uma chave externa é definitivo
+    'identity_registry': Upsert(
+        'identity_registry', ('entity', 'key_type', 'external_key', 'internal_id'),
+        conflict=('entity', 'key_type', 'external_key'), update=False,
+    ),
+    'teams': Upsert('teams', ('id', 'name', 'logo'), conflict=('id',)),
+    'players': Upsert('players', ('id', 'player_name', 'player_icon_url'), conflict=('id',)),
+    'player_teams_by_season': Upsert(
+        'player_teams_by_season', ('player_id', 'player_team_id', 'season', 'player_number'),
+        conflict=('player_id', 'player_team_id', 'season'),
+    ),
+    'games': Upsert(
+        'games',
+        ('id', 'game_date', 'game_time', 'home_team_id', 'away_team_id', 'home_team_score',
+         'away_team_score', 'round', 'stage', 'season', 'arena', 'link'),
+        conflict=('id',),
+    ),
+    'player_stats': Upsert('player_stats', STATS_COLUMNS, conflict=('player_id', 'game_id', 'quarter')),
+    'shots': Upsert(
+        'shots',
+        ('player_id', 'game_id', 'team_id', 'shot_quarter', 'shot_time',
+         'shot_type', 'shot_x_location', 'shot_y_location',
+         'shot_made', 'shot_distance', 'shot_zone'),
+    ),
+}
+
+# Ordem de escrita: tabelas referenciadas por chaves estrangeiras antes das que as referenciam
+TABLE_ORDER = ('identity_registry', 'teams', 'players', 'player_teams_by_season', 'games', 'player_stats', 'shots')
+
+
+def identity_row(identity_item):
+    adapter = ItemAdapter(identity_item)
+    row = (adapter.get('entity'), adapter.get('key_type'), adapter.get('external_key'), adapter.get('internal_id'))
+    if not all(row):
+        logger.warning(f"Dados faltando para identity_registry. Dados: {identity_item}")
+        return None
+    return row
+
+
+def team_row(team_item):
+    adapter = ItemAdapter(team_item)
+    if not adapter.get('id'):
+        logger.warning(f"Tentativa de inserir equipe sem ID. Dados: {team_item}")
+        return None
+    return (adapter.get('id'), adapter.get('name'), adapter.get('logo'))
+
+
+def player_row(player_item):
+    adapter = ItemAdapter(player_item)
+    if not adapter.get('player_id'):
+        logger.warning(f"Tentativa de inserir jogador sem ID. Dados: {player_item}")
+        return None
+    return (adapter.get('player_id'), adapter.get('player_name'), adapter.get('player_photo'))
+
+
+def player_team_by_season_row(player_item):
+    adapter = ItemAdapter(player_item)
+    row = (adapter.get('player_id'), adapter.get('player_team_id'), adapter.get('season'), adapter.get('player_number'))
+    if not all(row[:3]):
+        logger.warning(f"Dados faltando para player_teams_by_season (player_id, player_team_id ou season é NULL). Dados: {player_item}")
+        return None
+    return row
+
+
+def game_row(game_item):
+    adapter = ItemAdapter(game_item)
+    if not adapter.get('game_id'):
+        logger.warning(f"Tentativa de inserir jogo sem ID. Dados: {game_item}")
+        return None
+    return (
+        adapter.get('game_id'), adapter.get('game_date'), adapter.get('game_time'),
+        adapter.get('home_team_id'), adapter.get('away_team_id'),
+        adapter.get('home_team_score'), adapter.get('away_team_score'),
+        adapter.get('round'), adapter.get('stage'), adapter.get('season'),
+        adapter.get('arena'), adapter.get('link')
+    )
+
+
+def stats_row(stats_item):
+    adapter = ItemAdapter(stats_item)
+    missing_fields = [field for field in ('player_id', 'game_id', 'team_id', 'quarter') if not adapter.get(field)]
+    if missing_fields:
+        logger.error(f"Dados essenciais faltando para player_stats (campos NULL: {', '.join(missing_fields)}). Item: {stats_item}")
+        return None
+    return tuple(adapter.get(column) for column in STATS_COLUMNS)
+
+
+def shot_row(shot_item):
+    adapter = ItemAdapter(shot_item)
+    if not all([adapter.get('player_id'), adapter.get('game_id'), adapter.get('team_id')]):
+        logger.warning(f"Dados essenciais faltando para inserir arremesso (player_id, game_id ou team_id é NULL). Item: {shot_item}")
+        return None
+    return (
+        adapter.get('player_id'), adapter.get('game_id'), adapter.get('team_id'),
+        adapter.get('shot_quarter'), adapter.get('shot_time'), adapter.get('shot_type'),
+        adapter.get('shot_x_location'), adapter.get('shot_y_location'),
+        adapter.get('shot_made'), adapter.get('shot_distance'), adapter.get('shot_zone')
+    )
+
+
+def change_kinds(previous, game_id, state):
+    """Tipos de mudança de um jogo, comparando o estado atual com o anterior à escrita."""
+    if previous is None:
+        return [CHANGE_GAME_UPDATED]
+    _, home_score, away_score, shot_count = state
+    before = previous.get(game_id)
+    if before is None:
+        return [CHANGE_NEW_GAME] + ([CHANGE_SHOTS_APPENDED] if shot_count else [])
+    kinds = []
+    if (home_score, away_score) != tuple(before[1:3]):
+        kinds.append(CHANGE_SCORE_UPDATE)
+    if shot_count > before[3]:
+        kinds.append(CHANGE_SHOTS_APPENDED)
+    return kinds or [CHANGE_GAME_UPDATED]
 
 
 class DatabaseManager:
     """Gerencia uma única conexão e cursor de banco de dados para múltiplas operações."""
     def __init__(self, db_config):
         self.db_config = db_config
+        self.pool = None
         self.conn = None
         self.cur = None
 
     def __enter__(self):
         """Estabelece uma conexão e retorna o cursor ao entrar em um bloco 'with'."""
         try:
-            self.conn = POOL.getconn()
+            self.pool = get_pool()
+            self.conn = self.pool.getconn()
             self.conn.autocommit = False
             self.cur = self.conn.cursor()
             return self
@@ -73,137 +277,64 @@ class DatabaseManager:
             else: 
                 self.conn.rollback()
                 logger.error(f"Transação revertida devido a uma exceção: {exc_val}", exc_info=True)
-            POOL.putconn(self.conn)
+            self.pool.putconn(self.conn)
 
-    def create_tables(self):
+    def prepared(self, table):
         """
-        Cria todas as tabelas necessárias se elas ainda não existirem.
-        Este método é chamado uma vez em uma instância do DatabaseManager.
+        Retorna o Upsert da tabela, preparando-o nesta conexão no primeiro uso
+        (a tabela pode ainda não existir quando a conexão sai do pool pela primeira
+        vez). PREPARE não é transacional: um ROLLBACK posterior não o desfaz.
         """
-        try:
-            self.cur.execute("""
-                -- Table for teams (id is PRIMARY KEY, automatically indexed)
-                CREATE TABLE IF NOT EXISTS teams (
-                    id VARCHAR(100) PRIMARY KEY,
-                    name VARCHAR(50),
-                    logo TEXT
-                );
-                
-                CREATE TABLE IF NOT EXISTS players (
-                    id INTEGER PRIMARY KEY,
-                    player_name VARCHAR(50),
-                    -- CORREÇÃO: Coluna renomeada para 'player_icon_url' para consistência
-                    player_icon_url TEXT
-                );
-
-                -- Table for player's team per season (composite PRIMARY KEY, automatically indexed)
-                CREATE TABLE IF NOT EXISTS player_teams_by_season (
-                    player_id INTEGER REFERENCES players(id) NOT NULL,
-                    player_team_id VARCHAR(100) REFERENCES teams(id) NOT NULL,
-                    season VARCHAR(20) NOT NULL,
-                    player_number VARCHAR(10),
-                    PRIMARY KEY (player_id, player_team_id, season)
-                );
-                
-                -- Table for games (game_id is PRIMARY KEY, automatically indexed)
-                CREATE TABLE IF NOT EXISTS games (
-                    id INTEGER PRIMARY KEY,
-                    game_date DATE,
-                    game_time TIME,
-                    home_team_id VARCHAR(100) REFERENCES teams(id),
-                    away_team_id VARCHAR(100) REFERENCES teams(id),
-                    home_team_score INTEGER,
-                    away_team_score INTEGER,
-                    round VARCHAR(30),
-                    stage VARCHAR(30),
-                    season VARCHAR(20),
-                    arena VARCHAR(100),
-                    link TEXT
-                );
-
-                -- Table for player statistics in a game (composite PRIMARY KEY, automatically indexed)
-                CREATE TABLE IF NOT EXISTS player_stats (
-                    player_id INTEGER REFERENCES players(id) NOT NULL,
-                    game_id INTEGER REFERENCES games(id) NOT NULL,
-                    team_id VARCHAR(100) REFERENCES teams(id) NOT NULL, 
-                    quarter VARCHAR(10) NOT NULL, 
-                    minutes_played FLOAT,
-                    assist INTEGER,
-                    points_attempts INTEGER,
-                    points_made INTEGER,
-                    defensive_rebounds INTEGER,
-                    offensive_rebounds INTEGER,
-                    three_points_attempts INTEGER,
-                    three_points_made INTEGER,
-                    two_points_attempts INTEGER,
-                    two_points_made INTEGER,
-                    free_throws_attempts INTEGER,
-                    free_throws_made INTEGER,
-                    steals INTEGER,
-                    blocks INTEGER,
-                    fouls_committed INTEGER,
-                    fouls_received INTEGER,
-                    total_errors INTEGER,
-                    dunks INTEGER,
-                    plus_minus_while_on_court INTEGER,
-                    efficiency INTEGER,
-                    PRIMARY KEY (player_id, game_id, quarter)
-                );
-
-                -- Table for shots 
-                CREATE TABLE IF NOT EXISTS shots (
-                    id SERIAL PRIMARY KEY,
-                    player_id INTEGER REFERENCES players(id),
-                    game_id INTEGER REFERENCES games(id),
-                    team_id VARCHAR(100) REFERENCES teams(id),
-                    shot_quarter VARCHAR(10),
-                    shot_time TIME,
-                    shot_type VARCHAR(20),
-                    shot_x_location FLOAT,
-                    shot_y_location FLOAT
-                );
-
-                -- Table for play-by-play actions
-                CREATE TABLE IF NOT EXISTS play_by_play (
-                    id SERIAL PRIMARY KEY,
-                    game_id INTEGER REFERENCES games(id) NOT NULL, 
-                    player_id INTEGER REFERENCES players(id),
-                    team_id VARCHAR(100) REFERENCES teams(id), 
-                    quarter_time TIME,
-                    quarter VARCHAR(10) NOT NULL,
-                    home_score INTEGER NOT NULL,
-                    away_score INTEGER NOT NULL,
-                    play TEXT NOT NULL
-                );
-                
-            """)
-        except Exception as e:
-            logger.error(f"Erro ao criar tabelas: {e}", exc_info=True)
-            self.conn.rollback() 
-            raise 
+        spec = UPSERTS[table]
+        if spec.statement not in self.conn.prepared:
+            self.cur.execute(spec.prepare_sql)
+            self.conn.prepared.add(spec.statement)
+        return spec
+
+    def upsert(self, table, row):
+        """Executa o INSERT ... ON CONFLICT preparado da tabela para uma única linha."""
+        self.cur.execute(self.prepared(table).execute_sql, row)
+
+    def write_batch(self, table, rows):
+        """
+        Escreve várias linhas da tabela pelo upsert preparado, com vários EXECUTE por
+        ida ao servidor (execute_batch, BATCH_PAGE_SIZE por vez).
+        Não desfaz a transação em caso de erro: quem chama decide (ver nbb.batch_writer).
+        """
+        execute_batch(self.cur, self.prepared(table).execute_sql, rows, page_size=BATCH_PAGE_SIZE)
+
+    def stream(self, query, params=None, chunk_size=10000, name='nbb_stream'):
+        """
+        Executa a consulta em um cursor nomeado (do lado do servidor) e devolve
+        (colunas, lotes), onde lotes é um gerador de listas com até chunk_size linhas.
+        Só um lote fica na memória do cliente por vez.
+        """
+        cursor = self.conn.cursor(name=name)
+        cursor.itersize = chunk_size
+        cursor.execute(query, params)
+
+        first = cursor.fetchmany(chunk_size)
+        columns = cursor.description
+
+        def chunks():
+            try:
+                chunk = first
+                while chunk:
+                    yield chunk
+                    chunk = cursor.fetchmany(chunk_size)
+            finally:
+                cursor.close()
+
+        return columns, chunks()
 
     def insert_team(self, team_item):
         """Insere ou atualiza um registro de equipe."""
+        team_id = ItemAdapter(team_item).get('id')
         try:
-            adapter = ItemAdapter(team_item)
-            team_id = adapter.get('id')
-            name = adapter.get('name')
-            logo = adapter.get('logo')
-
-            if not team_id:
-                logger.warning(f"Tentativa de inserir equipe sem ID. Dados: {team_item}")
-                return 
-
-            self.cur.execute(
-                """
-                INSERT INTO teams (id, name, logo)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (id) DO UPDATE
-                SET name = EXCLUDED.name,
-                    logo = EXCLUDED.logo;
-                """,
-                (team_id, name, logo)
-            )
+            row = team_row(team_item)
+            if row is None:
+                return
+            self.upsert('teams', row)
         except (NotNullViolation, InFailedSqlTransaction, psycopg2.Error) as e:
             self.conn.rollback()
             logger.error(f"Erro ao inserir/atualizar equipe '{team_id}': {e}", exc_info=True)
@@ -216,27 +347,12 @@ class DatabaseManager:
 
     def insert_player(self, player_item):
         """Insere ou atualiza um registro de jogador."""
+        player_id = ItemAdapter(player_item).get('player_id')
         try:
-            adapter = ItemAdapter(player_item)
-            player_id = adapter.get('player_id')
-            player_name = adapter.get('player_name')
-            player_icon_url = adapter.get('player_icon_url')
-
-            if not player_id:
-                logger.warning(f"Tentativa de inserir jogador sem ID. Dados: {player_item}")
+            row = player_row(player_item)
+            if row is None:
                 return
-
-            self.cur.execute(
-                """
-                INSERT INTO players (id, player_name, player_icon_url)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (id) DO UPDATE
-                SET player_name = EXCLUDED.player_name,
-                    player_icon_url = EXCLUDED.player_icon_url;
-                """,
-            
-                (player_id, player_name, player_icon_url)
-            )
+            self.upsert('players', row)
         except (NotNullViolation, InFailedSqlTransaction, psycopg2.Error) as e:
             self.conn.rollback()
             logger.error(f"Erro ao inserir/atualizar jogador '{player_id}': {e}", exc_info=True)
@@ -248,26 +364,14 @@ class DatabaseManager:
 
     def insert_player_team_by_season(self, player_item):
         """Insere ou atualiza o time e número de um jogador para uma temporada específica."""
+        adapter = ItemAdapter(player_item)
+        player_id = adapter.get('player_id')
+        season = adapter.get('season')
         try:
-            adapter = ItemAdapter(player_item)
-            player_id = adapter.get('player_id')
-            player_team_id = adapter.get('player_team_id')
-            season = adapter.get('season')
-            player_number = adapter.get('player_number')
-
-            if not all([player_id, player_team_id, season]):
-                logger.warning(f"Dados faltando para player_teams_by_season (player_id, player_team_id ou season é NULL). Dados: {player_item}")
+            row = player_team_by_season_row(player_item)
+            if row is None:
                 return
-
-            self.cur.execute(
-                """
-                INSERT INTO player_teams_by_season (player_id, player_team_id, season, player_number)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (player_id, player_team_id, season) DO UPDATE 
-                SET player_number = EXCLUDED.player_number;
-                """,
-                (player_id, player_team_id, season, player_number)
-            )
+            self.upsert('player_teams_by_season', row)
         except (NotNullViolation, InFailedSqlTransaction, psycopg2.Error) as e:
             self.conn.rollback()
             logger.error(f"Erro ao inserir time do jogador para '{player_id}' na temporada '{season}': {e}", exc_info=True)
@@ -279,46 +383,12 @@ class DatabaseManager:
 
     def insert_game(self, game_item):
         """Insere ou atualiza um registro de jogo."""
+        game_id = ItemAdapter(game_item).get('game_id')
         try:
-            adapter = ItemAdapter(game_item)
-            game_id = adapter.get('game_id')
-            game_date = adapter.get('game_date')
-            game_time = adapter.get('game_time')
-
-            if not game_id:
-                logger.warning(f"Tentativa de inserir jogo sem ID. Dados: {game_item}")
+            row = game_row(game_item)
+            if row is None:
                 return
-
-            self.cur.execute(
-                """
-                INSERT INTO games (
-                    id, game_date, game_time,
-                    home_team_id, away_team_id, home_team_score, away_team_score,
-                    round, stage, season, arena, link
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE
-                SET game_date = EXCLUDED.game_date,
-                    game_time = EXCLUDED.game_time,
-                    home_team_id = EXCLUDED.home_team_id,
-                    away_team_id = EXCLUDED.away_team_id,
-                    home_team_score = EXCLUDED.home_team_score,
-                    away_team_score = EXCLUDED.away_team_score,
-                    round = EXCLUDED.round,
-                    stage = EXCLUDED.stage,
-                    season = EXCLUDED.season,
-                    arena = EXCLUDED.arena,
-                    link = EXCLUDED.link;
-                """,
-                
-                (
-                    game_id, game_date, game_time,
-                    adapter.get('home_team_id'), adapter.get('away_team_id'),
-                    adapter.get('home_team_score'), adapter.get('away_team_score'),
-                    adapter.get('round'), adapter.get('stage'), adapter.get('season'),
-                    adapter.get('arena'), adapter.get('link')
-                )
-            )
+            self.upsert('games', row)
         except (NotNullViolation, InFailedSqlTransaction, psycopg2.Error) as e:
             self.conn.rollback()
             logger.error(f"Erro ao inserir/atualizar jogo '{game_id}': {e}", exc_info=True)
@@ -330,73 +400,15 @@ class DatabaseManager:
 
     def insert_stats(self, stats_item):
         """Insere ou atualiza estatísticas de jogador para um jogo e quarto."""
+        adapter = ItemAdapter(stats_item)
+        player_id = adapter.get('player_id')
+        game_id = adapter.get('game_id')
+        quarter = adapter.get('quarter')
         try:
-            adapter = ItemAdapter(stats_item)
-            player_id = adapter.get('player_id')
-            game_id = adapter.get('game_id')
-            team_id = adapter.get('team_id')
-            quarter = adapter.get('quarter')
-
-            if not all([player_id, game_id, team_id, quarter]):
-                missing_fields = []
-                if not player_id: missing_fields.append('player_id')
-                if not game_id: missing_fields.append('game_id')
-                if not team_id: missing_fields.append('team_id')
-                if not quarter: missing_fields.append('quarter')
-                
-                logger.error(f"Dados essenciais faltando para player_stats (campos NULL: {', '.join(missing_fields)}). Item: {stats_item}")
-                return 
-
-            values_to_insert = (
-                player_id, game_id, team_id, quarter,
-                adapter.get('minutes_played'), adapter.get('assist'),
-                adapter.get('points_attempts'), adapter.get('points_made'),
-                adapter.get('defensive_rebounds'), adapter.get('offensive_rebounds'),
-                adapter.get('three_points_attempts'), adapter.get('three_points_made'),
-                adapter.get('two_points_attempts'), adapter.get('two_points_made'),
-                adapter.get('free_throws_attempts'), adapter.get('free_throws_made'),
-                adapter.get('steals'), adapter.get('blocks'),
-                adapter.get('fouls_committed'), adapter.get('fouls_received'),
-                adapter.get('total_errors'), adapter.get('dunks'),
-                adapter.get('plus_minus_while_on_court'), adapter.get('efficiency')
-            )
-            
-            self.cur.execute(
-                """
-                INSERT INTO player_stats (
-                    player_id, game_id, team_id, quarter, minutes_played, assist,
-                    points_attempts, points_made, defensive_rebounds, offensive_rebounds,
-                    three_points_attempts, three_points_made, two_points_attempts, two_points_made,
-                    free_throws_attempts, free_throws_made, steals, blocks,
-                    fouls_committed, fouls_received, total_errors, dunks,
-                    plus_minus_while_on_court, efficiency
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (player_id, game_id, quarter) DO UPDATE
-                SET minutes_played = EXCLUDED.minutes_played,
-                    assist = EXCLUDED.assist,
-                    points_attempts = EXCLUDED.points_attempts,
-                    points_made = EXCLUDED.points_made,
-                    defensive_rebounds = EXCLUDED.defensive_rebounds,
-                    offensive_rebounds = EXCLUDED.offensive_rebounds,
-                    three_points_attempts = EXCLUDED.three_points_attempts,
-                    three_points_made = EXCLUDED.three_points_made,
-                    two_points_attempts = EXCLUDED.two_points_attempts,
-                    two_points_made = EXCLUDED.two_points_made,
-                    free_throws_attempts = EXCLUDED.free_throws_attempts,
-                    free_throws_made = EXCLUDED.free_throws_made,
-                    steals = EXCLUDED.steals,
-                    blocks = EXCLUDED.blocks,
-                    fouls_committed = EXCLUDED.fouls_committed,
-                    fouls_received = EXCLUDED.fouls_received,
-                    total_errors = EXCLUDED.total_errors,
-                    dunks = EXCLUDED.dunks,
-                    plus_minus_while_on_court = EXCLUDED.plus_minus_while_on_court,
-                    efficiency = EXCLUDED.efficiency,
-                    team_id = EXCLUDED.team_id;
-                """,
-                values_to_insert
-            )
+            row = stats_row(stats_item)
+            if row is None:
+                return
+            self.upsert('player_stats', row)
         except (NotNullViolation, InFailedSqlTransaction, psycopg2.Error) as e:
             self.conn.rollback() 
             logger.error(f"Erro ao inserir/atualizar estatísticas para o jogador '{player_id}' no jogo '{game_id}', quarto '{quarter}': {e}", exc_info=True)
@@ -408,31 +420,14 @@ class DatabaseManager:
 
     def insert_shot(self, shot_item):
         """Insere um registro de arremesso."""
+        adapter = ItemAdapter(shot_item)
+        player_id = adapter.get('player_id')
+        game_id = adapter.get('game_id')
         try:
-            adapter = ItemAdapter(shot_item)
-            player_id = adapter.get('player_id')
-            game_id = adapter.get('game_id')
-            team_id = adapter.get('team_id') 
-
-          
-            if not all([player_id, game_id, team_id]): 
-                logger.warning(f"Dados essenciais faltando para inserir arremesso (player_id, game_id ou team_id é NULL). Item: {shot_item}")
+            row = shot_row(shot_item)
+            if row is None:
                 return
-
-            self.cur.execute(
-                """
-                INSERT INTO shots (
-                    player_id, game_id, team_id, shot_quarter, shot_time,
-                    shot_type, shot_x_location, shot_y_location
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s); 
-                """,
-                (
-                    player_id, game_id, adapter.get('team_id'), adapter.get('shot_quarter'),
-                    adapter.get('shot_time'), adapter.get('shot_type'),
-                    adapter.get('shot_x_location'), adapter.get('shot_y_location')
-                )
-            )
+            self.upsert('shots', row)
         except (NotNullViolation, InFailedSqlTransaction, psycopg2.Error) as e:
             self.conn.rollback()
             logger.error(f"Erro ao inserir arremesso para o jogador '{player_id}' no jogo '{game_id}': {e}", exc_info=True)
@@ -442,10 +437,124 @@ class DatabaseManager:
             logger.error(f"Erro inesperado ao inserir arremesso para o jogador '{player_id}' no jogo '{game_id}': {e}", exc_info=True)
             raise
 
+    def game_states(self, game_ids):
+        """Estado atual dos jogos: {game_id: (season, home_team_score, away_team_score, nº de arremessos)}."""
+        self.cur.execute(
+            """
+            SELECT g.id, g.season, g.home_team_score, g.away_team_score,
+                   (SELECT count(*) FROM shots s WHERE s.game_id = g.id)
+            FROM games g
+            WHERE g.id = ANY(%s);
+            """,
+            (list(game_ids),)
+        )
+        return {row[0]: row[1:] for row in self.cur.fetchall()}
+
+    def touch_games(self, game_ids, previous=None):
+        """
+        Marca os jogos como reescritos agora (games.ingested_at) e publica no canal
+        GAME_CHANGES_CHANNEL uma notificação por tipo de mudança de cada jogo.
+        previous é o game_states() lido antes da escrita, na mesma transação; sem ele,
+        toda mudança é publicada como CHANGE_GAME_UPDATED. As notificações só são
+        entregues quando a transação é confirmada. Retorna a lista de mudanças.
+        """
+        try:
+            self.cur.execute(
+                "UPDATE games SET ingested_at = now() WHERE id = ANY(%s) RETURNING id, home_team_id, away_team_id;",
+                (list(game_ids),)
+            )
+            teams = {row[0]: row[1:] for row in self.cur.fetchall()}
+            changes = []
+            for game_id, (season, home_score, away_score, shot_count) in sorted(self.game_states(game_ids).items()):
+                home_team_id, away_team_id = teams.get(game_id, (None, None))
+                for kind in change_kinds(previous, game_id, (season, home_score, away_score, shot_count)):
+                    changes.append({
+                        'game_id': game_id,
+                        'season': season,
+                        'home_team_id': home_team_id,
+                        'away_team_id': away_team_id,
+                        'kind': kind,
+                        'home_team_score': home_score,
+                        'away_team_score': away_score,
+                        'shot_count': shot_count,
+                    })
+            if changes:
+                self.cur.execute(
+                    "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload;",
+                    (GAME_CHANGES_CHANNEL, [json.dumps(change) for change in changes])
+                )
+            return changes
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            logger.error(f"Erro ao publicar as mudanças dos jogos {list(game_ids)}: {e}", exc_info=True)
+            raise
+
+    def insert_dead_letter(self, table, row, error):
+        """Guarda uma linha rejeitada pelo banco, com o erro, na tabela dead_letters."""
+        payload = dict(zip(UPSERTS[table].columns, row))
+        self.cur.execute(
+            """
+            INSERT INTO dead_letters (table_name, payload, error)
+            VALUES (%s, %s, %s);
+            """,
+            (table, json.dumps(payload, default=str), str(error).strip())
+        )
+
+    def link_assets(self, team_ids, player_ids):
+        """Copia para as equipes/jogadores informados a chave local dos assets já baixados de seus URLs."""
+        self.cur.execute(
+            """
+            UPDATE teams t SET logo_key = a.storage_key
+            FROM assets a
+            WHERE t.id = ANY(%s) AND a.url = t.logo AND t.logo_key IS DISTINCT FROM a.storage_key;
+
+            UPDATE players p SET photo_key = a.storage_key
+            FROM assets a
+            WHERE p.id = ANY(%s) AND a.url = p.player_icon_url AND p.photo_key IS DISTINCT FROM a.storage_key;
+            """,
+            (list(team_ids), list(player_ids))
+        )
+
+    def fetch_assets(self):
+        """Retorna um dicionário URL -> (storage_key, fetched_at) com todos os assets já baixados."""
+        try:
+            self.cur.execute("SELECT url, storage_key, fetched_at FROM assets;")
+            return {url: (storage_key, fetched_at) for url, storage_key, fetched_at in self.cur.fetchall()}
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            logger.error(f"Erro ao carregar assets: {e}", exc_info=True)
+            raise
+
+    def insert_asset(self, url, content_hash, storage_key):
+        """Registra ou atualiza o asset baixado de uma URL e grava a chave nas equipes/jogadores que o usam."""
+        try:
+            self.cur.execute(
+                """
+                INSERT INTO assets (url, content_hash, storage_key, fetched_at)
+                VALUES (%(url)s, %(content_hash)s, %(storage_key)s, now())
+                ON CONFLICT (url) DO UPDATE
+                SET content_hash = EXCLUDED.content_hash,
+                    storage_key = EXCLUDED.storage_key,
+                    fetched_at = EXCLUDED.fetched_at;
+                """,
+                {'url': url, 'content_hash': content_hash, 'storage_key': storage_key}
+            )
+            self.link_asset(url, storage_key)
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            logger.error(f"Erro ao registrar asset '{url}': {e}", exc_info=True)
+            raise
+
+    def link_asset(self, url, storage_key):
+        """Grava a chave local nas equipes/jogadores que usam o URL."""
+        self.cur.execute(
+            """
+            UPDATE teams SET logo_key = %(storage_key)s
+            WHERE logo = %(url)s AND logo_key IS DISTINCT FROM %(storage_key)s;
 
+            UPDATE players SET photo_key = %(storage_key)s
+            WHERE player_icon_url = %(url)s AND photo_key IS DISTINCT FROM %(storage_key)s;
+            """,
+            {'url': url, 'storage_key': storage_key}
+        )
 
-if __name__ == "__main__":
-    print("Tentando criar tabelas do banco de dados...")
-    with DatabaseManager(DB_CONFIG) as db_manager_setup:
-        db_manager_setup.create_tables()
-    print("Configuração do banco de dados completa (se nenhum erro ocorreu). Verifique db_inserts.log para detalhes.")
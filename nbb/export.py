@@ -0,0 +1,188 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG, close_pool
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '10000'))
+
+DATASETS = {
+    'shots': """
+        SELECT g.season, g.id AS game_id, g.game_date, g.stage, g.round,
+               g.home_team_id, g.away_team_id, s.id AS shot_id,
+               s.team_id, t.name AS team_name, s.player_id, p.player_name,
+               s.shot_quarter, s.shot_time, s.shot_type, s.shot_made,
+               s.shot_distance, s.shot_zone, s.shot_x_location, s.shot_y_location
+        FROM shots s
+        JOIN games g ON g.id = s.game_id
+        LEFT JOIN teams t ON t.id = s.team_id
+        LEFT JOIN players p ON p.id = s.player_id
+        WHERE g.season = %(season)s {games_filter}
+        ORDER BY g.id, s.id
+    """,
+    'games': """
+        SELECT g.season, g.id AS game_id, g.game_date, g.game_time, g.stage, g.round, g.arena,
+               g.home_team_id, ht.name AS home_team_name, g.home_team_score,
+               g.away_team_id, at.name AS away_team_name, g.away_team_score, g.link
+        FROM games g
+        LEFT JOIN teams ht ON ht.id = g.home_team_id
+        LEFT JOIN teams at ON at.id = g.away_team_id
+        WHERE g.season = %(season)s {games_filter}
+        ORDER BY g.id
+    """,
+}
+
+
+class CsvExport:
+    extension = '.csv.gz'
+
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.name for column in columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlExport:
+    extension = '.jsonl.gz'
+
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.names = [column.name for column in columns]
+
+    def write(self, rows):
+        self.file.writelines(
+            json.dumps(dict(zip(self.names, row)), default=str, ensure_ascii=False) + '\n' for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExport:
+    """Escreve um row group por lote. Requer o pacote opcional pyarrow."""
+    extension = '.parquet'
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Exportação em Parquet requer o pacote 'pyarrow' (pip install pyarrow).")
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([(column.name, arrow_type(pyarrow, column.type_code)) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+def arrow_type(pa, type_code):
+    """Tipo Arrow correspondente ao OID do PostgreSQL (texto para os demais)."""
+    return {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1700: pa.float64(),
+        1082: pa.date32(),
+        1083: pa.time64('us'),
+        1114: pa.timestamp('us'),
+        1184: pa.timestamp('us', tz='UTC'),
+    }.get(type_code, pa.string())
+
+
+FORMATS = {'csv': CsvExport, 'jsonl': JsonlExport, 'parquet': ParquetExport}
+
+
+def export_part(dataset, fmt, season, path, game_ids=None, chunk_size=CHUNK_SIZE):
+    """
+    Exporta o dataset da temporada (ou apenas dos jogos informados) para um arquivo,
+    lote a lote a partir de um cursor do servidor. Retorna o número de linhas escritas.
+    """
+    query = DATASETS[dataset].format(games_filter='AND g.id = ANY(%(game_ids)s)' if game_ids is not None else '')
+    params = {'season': season, 'game_ids': game_ids}
+    written = 0
+    with DatabaseManager(DB_CONFIG) as db:
+        columns, chunks = db.stream(query, params, chunk_size, name=f"nbb_export_{dataset}")
+        output = FORMATS[fmt](path, columns)
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            output.close()
+    return written
+
+
+def season_game_ids(season):
+    with DatabaseManager(DB_CONFIG) as db:
+        db.cur.execute("SELECT id FROM games WHERE season = %s ORDER BY id;", (season,))
+        return [row[0] for row in db.cur.fetchall()]
+
+
+def export(dataset, fmt, season, output_dir, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Exporta a temporada para output_dir. Com workers > 1 os jogos são divididos
+    entre threads, cada uma com sua conexão, seu cursor e seu arquivo (part-NN).
+    Retorna a lista de arquivos gerados e o total de linhas.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    base = f"{dataset}-{season.replace('/', '-').replace(' ', '_')}"
+    extension = FORMATS[fmt].extension
+
+    if workers <= 1:
+        path = os.path.join(output_dir, base + extension)
+        return [path], export_part(dataset, fmt, season, path, chunk_size=chunk_size)
+
+    game_ids = season_game_ids(season)
+    shards = [game_ids[index::workers] for index in range(workers)]
+    paths = [os.path.join(output_dir, f"{base}.part-{index:02d}{extension}") for index in range(len(shards))]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nbb-export') as executor:
+        counts = list(executor.map(
+            lambda shard_path: export_part(dataset, fmt, season, shard_path[1], shard_path[0], chunk_size),
+            zip(shards, paths),
+        ))
+    return paths, sum(counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta uma temporada em streaming, com memória constante.")
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--season', required=True, help="Valor de games.season (ex.: 'NBB 2023/2024').")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--output-dir', default=os.environ.get('EXPORT_DIR', 'exports'))
+    parser.add_argument('--workers', type=int, default=1, help="Divide os jogos entre N conexões/arquivos.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    started = datetime.datetime.now()
+    try:
+        paths, rows = export(args.dataset, args.format, args.season, args.output_dir, args.workers, args.chunk_size)
+    finally:
+        close_pool()
+    logger.info(f"{rows} linha(s) exportada(s) em {datetime.datetime.now() - started}: {', '.join(paths)}")
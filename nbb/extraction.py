@@ -0,0 +1,185 @@
+from nbb.item_loaders.games_loaders import GameLoader
+from nbb.item_loaders.player_loader import PlayerLoader
+from nbb.item_loaders.shots_loaders import ShotLoader
+from nbb.item_loaders.team_loader import TeamLoader
+from nbb.shot_enrichment import ShotEnricher
+from itemloaders.processors import Identity, Join, MapCompose, TakeFirst
+from itemloaders.utils import arg_to_iter
+from parsel import Selector
+from parsel.csstranslator import HTMLTranslator
+from lxml import etree
+
+_translator = HTMLTranslator()
+
+
+def compile_css(css):
+    """Compila um seletor CSS (com ::text / ::attr) em um XPath do lxml."""
+    return etree.XPath(_translator.css_to_xpath(css), smart_strings=False)
+
+
+def compile_input(processor):
+    """Transforma o processador de entrada do loader em uma tupla de funções (MapCompose)."""
+    if isinstance(processor, MapCompose):
+        return processor.functions
+    if isinstance(processor, Identity):
+        return ()
+    return (processor,)
+
+
+def compile_output(processor):
+    """Transforma o processador de saída do loader em uma função lista -> valor."""
+    if isinstance(processor, TakeFirst):
+        return take_first
+    if isinstance(processor, Join):
+        separator = processor.separator
+        return separator.join
+    return processor
+
+
+def take_first(values):
+    for value in values:
+        if value is not None and value != '':
+            return value
+    return None
+
+
+class CompiledExtractor:
+    """
+    Especificação declarativa de extração de um tipo de item, compilada uma única vez.
+
+    Cada campo é associado a um seletor CSS (ou None para valores passados pelo
+    spider, como ids de equipe e temporada). Os seletores viram XPaths compilados
+    pelo lxml e os conversores vêm do ItemLoader correspondente, de modo que a
+    saída é idêntica à dos loaders, sem instanciar um ItemLoader e um
+    SelectorList por campo em cada linha.
+    """
+
+    def __init__(self, loader_class, fields):
+        self.loader_class = loader_class
+        self.specs = dict(fields)
+        self.item_class = loader_class.default_item_class
+        self.fields = []
+        for name, css in fields.items():
+            input_processor = getattr(loader_class, f'{name}_in', None) or loader_class.default_input_processor
+            output_processor = getattr(loader_class, f'{name}_out', None) or loader_class.default_output_processor
+            self.fields.append((
+                name,
+                compile_css(css) if css else None,
+                compile_input(input_processor),
+                compile_output(output_processor),
+            ))
+
+    def extract(self, selector, **values):
+        """
+        Monta o item a partir do Selector da linha. Campos sem seletor recebem os
+        valores passados por palavra-chave (equivalente a add_value).
+        """
+        root = selector.root
+        item = self.item_class()
+        for name, xpath, functions, output in self.fields:
+            if xpath is not None:
+                field_values = [str(value) for value in xpath(root)]
+            else:
+                field_values = arg_to_iter(values.get(name))
+            for function in functions:
+                next_values = []
+                for value in field_values:
+                    next_values += arg_to_iter(function(value))
+                field_values = next_values
+            if not field_values:
+                continue
+            value = output(field_values)
+            if value is not None:
+                item[name] = value
+        return item
+
+
+HOME_TEAM = CompiledExtractor(TeamLoader, {
+    'name': 'td.home_team_value.show-for-medium span.team-shortname::text',
+    'logo': 'td.logo_home_team.show-for-medium img::attr(src)',
+})
+
+AWAY_TEAM = CompiledExtractor(TeamLoader, {
+    'name': 'td.visitor_team_value.show-for-medium span.team-shortname::text',
+    'logo': 'td.logo_visitor_team.show-for-medium img::attr(src)',
+})
+
+GAME = CompiledExtractor(GameLoader, {
+    'game_id': 'td::attr(data-real-id)',
+    'home_team_id': None,
+    'away_team_id': None,
+    'game_date': 'td.date_value.show-for-medium span::text',
+    'game_time': 'td.date_value.show-for-medium span:nth-child(2)::text',
+    'home_team_score': 'td.score_value.show-for-medium span.home::text',
+    'away_team_score': 'td.score_value.show-for-medium span.away::text',
+    'round': 'td.game_value.hide_value span::text',
+    'stage': 'td.stage_value.hide_value::text',
+    'season': 'td.champ_value.hide_value::text',
+    'arena': 'td.gym_value.hide_value::text',
+    'link': 'td.score_value a.match_score_relatorio::attr(href)',
+})
+
+PLAYER = CompiledExtractor(PlayerLoader, {
+    'player_number': 'div.number::text',
+    'player_name': 'div.name::text',
+    'player_id': '::attr(idj)',
+    'player_photo': '::attr(avatar)',
+    'player_team_id': None,
+    'season': None,
+})
+
+SHOT = CompiledExtractor(ShotLoader, {
+    'player_id': '::attr(idj)',
+    'shot_quarter': '::attr(idp)',
+    'shot_type': '::attr(class)',
+    'shot_time': '::attr(time)',
+    'shot_x_location': '::attr(style)',
+    'shot_y_location': '::attr(style)',
+    'game_id': None,
+    'team_id': None,
+})
+
+SHOT_SIDE = compile_css('::attr(ide)')
+
+AWAY_PLAYERS_CSS = "div.graphic_move div.players_block.players_block_right li"
+HOME_PLAYERS_CSS = "div.graphic_move div.players_block.players_block_left li"
+SHOTS_CSS = "div.graphic_gym li"
+
+
+def extract_players(selector, home_team_id, away_team_id, season):
+    """PlayerItems dos dois elencos da página do jogo (visitante primeiro)."""
+    items = []
+    for css, team_id in ((AWAY_PLAYERS_CSS, away_team_id), (HOME_PLAYERS_CSS, home_team_id)):
+        for player in selector.css(css):
+            items.append(PLAYER.extract(player, player_team_id=team_id, season=season))
+    return items
+
+
+def extract_shots(selector, game_id, home_team_id, away_team_id):
+    """ShotItems da página do jogo; o atributo ide diz o lado (1 = casa, 2 = visitante)."""
+    teams = {'1': home_team_id, '2': away_team_id}
+    items = []
+    for shot in selector.css(SHOTS_CSS):
+        team_id = teams.get(next(iter(SHOT_SIDE(shot.root)), None))
+        items.append(SHOT.extract(shot, game_id=game_id, team_id=team_id))
+    return items
+
+
+_enrichers = {}
+
+
+def parse_game_report(body, encoding, meta, made_tokens, missed_tokens):
+    """
+    Extrai jogadores e arremessos (já enriquecidos) do HTML de uma página de jogo.
+    Função pura, executada nos processos de PARSE_PROCESSES: recebe bytes e
+    valores simples e devolve listas de dicts, baratas de serializar entre processos.
+    """
+    key = (tuple(made_tokens), tuple(missed_tokens))
+    if key not in _enrichers:
+        _enrichers[key] = ShotEnricher(made_tokens, missed_tokens)
+    selector = Selector(text=body.decode(encoding, errors='replace'))
+    players = extract_players(selector, meta['home_team_id'], meta['away_team_id'], meta['season'])
+    shots = _enrichers[key].enrich_items(
+        extract_shots(selector, meta['game_id'], meta['home_team_id'], meta['away_team_id'])
+    )
+    return [dict(item) for item in players], [dict(item) for item in shots]
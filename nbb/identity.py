@@ -0,0 +1,118 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG
+from nbb.items import IdentityItem
+import csv
+import hashlib
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+TEAM = 'team'
+PLAYER = 'player'
+LOGO_URL = 'logo_url'
+SHORT_NAME = 'short_name'
+IDJ = 'idj'
+
+# Cópia do registro dentro do diretório do spool, lida pelos crawls em modo spool (que não acessam o banco)
+SNAPSHOT_FILE = 'identity_snapshot.tsv'
+SNAPSHOT_COLUMNS = ('entity', 'key_type', 'external_key', 'internal_id')
+
+
+def snapshot_path(directory):
+    return os.path.join(directory, SNAPSHOT_FILE)
+
+
+def fallback_team_id(logo_url):
+    """Id de uma equipe ainda não registrada: o md5 do URL do logo (o id de antes do registro)."""
+    return hashlib.md5(logo_url.encode('utf-8')).hexdigest()
+
+
+class IdentityRegistry:
+    """
+    Mapa em memória (entidade, tipo de chave, chave externa) -> id interno,
+    carregado de identity_registry uma vez por crawl; resolver um id é uma
+    consulta ao dict. Chaves novas entram no mapa na hora e ficam pendentes até
+    drain(), que as devolve como IdentityItems para o pipeline gravá-las em lote
+    junto com os demais itens.
+    """
+
+    def __init__(self, ids=None):
+        self.ids = dict(ids or {})
+        self.pending = []
+
+    @classmethod
+    def load(cls):
+        with DatabaseManager(DB_CONFIG) as db:
+            db.cur.execute("SELECT entity, key_type, external_key, internal_id FROM identity_registry;")
+            registry = cls({(entity, key_type, key): internal_id for entity, key_type, key, internal_id in db.cur.fetchall()})
+        logger.info(f"{len(registry.ids)} chave(s) externa(s) carregada(s) do registro de identidades.")
+        return registry
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """Registro a partir de um snapshot gravado por save_snapshot (OSError se o arquivo não existir)."""
+        with open(path, encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter='\t')
+            header = tuple(next(reader, ()))
+            if header != SNAPSHOT_COLUMNS:
+                raise ValueError(f"Colunas inesperadas no snapshot '{path}': {header}")
+            registry = cls({(entity, key_type, key): internal_id for entity, key_type, key, internal_id in reader})
+        logger.info(f"{len(registry.ids)} chave(s) externa(s) carregada(s) do snapshot '{path}'.")
+        return registry
+
+    def save_snapshot(self, path):
+        """Grava todas as chaves conhecidas (inclusive as ainda pendentes); o arquivo só é trocado no fim."""
+        with open(path + '.part', 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(SNAPSHOT_COLUMNS)
+            writer.writerows(key + (internal_id,) for key, internal_id in sorted(self.ids.items()))
+        os.replace(path + '.part', path)
+        logger.info(f"Snapshot do registro de identidades gravado em '{path}' ({len(self.ids)} chave(s)).")
+
+    def team_id(self, logo_url, short_name):
+        """
+        Id da equipe: pelo URL do logo; se o logo for novo, pelo nome curto (a
+        equipe trocou de logo); se os dois forem novos, fallback_team_id(logo).
+        As chaves ainda não registradas passam a apontar para o id resolvido.
+        """
+        team_id = self.ids.get((TEAM, LOGO_URL, logo_url)) or self.ids.get((TEAM, SHORT_NAME, short_name))
+        if team_id is None:
+            if not logo_url:
+                return None
+            team_id = fallback_team_id(logo_url)
+        if logo_url:
+            self.register(TEAM, LOGO_URL, logo_url, team_id)
+        if short_name:
+            self.register(TEAM, SHORT_NAME, short_name, team_id)
+        return team_id
+
+    def player_id(self, idj):
+        """Id do jogador a partir do idj do site (um jogador novo fica com o próprio idj)."""
+        if idj is None:
+            return None
+        key = (PLAYER, IDJ, str(idj))
+        player_id = self.ids.get(key)
+        if player_id is None:
+            player_id = str(idj)
+            self.register(*key, player_id)
+        return int(player_id)
+
+    def register(self, entity, key_type, external_key, internal_id):
+        key = (entity, key_type, external_key)
+        if key not in self.ids:
+            self.ids[key] = internal_id
+            self.pending.append(key + (internal_id,))
+
+    def drain(self):
+        """IdentityItems das chaves registradas desde a última chamada."""
+        pending, self.pending = self.pending, []
+        return [
+            IdentityItem(entity=entity, key_type=key_type, external_key=external_key, internal_id=internal_id)
+            for entity, key_type, external_key, internal_id in pending
+        ]
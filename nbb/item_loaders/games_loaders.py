@@ -2,29 +2,7 @@ from scrapy.loader import ItemLoader
 from itemloaders.processors import TakeFirst, MapCompose, Join  
 from w3lib.html import remove_tags
 from nbb.items import GameItem
-import datetime 
-
-def clean_string(text):
-    return text.strip().replace('\n', '').replace('\r', '')
-
-def parse_date(text):
-    if text:
-        try:
-            return datetime.datetime.strptime(text, '%d/%m/%Y').date()
-        except ValueError:
-            return None
-    return None
-
-def parse_time(text):
-    if text:
-        try:
-            text = text.replace('h', '')
-            return datetime.datetime.strptime(text, '%H:%M').time()
-        except ValueError:
-            return None
-    return None
-
-
+from nbb.item_loaders.processors import clean_string, parse_date, parse_time
 
 class GameLoader(ItemLoader):
     
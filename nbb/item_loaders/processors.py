@@ -0,0 +1,32 @@
+import datetime
+import re
+
+def clean_string(text):
+    return text.strip().replace('\n', '').replace('\r', '')
+
+def parse_date(text):
+    if text:
+        try:
+            return datetime.datetime.strptime(text, '%d/%m/%Y').date()
+        except ValueError:
+            return None
+    return None
+
+def parse_time(text):
+    if text:
+        try:
+            text = text.replace('h', '')
+            return datetime.datetime.strptime(text, '%H:%M').time()
+        except ValueError:
+            return None
+    return None
+
+SHOT_LOCATION_RE = re.compile(r'top:\s*([\d.]+)%;\s*left:\s*([\d.]+)%')
+
+def extract_shot_x_location(text):
+    match = SHOT_LOCATION_RE.search(text)
+    return float(match.group(2)) if match else 0.0
+
+def extract_shot_y_location(text):
+    match = SHOT_LOCATION_RE.search(text)
+    return float(match.group(1)) if match else 0.0
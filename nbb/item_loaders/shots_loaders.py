@@ -1,22 +1,7 @@
 from scrapy.loader import ItemLoader
-from itemloaders.processors import TakeFirst, MapCompose, Join ,Identity 
-from w3lib.html import remove_tags
+from itemloaders.processors import TakeFirst, MapCompose, Identity
 from nbb.items import ShotItem
-import re
-
-def clean_string(text):
-    return text.strip().replace('\n', '').replace('\r', '')
-
-def extract_shot_x_location(text):
-    match = re.search(r'top:\s*([\d.]+)%;\s*left:\s*([\d.]+)%', text)
-    return float(match.group(2)) if match else 0.0
-
-def extract_shot_y_location(text):
-    match = re.search(r'top:\s*([\d.]+)%;\s*left:\s*([\d.]+)%', text)
-    
-    
-    return float(match.group(1)) if match else 0.0
-
+from nbb.item_loaders.processors import clean_string, extract_shot_x_location, extract_shot_y_location
 
 class ShotLoader(ItemLoader):
     default_item_class  = ShotItem
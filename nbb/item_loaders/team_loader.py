@@ -1,12 +1,7 @@
 from scrapy.loader import ItemLoader
-from itemloaders.processors import TakeFirst, MapCompose, Join ,Identity 
-from w3lib.html import remove_tags
+from itemloaders.processors import TakeFirst, MapCompose
 from nbb.items import TeamItem
-import re
-
-
-def clean_string(text):
-    return text.strip().replace('\n', '').replace('\r', '')
+from nbb.item_loaders.processors import clean_string
 
 
 class TeamLoader(ItemLoader):
@@ -5,6 +5,7 @@ class TeamItem(scrapy.Item):
     id = scrapy.Field()
     name = scrapy.Field()
     logo = scrapy.Field()
+    logo_key = scrapy.Field()
 
 class GameItem(scrapy.Item):
     game_id = scrapy.Field()
@@ -31,6 +32,9 @@ class ShotItem(scrapy.Item):
     shot_type = scrapy.Field()
     shot_x_location = scrapy.Field()
     shot_y_location = scrapy.Field()
+    shot_made = scrapy.Field()
+    shot_distance = scrapy.Field()
+    shot_zone = scrapy.Field()
     
 class PlayerItem(scrapy.Item):
 
@@ -38,6 +42,13 @@ class PlayerItem(scrapy.Item):
     player_number = scrapy.Field()
     player_id = scrapy.Field()
     player_photo = scrapy.Field()
+    photo_key = scrapy.Field()
     player_team_id = scrapy.Field()
     season = scrapy.Field() 
-    
\ No newline at end of file
+    
+class IdentityItem(scrapy.Item):
+
+    entity = scrapy.Field()
+    key_type = scrapy.Field()
+    external_key = scrapy.Field()
+    internal_id = scrapy.Field()
@@ -4,6 +4,8 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+import asyncio
+import time
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +103,58 @@ class NbbDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class BackpressureMiddleware:
+    """
+    Segura as requisições marcadas com meta['db_backpressure'] (as páginas de jogo,
+    que geram centenas de arremessos cada) enquanto a fila de escrita do NbbPipeline
+    (nbb/db_queue/rows e nbb/db_queue/bytes) estiver acima de DB_QUEUE_MAX_ROWS ou
+    DB_QUEUE_MAX_BYTES. Retoma quando a fila cai abaixo de DB_QUEUE_RESUME_RATIO do
+    limite, para não alternar a cada lote.
+    """
+
+    def __init__(self, stats, max_rows, max_bytes, resume_ratio, poll_interval):
+        self.stats = stats
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.resume_ratio = resume_ratio
+        self.poll_interval = poll_interval
+        self.paused = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler.stats,
+            settings.getint('DB_QUEUE_MAX_ROWS', 20000),
+            settings.getint('DB_QUEUE_MAX_BYTES', 64 * 1024 * 1024),
+            settings.getfloat('DB_QUEUE_RESUME_RATIO', 0.5),
+            settings.getfloat('DB_QUEUE_POLL_INTERVAL', 0.2),
+        )
+
+    def over_budget(self):
+        ratio = self.resume_ratio if self.paused else 1.0
+        rows = self.stats.get_value('nbb/db_queue/rows', 0)
+        size = self.stats.get_value('nbb/db_queue/bytes', 0)
+        return rows > self.max_rows * ratio or size > self.max_bytes * ratio
+
+    async def process_request(self, request, spider):
+        if not request.meta.get('db_backpressure') or not self.over_budget():
+            return None
+
+        if not self.paused:
+            self.paused = True
+            self.stats.inc_value('nbb/db_queue/pauses')
+            spider.logger.info(
+                f"Fila de escrita cheia ({self.stats.get_value('nbb/db_queue/rows')} linhas, "
+                f"{self.stats.get_value('nbb/db_queue/bytes')} bytes): segurando novas páginas de jogo."
+            )
+        started = time.monotonic()
+        while self.over_budget():
+            await asyncio.sleep(self.poll_interval)
+        self.stats.inc_value('nbb/db_queue/paused_seconds', time.monotonic() - started)
+        if self.paused:
+            self.paused = False
+            spider.logger.info("Fila de escrita drenada: retomando as páginas de jogo.")
+        return None
@@ -0,0 +1,211 @@
+-- Initial schema. Idempotent (IF NOT EXISTS everywhere) so that databases created
+-- by the old DatabaseManager.create_tables are adopted as version 1 unchanged.
+
+-- Table for teams (id is PRIMARY KEY, automatically indexed)
+CREATE TABLE IF NOT EXISTS teams (
+    id VARCHAR(100) PRIMARY KEY,
+    name VARCHAR(50),
+    logo TEXT
+);
+
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    player_name VARCHAR(50),
+    -- CORREÇÃO: Coluna renomeada para 'player_icon_url' para consistência
+    player_icon_url TEXT
+);
+
+-- Table for player's team per season (composite PRIMARY KEY, automatically indexed)
+CREATE TABLE IF NOT EXISTS player_teams_by_season (
+    player_id INTEGER REFERENCES players(id) NOT NULL,
+    player_team_id VARCHAR(100) REFERENCES teams(id) NOT NULL,
+    season VARCHAR(20) NOT NULL,
+    player_number VARCHAR(10),
+    PRIMARY KEY (player_id, player_team_id, season)
+);
+
+-- Table for games (game_id is PRIMARY KEY, automatically indexed)
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    game_date DATE,
+    game_time TIME,
+    home_team_id VARCHAR(100) REFERENCES teams(id),
+    away_team_id VARCHAR(100) REFERENCES teams(id),
+    home_team_score INTEGER,
+    away_team_score INTEGER,
+    round VARCHAR(30),
+    stage VARCHAR(30),
+    season VARCHAR(20),
+    arena VARCHAR(100),
+    link TEXT
+);
+
+-- Table for player statistics in a game (composite PRIMARY KEY, automatically indexed)
+CREATE TABLE IF NOT EXISTS player_stats (
+    player_id INTEGER REFERENCES players(id) NOT NULL,
+    game_id INTEGER REFERENCES games(id) NOT NULL,
+    team_id VARCHAR(100) REFERENCES teams(id) NOT NULL,
+    quarter VARCHAR(10) NOT NULL,
+    minutes_played FLOAT,
+    assist INTEGER,
+    points_attempts INTEGER,
+    points_made INTEGER,
+    defensive_rebounds INTEGER,
+    offensive_rebounds INTEGER,
+    three_points_attempts INTEGER,
+    three_points_made INTEGER,
+    two_points_attempts INTEGER,
+    two_points_made INTEGER,
+    free_throws_attempts INTEGER,
+    free_throws_made INTEGER,
+    steals INTEGER,
+    blocks INTEGER,
+    fouls_committed INTEGER,
+    fouls_received INTEGER,
+    total_errors INTEGER,
+    dunks INTEGER,
+    plus_minus_while_on_court INTEGER,
+    efficiency INTEGER,
+    PRIMARY KEY (player_id, game_id, quarter)
+);
+
+-- Table for shots
+CREATE TABLE IF NOT EXISTS shots (
+    id SERIAL PRIMARY KEY,
+    player_id INTEGER REFERENCES players(id),
+    game_id INTEGER REFERENCES games(id),
+    team_id VARCHAR(100) REFERENCES teams(id),
+    shot_quarter VARCHAR(10),
+    shot_time TIME,
+    shot_type VARCHAR(20),
+    shot_x_location FLOAT,
+    shot_y_location FLOAT
+);
+
+-- Table for play-by-play actions
+CREATE TABLE IF NOT EXISTS play_by_play (
+    id SERIAL PRIMARY KEY,
+    game_id INTEGER REFERENCES games(id) NOT NULL,
+    player_id INTEGER REFERENCES players(id),
+    team_id VARCHAR(100) REFERENCES teams(id),
+    quarter_time TIME,
+    quarter VARCHAR(10) NOT NULL,
+    home_score INTEGER NOT NULL,
+    away_score INTEGER NOT NULL,
+    play TEXT NOT NULL
+);
+
+-- Table for downloaded assets (logos and player photos), keyed by source URL
+CREATE TABLE IF NOT EXISTS assets (
+    url TEXT PRIMARY KEY,
+    content_hash VARCHAR(64) NOT NULL,
+    storage_key TEXT NOT NULL,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS logo_key TEXT;
+ALTER TABLE players ADD COLUMN IF NOT EXISTS photo_key TEXT;
+
+-- Last time the game (or any of its shots) was written by the pipeline
+ALTER TABLE games ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+-- Rows rejected by the database during batched writes, kept for replay
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id SERIAL PRIMARY KEY,
+    table_name VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    replayed_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS dead_letters_pending_idx ON dead_letters (table_name, id) WHERE replayed_at IS NULL;
+
+-- Columns derived at ingest from the raw class/coordinates (nbb.shot_enrichment)
+ALTER TABLE shots ADD COLUMN IF NOT EXISTS shot_made BOOLEAN;
+ALTER TABLE shots ADD COLUMN IF NOT EXISTS shot_distance REAL;
+ALTER TABLE shots ADD COLUMN IF NOT EXISTS shot_zone VARCHAR(20);
+
+-- Season aggregates maintained incrementally per game (nbb.aggregates)
+CREATE TABLE IF NOT EXISTS season_player_shot_totals (
+    season VARCHAR(20) NOT NULL,
+    player_id INTEGER NOT NULL,
+    team_id VARCHAR(100) NOT NULL,
+    shot_zone VARCHAR(20) NOT NULL,
+    shot_quarter VARCHAR(10) NOT NULL,
+    attempts INTEGER NOT NULL,
+    makes INTEGER NOT NULL,
+    distance_sum NUMERIC(12, 2) NOT NULL,
+    PRIMARY KEY (season, player_id, team_id, shot_zone, shot_quarter)
+);
+
+CREATE TABLE IF NOT EXISTS season_player_totals (
+    season VARCHAR(20) NOT NULL,
+    player_id INTEGER NOT NULL,
+    team_id VARCHAR(100) NOT NULL,
+    games_played INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    makes INTEGER NOT NULL,
+    PRIMARY KEY (season, player_id, team_id)
+);
+
+CREATE TABLE IF NOT EXISTS season_team_totals (
+    season VARCHAR(20) NOT NULL,
+    team_id VARCHAR(100) NOT NULL,
+    games_played INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    points_for INTEGER NOT NULL,
+    points_against INTEGER NOT NULL,
+    PRIMARY KEY (season, team_id)
+);
+
+-- What each game last added to the season aggregates, subtracted when the game is rewritten
+CREATE TABLE IF NOT EXISTS game_player_contributions (
+    game_id INTEGER NOT NULL,
+    season VARCHAR(20) NOT NULL,
+    player_id INTEGER NOT NULL,
+    team_id VARCHAR(100) NOT NULL,
+    shot_zone VARCHAR(20) NOT NULL,
+    shot_quarter VARCHAR(10) NOT NULL,
+    attempts INTEGER NOT NULL,
+    makes INTEGER NOT NULL,
+    distance_sum NUMERIC(12, 2) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS game_player_contributions_game_idx ON game_player_contributions (game_id);
+
+CREATE TABLE IF NOT EXISTS game_team_contributions (
+    game_id INTEGER NOT NULL,
+    season VARCHAR(20) NOT NULL,
+    team_id VARCHAR(100) NOT NULL,
+    games_played INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    points_for INTEGER NOT NULL,
+    points_against INTEGER NOT NULL,
+    PRIMARY KEY (game_id, team_id)
+);
+
+-- Each game's shots packed as one binary value (nbb.shot_arrays.SHOT_DTYPE)
+CREATE TABLE IF NOT EXISTS game_shot_arrays (
+    game_id INTEGER PRIMARY KEY REFERENCES games(id),
+    shot_count INTEGER NOT NULL,
+    format_version SMALLINT NOT NULL,
+    shots BYTEA NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Spool files already loaded by nbb.spool (makes a retried load idempotent)
+CREATE TABLE IF NOT EXISTS spool_loads (
+    file_name TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    table_name VARCHAR(50) NOT NULL,
+    row_count INTEGER NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Games whose shots were already replaced by a spool run, with the highest shot count loaded
+CREATE TABLE IF NOT EXISTS spool_games (
+    run_id TEXT NOT NULL,
+    game_id INTEGER NOT NULL,
+    shot_count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, game_id)
+);
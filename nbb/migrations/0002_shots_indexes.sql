@@ -0,0 +1,6 @@
+-- nbb:no-transaction
+-- Indexes for the per-game, per-player and per-team shot queries (nbb.read_api,
+-- nbb.aggregates, nbb.shot_arrays). Built CONCURRENTLY so shots stays writable.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shots_game_idx ON shots (game_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shots_player_zone_idx ON shots (player_id, shot_zone) INCLUDE (shot_made, shot_distance);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shots_team_zone_idx ON shots (team_id, shot_zone) INCLUDE (shot_made, shot_distance);
@@ -0,0 +1,34 @@
+-- Stable internal ids for the site's external keys (nbb.identity). A team keeps its
+-- id when its logo URL changes, because the new URL is matched by short name; players
+-- are keyed by the site's idj.
+CREATE TABLE IF NOT EXISTS identity_registry (
+    entity VARCHAR(10) NOT NULL,
+    key_type VARCHAR(20) NOT NULL,
+    external_key TEXT NOT NULL,
+    internal_id TEXT NOT NULL,
+    first_seen_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (entity, key_type, external_key)
+);
+
+-- Reverse lookups: every external key of a given team or player
+CREATE INDEX IF NOT EXISTS identity_registry_internal_idx ON identity_registry (entity, internal_id);
+
+-- Seed from existing rows: every known logo URL keeps its current team id
+INSERT INTO identity_registry (entity, key_type, external_key, internal_id)
+SELECT 'team', 'logo_url', logo, id FROM teams WHERE logo IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+-- Each short name points at the team id with the most games (already fragmented
+-- teams are not merged; new logos join the established id from now on)
+INSERT INTO identity_registry (entity, key_type, external_key, internal_id)
+SELECT DISTINCT ON (t.name) 'team', 'short_name', t.name, t.id
+FROM teams t
+WHERE t.name IS NOT NULL
+ORDER BY t.name,
+         (SELECT count(*) FROM games g WHERE g.home_team_id = t.id OR g.away_team_id = t.id) DESC,
+         t.id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO identity_registry (entity, key_type, external_key, internal_id)
+SELECT 'player', 'idj', id::text, id::text FROM players
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,4 @@
+-- spool_loads was keyed by file name alone, but the spool writers of one crawl can
+-- produce the same file name in different table folders (<table>/<run>-<seq>.tsv.gz).
+ALTER TABLE spool_loads DROP CONSTRAINT IF EXISTS spool_loads_pkey;
+ALTER TABLE spool_loads ADD PRIMARY KEY (table_name, file_name);
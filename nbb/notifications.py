@@ -0,0 +1,68 @@
+from nbb.db_manager import DB_CONFIG, GAME_CHANGES_CHANNEL, CHANGE_KINDS, close_pool
+import psycopg2
+import argparse
+import json
+import logging
+import select
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+
+def listen(handler, kinds=None, on_reconnect=None, poll_timeout=5.0, stop=None):
+    """
+    Escuta as mudanças de jogos publicadas pelo pipeline e chama handler(change)
+    para cada uma, em vez de consultar games/shots periodicamente.
+
+    change é um dict com game_id, season, home_team_id, away_team_id, kind (um
+    de CHANGE_KINDS), home_team_score, away_team_score e shot_count. kinds restringe os tipos
+    entregues ao handler. Usa uma conexão dedicada, fora do pool; se ela cair,
+    reconecta e chama on_reconnect(), pois as mudanças publicadas nesse
+    intervalo foram perdidas e o consumidor deve se ressincronizar. Bloqueia até
+    que o threading.Event stop (opcional) seja sinalizado.
+    """
+    kinds = set(kinds) if kinds else None
+    connected_before = False
+    while stop is None or not stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {GAME_CHANGES_CHANNEL};")
+            logger.info(f"Escutando mudanças de jogos no canal '{GAME_CHANGES_CHANNEL}'.")
+            if connected_before and on_reconnect is not None:
+                on_reconnect()
+            connected_before = True
+            while stop is None or not stop.is_set():
+                if select.select([conn], [], [], poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    change = json.loads(conn.notifies.pop(0).payload)
+                    if kinds is None or change['kind'] in kinds:
+                        handler(change)
+        except Exception as e:
+            logger.error(f"Conexão de notificações perdida, reconectando: {e}", exc_info=True)
+            time.sleep(poll_timeout)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imprime (JSON, uma por linha) as mudanças de jogos publicadas pelo pipeline.")
+    parser.add_argument('--kind', action='append', choices=CHANGE_KINDS, help="Tipo de mudança (pode repetir).")
+    args = parser.parse_args()
+    try:
+        listen(lambda change: print(json.dumps(change), flush=True), args.kind)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_pool()
@@ -1,9 +1,14 @@
-from nbb.items import GameItem, ShotItem, PlayerItem, TeamItem
+from nbb.items import GameItem, ShotItem, PlayerItem, TeamItem, IdentityItem
 from scrapy.exceptions import DropItem
 from itemadapter import ItemAdapter
-import hashlib
 import logging
-from nbb.db_manager import DatabaseManager, DB_CONFIG, close_pool
+from nbb.db_manager import close_pool, identity_row, team_row, player_row, player_team_by_season_row, game_row, shot_row
+from nbb.batch_writer import BatchWriter
+from nbb.spool import SpoolWriter
+from nbb.schema import ensure_schema
+from nbb.identity import fallback_team_id
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import sys
 
 logger = logging.getLogger(__name__)
@@ -14,48 +19,100 @@ stream_handler.setFormatter(formatter)
 logger.addHandler(stream_handler)
 
 
+def row_size(row):
+    """Estimativa barata da memória ocupada por uma linha pendente."""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
 class NbbPipeline:
+    """
+    Converte os itens em linhas e as entrega, em lotes de DB_BATCH_SIZE, a uma
+    thread dedicada que grava no banco; o reactor do Scrapy não espera pelo
+    PostgreSQL. A profundidade da fila (linhas e bytes ainda não confirmados) é
+    publicada em nbb/db_queue/* e usada pelo BackpressureMiddleware para segurar
+    novas páginas de jogo enquanto o banco não dá conta.
+
+    Com um SpoolWriter (DB_SPOOL_DIR), o pipeline não acessa o banco: as linhas
+    só são anexadas aos arquivos do spool, carregados depois por nbb.spool load.
+    """
 
-    def __init__(self):
-        pass
+    def __init__(self, batch_size=500, stats=None, spool=None, auto_migrate=True):
+        self.batch_size = batch_size
+        self.stats = stats
+        self.spool = spool
+        self.auto_migrate = auto_migrate
+        self.writer = BatchWriter()
+        self.batch = []
+        self.batch_bytes = 0
+        # Linhas/bytes entregues à thread de escrita e ainda não confirmados
+        self.queued_rows = 0
+        self.queued_bytes = 0
+        self.carried_rows = 0
+        self.carried_bytes = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nbb-db-writer')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        spool_dir = crawler.settings.get('DB_SPOOL_DIR')
+        return cls(
+            batch_size=crawler.settings.getint('DB_BATCH_SIZE', 500),
+            stats=crawler.stats,
+            spool=SpoolWriter(spool_dir, crawler.settings.getint('DB_SPOOL_ROTATE_ROWS', 50000)) if spool_dir else None,
+            auto_migrate=crawler.settings.getbool('DB_AUTO_MIGRATE', True),
+        )
 
     def open_spider(self, spider):
         logger.info(f"Opening spider: {spider.name}. Pipeline pronto para processar itens.")
+        if self.spool is not None:
+            logger.info(f"Modo spool: gravando itens em '{self.spool.directory}' (execução {self.spool.run_id}).")
+            return
         try:
-            with DatabaseManager(DB_CONFIG) as db:
-                db.create_tables()  # ✅ Função que cria as tabelas
-            logger.info("Tabelas verificadas/criadas com sucesso.")
+            version = ensure_schema(self.auto_migrate)
+            logger.info(f"Schema do banco verificado (versão {version}).")
         except Exception as e:
-            logger.error(f"Erro ao criar/verificar tabelas: {e}", exc_info=True)
+            logger.error(f"Erro ao verificar o schema do banco: {e}", exc_info=True)
             raise
 
     def close_spider(self, spider):    
         logger.info(f"Closing spider: {spider.name}. Pipeline finalizado.")
+        if self.spool is not None:
+            self.spool.close()
+            logger.info(f"{self.spool.rows} linha(s) em {self.spool.completed} arquivo(s) de spool; carregue com 'python -m nbb.spool load'.")
+            return
+        self.submit()
+        self.executor.shutdown(wait=True)
+        if self.writer.pending:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gravar o último lote: {e}", exc_info=True)
         try:
             close_pool()
         except Exception as e:
             logger.error(f"Erro ao fechar pool de conexões: {e}", exc_info=True)
 
-    def generate_team_id(self, logo_url):        
-        return hashlib.md5(logo_url.encode('utf-8')).hexdigest()
-
     def process_item(self, item, spider):
         """
-        Processa cada item gerado pelo spider dentro de sua própria transação.
+        Converte cada item em linhas e as acumula; a cada DB_BATCH_SIZE linhas o
+        lote é entregue à thread de escrita, que o grava em uma única transação.
         """        
         try:
-            with DatabaseManager(DB_CONFIG) as db:
-                if isinstance(item, TeamItem):
-                    self.process_team(db, item)
-                elif isinstance(item, PlayerItem):
-                    self.process_player(db, item)
-                elif isinstance(item, GameItem):
-                    db.insert_game(item)
-                elif isinstance(item, ShotItem):
-                    db.insert_shot(item)
-                else:
-                    logger.warning(f"Tipo de item desconhecido encontrado: {type(item)}")
+            if isinstance(item, TeamItem):
+                self.process_team(item)
+            elif isinstance(item, PlayerItem):
+                self.process_player(item)
+            elif isinstance(item, GameItem):
+                self.add_row('games', game_row(item))
+            elif isinstance(item, ShotItem):
+                self.add_row('shots', shot_row(item))
+            elif isinstance(item, IdentityItem):
+                self.add_row('identity_registry', identity_row(item))
+            else:
+                logger.warning(f"Tipo de item desconhecido encontrado: {type(item)}")
 
+            if len(self.batch) >= self.batch_size:
+                self.submit()
             return item 
         
         except DropItem as e:
@@ -65,29 +122,88 @@ class NbbPipeline:
             logger.error(f"Erro ao processar item no pipeline: {e} - Item: {item}", exc_info=True)
             raise 
 
-    def process_team(self, db, item):
+    def add_row(self, table, row):
+        if row is not None and self.spool is not None:
+            self.spool.write(table, row)
+            if self.stats:
+                self.stats.inc_value(f'nbb/spool/{table}')
+        elif row is not None:
+            size = row_size(row)
+            with self.lock:
+                self.batch.append((table, row))
+                self.batch_bytes += size
+            self.report_queue()
+
+    def submit(self):
+        """Entrega o lote atual à thread de escrita."""
+        # O lote passa para a fila em um único passo sob o lock: a thread de escrita,
+        # que também publica a profundidade, nunca o vê fora das duas contagens
+        with self.lock:
+            if not self.batch:
+                return
+            batch, size = self.batch, self.batch_bytes
+            self.batch, self.batch_bytes = [], 0
+            self.queued_rows += len(batch)
+            self.queued_bytes += size
+        self.executor.submit(self.write, batch, size)
+
+    def write(self, batch, size):
+        """
+        Executa na thread de escrita. Se o lote inteiro falhar, as linhas ficam no
+        BatchWriter (e na contagem da fila) e são retentadas junto com o próximo lote.
+        """
+        self.carried_rows += len(batch)
+        self.carried_bytes += size
+        for table, row in batch:
+            self.writer.add(table, row)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Erro ao gravar lote no banco; {self.carried_rows} linha(s) serão retentadas no próximo lote: {e}", exc_info=True)
+            return
+        with self.lock:
+            self.queued_rows -= self.carried_rows
+            self.queued_bytes -= self.carried_bytes
+        self.carried_rows = self.carried_bytes = 0
+        self.report_queue()
+
+    def report_queue(self):
+        """
+        Publica a profundidade da fila. Chamado pelo reactor e pela thread de
+        escrita; lê e publica sob o lock, para que uma leitura mais antiga não
+        sobrescreva a mais recente.
+        """
+        if not self.stats:
+            return
+        with self.lock:
+            rows = self.queued_rows + len(self.batch)
+            size = self.queued_bytes + self.batch_bytes
+            self.stats.set_value('nbb/db_queue/rows', rows)
+            self.stats.set_value('nbb/db_queue/bytes', size)
+            self.stats.max_value('nbb/db_queue/max_rows', rows)
+            self.stats.max_value('nbb/db_queue/max_bytes', size)
+
+    def flush(self):
+        written, dead_lettered = self.writer.written, self.writer.dead_lettered
+        self.writer.flush()
+        if self.stats:
+            self.stats.inc_value('nbb/db/rows_written', self.writer.written - written)
+            self.stats.inc_value('nbb/db/dead_letters', self.writer.dead_lettered - dead_lettered)
+
+    def process_team(self, item):
         adapter = ItemAdapter(item)
         logo_url = adapter.get('logo')
         if not logo_url:
             raise DropItem("Item TeamItem sem URL de logo válido.")
-        team_id = self.generate_team_id(logo_url)
-        adapter['id'] = team_id
-        db.insert_team(item)
+        # O spider já resolve o id pelo registro de identidades
+        if not adapter.get('id'):
+            adapter['id'] = fallback_team_id(logo_url)
+        self.add_row('teams', team_row(item))
 
-    def process_player(self, db, item):
+    def process_player(self, item):
         adapter = ItemAdapter(item)
         player_id = adapter.get('player_id')
         if not player_id:
             raise DropItem("Item PlayerItem sem player_id válido.")
-        db.insert_player(item)
-        db.insert_player_team_by_season(item)
-
-    def process_player_team_by_season(self, db, item):
-        adapter = ItemAdapter(item)
-        player_name = adapter.get('player_name')
-        player_team_id = adapter.get('player_team_id')
-        player_number = adapter.get('player_number')
-        season = adapter.get('season')
-        if not all([player_name, player_team_id, player_number, season]):
-            raise DropItem(f"Item PlayerNumberItem incompleto: {item}")
-        db.insert_player_team_by_season(item)
+        self.add_row('players', player_row(item))
+        self.add_row('player_teams_by_season', player_team_by_season_row(item))
@@ -0,0 +1,240 @@
+from nbb.db_manager import DatabaseManager
+from nbb.pipelines import NbbPipeline
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from collections import Counter, defaultdict
+import cProfile
+import datetime
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+import types
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+SPIDER_CALLBACKS = ('parse', 'parse_athlete', 'parse_shots', 'parse_athlete_in_pool')
+
+
+class Profiler:
+    """
+    Perfila funções embrulhadas, com um cProfile.Profile por rótulo.
+
+    Chamadas aninhadas (ex.: parse_shots dentro de parse_athlete) pausam o perfil
+    e o relógio do rótulo externo, de modo que cada rótulo recebe apenas o seu
+    próprio tempo (exclusivo). Geradores (callbacks do Scrapy) são perfilados a
+    cada passo da iteração; geradores assíncronos, só entre um await e outro: o
+    tempo esperando fora do reactor (ex.: o parse de parse_athlete_in_pool, que
+    roda nos processos do pool e não aparece no cProfile) não é contado. Uma thread de
+    amostragem registra as pilhas das threads que estão dentro de uma função
+    embrulhada, para gerar um flamegraph no formato "collapsed".
+    """
+
+    def __init__(self, sample_interval=0.005):
+        self.profiles = defaultdict(cProfile.Profile)
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.samples = Counter()
+        self.sample_interval = sample_interval
+        self.local = threading.local()
+        self.active_threads = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def enter(self, label):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        now = time.perf_counter()
+        if stack:
+            outer = stack[-1]
+            self.profiles[outer[0]].disable()
+            self.seconds[outer[0]] += now - outer[1]
+        stack.append([label, now])
+        with self.lock:
+            self.active_threads[threading.get_ident()] = len(stack)
+        self.profiles[label].enable()
+
+    def exit(self):
+        stack = self.local.stack
+        label, started = stack.pop()
+        self.profiles[label].disable()
+        now = time.perf_counter()
+        self.seconds[label] += now - started
+        with self.lock:
+            if stack:
+                self.active_threads[threading.get_ident()] = len(stack)
+            else:
+                self.active_threads.pop(threading.get_ident(), None)
+        if stack:
+            stack[-1][1] = now
+            self.profiles[stack[-1][0]].enable()
+
+    @types.coroutine
+    def profiled_steps(self, label, coroutine):
+        """Executa a corrotina passo a passo, perfilando cada trecho entre dois awaits."""
+        value, error = None, None
+        while True:
+            self.enter(label)
+            try:
+                if error is not None:
+                    awaited = coroutine.throw(error)
+                else:
+                    awaited = coroutine.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.exit()
+            try:
+                value, error = (yield awaited), None
+            except BaseException as e:
+                value, error = None, e
+
+    def wrap(self, label, function):
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def async_generator_wrapper(*args, **kwargs):
+                self.calls[label] += 1
+                generator = function(*args, **kwargs)
+                while True:
+                    try:
+                        value = await self.profiled_steps(label, generator.__anext__())
+                    except StopAsyncIteration:
+                        return
+                    yield value
+            return async_generator_wrapper
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                self.calls[label] += 1
+                generator = function(*args, **kwargs)
+                while True:
+                    self.enter(label)
+                    try:
+                        value = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        self.exit()
+                    yield value
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self.calls[label] += 1
+            self.enter(label)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.exit()
+        return wrapper
+
+    def start_sampler(self):
+        self.sampler = threading.Thread(target=self.sample_loop, name='nbb-profiler-sampler', daemon=True)
+        self.sampler.start()
+
+    def stop_sampler(self):
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+
+    def sample_loop(self):
+        while not self.stopped.wait(self.sample_interval):
+            with self.lock:
+                thread_ids = list(self.active_threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, directory):
+        """Grava um .prof por rótulo, o flamegraph.collapsed e um resumo em texto."""
+        os.makedirs(directory, exist_ok=True)
+        for label, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(directory, f"{label}.prof"))
+        with open(os.path.join(directory, 'flamegraph.collapsed'), 'w') as collapsed:
+            for stack, count in self.samples.most_common():
+                collapsed.write(f"{stack} {count}\n")
+        with open(os.path.join(directory, 'summary.txt'), 'w') as summary:
+            for label, seconds in self.seconds.most_common():
+                summary.write(f"{label}\t{self.calls[label]} chamadas\t{seconds:.3f} s (exclusivo)\n")
+
+
+class ProfilingExtension:
+    """
+    Perfilamento sob demanda dos callbacks do spider, do NbbPipeline.process_item e
+    das escritas do DatabaseManager. Só é instalado quando PROFILING_ENABLED (ou a
+    variável de ambiente NBB_PROFILE) está ligado; desligado, nenhum método é
+    embrulhado e o custo é zero. Os perfis são gravados em PROFILING_DIR ao fechar o spider.
+    """
+
+    def __init__(self, directory, sample_interval):
+        self.directory = directory
+        self.profiler = Profiler(sample_interval)
+        self.patched = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PROFILING_ENABLED'):
+            raise NotConfigured
+        extension = cls(
+            crawler.settings.get('PROFILING_DIR', 'profiles'),
+            crawler.settings.getfloat('PROFILING_SAMPLE_INTERVAL', 0.005),
+        )
+        # As extensões são criadas antes do engine: embrulhando as classes aqui, o
+        # pipeline (que guarda o process_item já ligado à instância) usa a versão perfilada.
+        extension.install(crawler.spidercls)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def patch(self, owner, name, label):
+        original = owner.__dict__.get(name)
+        setattr(owner, name, self.profiler.wrap(label, getattr(owner, name)))
+        self.patched.append((owner, name, original))
+
+    def install(self, spider_class):
+        for name in SPIDER_CALLBACKS:
+            if hasattr(spider_class, name):
+                self.patch(spider_class, name, f"{spider_class.__name__}.{name}")
+        self.patch(NbbPipeline, 'process_item', 'NbbPipeline.process_item')
+        for name in dir(DatabaseManager):
+            if name.startswith('insert_') or name == 'write_batch':
+                self.patch(DatabaseManager, name, f"DatabaseManager.{name}")
+
+    def uninstall(self):
+        for owner, name, original in reversed(self.patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.patched = []
+
+    def spider_opened(self, spider):
+        self.profiler.start_sampler()
+        logger.info(f"Perfilamento ligado: {len(self.patched)} métodos instrumentados.")
+
+    def spider_closed(self, spider):
+        self.profiler.stop_sampler()
+        self.uninstall()
+
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        directory = os.path.join(self.directory, f"{spider.name}-{timestamp}")
+        self.profiler.dump(directory)
+        logger.info(f"Perfis gravados em {directory}")
@@ -0,0 +1,409 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG
+from nbb import notifications, shot_arrays
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from collections import OrderedDict
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+CACHE_SIZE = int(os.environ.get('READ_API_CACHE_SIZE', '512'))
+CACHE_TTL = float(os.environ.get('READ_API_CACHE_TTL', '3600'))
+
+
+class ViewCache:
+    """
+    Cache LRU com expiração (TTL) para as respostas da API de leitura.
+
+    Cada entrada guarda o corpo JSON já serializado, o ETag e um conjunto de
+    tags ('game:<id>', 'season:<temporada>', 'team:<id>:<temporada>') usado para
+    invalidar apenas as visões afetadas quando o pipeline reescreve um jogo.
+
+    Cada invalidação avança a geração do cache e a registra nas suas tags. Uma
+    leitura feita a partir da geração de begin() só é guardada se nenhuma das
+    suas tags foi invalidada depois disso: senão o corpo anterior à mudança
+    voltaria ao cache depois da invalidação e ficaria até o TTL.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        # Geração da última invalidação de cada tag; leituras anteriores a floor nunca são guardadas
+        self.invalidated = {}
+        self.floor = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def begin(self):
+        """Geração atual, a ser lida antes de consultar o banco e passada a set()."""
+        with self.lock:
+            return self.generation
+
+    def set(self, key, body, etag, tags, generation=None):
+        """Guarda a visão, exceto se uma das tags foi invalidada depois de generation. Retorna se guardou."""
+        tags = frozenset(tags)
+        with self.lock:
+            if generation is not None and (
+                generation < self.floor or any(self.invalidated.get(tag, 0) > generation for tag in tags)
+            ):
+                return False
+            self.entries[key] = (time.monotonic() + self.ttl, body, etag, tags)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return True
+
+    def invalidate(self, tags):
+        """Remove todas as entradas que possuem qualquer uma das tags informadas."""
+        tags = set(tags)
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                self.invalidated[tag] = self.generation
+            if len(self.invalidated) > self.maxsize:
+                # Esquece as tags; só as leituras em andamento (anteriores a esta geração) deixam de ser guardadas
+                self.invalidated.clear()
+                self.floor = self.generation
+            stale = [key for key, entry in self.entries.items() if entry[3] & tags]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.invalidated.clear()
+            self.floor = self.generation
+            self.entries.clear()
+
+
+def change_tags(change):
+    """Tags das visões afetadas por uma mudança publicada pelo pipeline (ver nbb.notifications)."""
+    season = change['season']
+    tags = {f"game:{change['game_id']}", f"season:{season}"}
+    for column in ('home_team_id', 'away_team_id'):
+        if change.get(column):
+            tags.add(f"team:{change[column]}:{season}")
+    return tags
+
+
+def make_etag(*parts):
+    return '"' + hashlib.sha1(repr(parts).encode('utf-8')).hexdigest() + '"'
+
+
+def fetch_dicts(cur):
+    columns = [column.name for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def season_schedule(db, season):
+    """Tabela de jogos da temporada."""
+    db.cur.execute(
+        """
+        SELECT g.id, g.game_date, g.game_time, g.round, g.stage, g.arena,
+               g.home_team_id, ht.name AS home_team_name, g.home_team_score,
+               g.away_team_id, at.name AS away_team_name, g.away_team_score,
+               g.ingested_at
+        FROM games g
+        LEFT JOIN teams ht ON ht.id = g.home_team_id
+        LEFT JOIN teams at ON at.id = g.away_team_id
+        WHERE g.season = %s
+        ORDER BY g.game_date, g.game_time, g.id;
+        """,
+        (season,)
+    )
+    games = fetch_dicts(db.cur)
+    etag = make_etag('schedule', season, len(games), max((g['ingested_at'] for g in games if g['ingested_at']), default=None))
+    tags = {f"season:{season}"} | {f"game:{g['id']}" for g in games}
+    return {'season': season, 'games': games}, etag, tags
+
+
+def game_detail(db, game_id):
+    """Dados do jogo com seus arremessos."""
+    db.cur.execute(
+        """
+        SELECT g.*, ht.name AS home_team_name, at.name AS away_team_name
+        FROM games g
+        LEFT JOIN teams ht ON ht.id = g.home_team_id
+        LEFT JOIN teams at ON at.id = g.away_team_id
+        WHERE g.id = %s;
+        """,
+        (game_id,)
+    )
+    games = fetch_dicts(db.cur)
+    if not games:
+        return None, None, set()
+    game = games[0]
+    db.cur.execute(
+        """
+        SELECT s.player_id, p.player_name, s.team_id, s.shot_quarter, s.shot_time,
+               s.shot_type, s.shot_x_location, s.shot_y_location
+        FROM shots s
+        LEFT JOIN players p ON p.id = s.player_id
+        WHERE s.game_id = %s
+        ORDER BY s.id;
+        """,
+        (game_id,)
+    )
+    game['shots'] = fetch_dicts(db.cur)
+    etag = make_etag('game', game_id, game['ingested_at'])
+    return game, etag, {f"game:{game_id}", f"season:{game['season']}"}
+
+
+def game_shot_chart(db, game_id):
+    """Arremessos do jogo em colunas, lidos da representação empacotada (uma única linha)."""
+    packed = shot_arrays.fetch_game(db, game_id)
+    if packed is None:
+        return None, None, set()
+    shots, home_team_id, away_team_id = packed
+    payload = {
+        'game_id': game_id,
+        'home_team_id': home_team_id,
+        'away_team_id': away_team_id,
+        'shot_count': len(shots),
+        'shots': shot_arrays.to_columns(shots),
+    }
+    etag = make_etag('chart', game_id, hashlib.sha1(shots.tobytes()).hexdigest())
+    return payload, etag, {f"game:{game_id}"}
+
+
+def player_shot_chart(db, player_id, season):
+    """Todos os arremessos de um jogador em uma temporada."""
+    db.cur.execute(
+        """
+        SELECT s.game_id, s.team_id, s.shot_quarter, s.shot_time, s.shot_type,
+               s.shot_x_location, s.shot_y_location, g.ingested_at
+        FROM shots s
+        JOIN games g ON g.id = s.game_id
+        WHERE s.player_id = %s AND g.season = %s
+        ORDER BY g.game_date, s.game_id, s.id;
+        """,
+        (player_id, season)
+    )
+    shots = fetch_dicts(db.cur)
+    last_ingested = max((s.pop('ingested_at') for s in shots), default=None)
+    etag = make_etag('player_shots', player_id, season, len(shots), last_ingested)
+    # Arremessos novos do jogador só chegam em jogos das suas equipes na temporada
+    db.cur.execute(
+        "SELECT player_team_id FROM player_teams_by_season WHERE player_id = %s AND season = %s;",
+        (player_id, season)
+    )
+    team_ids = {row[0] for row in db.cur.fetchall()} | {s['team_id'] for s in shots}
+    tags = {f"team:{team_id}:{season}" for team_id in team_ids if team_id} or {f"season:{season}"}
+    return {'player_id': player_id, 'season': season, 'shots': shots}, etag, tags
+
+
+def team_roster(db, team_id, season):
+    """Elenco de uma equipe em uma temporada."""
+    db.cur.execute(
+        """
+        SELECT p.id AS player_id, p.player_name, pts.player_number, p.photo_key
+        FROM player_teams_by_season pts
+        JOIN players p ON p.id = pts.player_id
+        WHERE pts.player_team_id = %s AND pts.season = %s
+        ORDER BY p.player_name;
+        """,
+        (team_id, season)
+    )
+    players = fetch_dicts(db.cur)
+    etag = make_etag('roster', team_id, season, tuple(sorted((p['player_id'], p['player_number']) for p in players)))
+    return {'team_id': team_id, 'season': season, 'players': players}, etag, {f"team:{team_id}:{season}"}
+
+
+LEADERBOARD_SIZE = int(os.environ.get('READ_API_LEADERBOARD_SIZE', '50'))
+
+
+def player_leaderboard(db, season, zone=None):
+    """Jogadores com mais arremessos convertidos na temporada (opcionalmente em uma zona), lido dos agregados."""
+    if zone is None:
+        source = "(SELECT * FROM season_player_totals WHERE season = %s)"
+        params = (season,)
+    else:
+        source = """
+            (SELECT season, player_id, team_id, sum(attempts) AS attempts, sum(makes) AS makes
+             FROM season_player_shot_totals
+             WHERE season = %s AND shot_zone = %s
+             GROUP BY season, player_id, team_id)
+        """
+        params = (season, zone)
+    db.cur.execute(
+        f"""
+        SELECT t.player_id, p.player_name, t.team_id, tm.name AS team_name,
+               t.attempts, t.makes, round(t.makes::numeric / NULLIF(t.attempts, 0), 3)::float AS percentage
+        FROM {source} t
+        LEFT JOIN players p ON p.id = t.player_id
+        LEFT JOIN teams tm ON tm.id = t.team_id
+        ORDER BY t.makes DESC, t.attempts, t.player_id
+        LIMIT %s;
+        """,
+        (*params, LEADERBOARD_SIZE)
+    )
+    players = fetch_dicts(db.cur)
+    etag = make_etag('leaderboard', season, zone, tuple((p['player_id'], p['team_id'], p['attempts'], p['makes']) for p in players))
+    return {'season': season, 'zone': zone, 'players': players}, etag, {f"season:{season}"}
+
+
+def zone_leaderboard(db, zone, season):
+    return player_leaderboard(db, season, zone)
+
+
+def season_standings(db, season):
+    """Classificação das equipes na temporada, lida dos agregados."""
+    db.cur.execute(
+        """
+        SELECT t.team_id, tm.name AS team_name, t.games_played, t.wins,
+               t.games_played - t.wins AS losses, t.points_for, t.points_against,
+               s.attempts, s.makes
+        FROM season_team_totals t
+        LEFT JOIN teams tm ON tm.id = t.team_id
+        LEFT JOIN (
+            SELECT team_id, sum(attempts) AS attempts, sum(makes) AS makes
+            FROM season_player_totals WHERE season = %s GROUP BY team_id
+        ) s ON s.team_id = t.team_id
+        WHERE t.season = %s
+        ORDER BY t.wins DESC, t.points_for - t.points_against DESC, t.team_id;
+        """,
+        (season, season)
+    )
+    teams = fetch_dicts(db.cur)
+    etag = make_etag('standings', season, tuple((t['team_id'], t['games_played'], t['wins'], t['points_for'], t['points_against'], t['makes']) for t in teams))
+    return {'season': season, 'teams': teams}, etag, {f"season:{season}"}
+
+
+# (padrão da rota, conversor dos grupos da URL, parâmetros obrigatórios da query string, visão)
+ROUTES = [
+    (re.compile(r'^/schedule$'), None, ('season',), season_schedule),
+    (re.compile(r'^/games/(\d+)$'), int, (), game_detail),
+    (re.compile(r'^/games/(\d+)/chart$'), int, (), game_shot_chart),
+    (re.compile(r'^/players/(\d+)/shots$'), int, ('season',), player_shot_chart),
+    (re.compile(r'^/teams/(\w+)/roster$'), str, ('season',), team_roster),
+    (re.compile(r'^/leaderboard$'), None, ('season',), player_leaderboard),
+    (re.compile(r'^/leaderboard/(\w+)$'), str, ('season',), zone_leaderboard),
+    (re.compile(r'^/standings$'), None, ('season',), season_standings),
+]
+
+
+class ReadService:
+    """Resolve as visões da API, servindo do cache sempre que possível."""
+
+    def __init__(self, cache=None):
+        self.cache = cache or ViewCache()
+
+    def resolve(self, path, query):
+        """Retorna (status, corpo, etag) para uma rota GET."""
+        for pattern, convert, query_params, view in ROUTES:
+            match = pattern.match(path)
+            if not match:
+                continue
+            args = [convert(arg) for arg in match.groups()]
+            for param in query_params:
+                values = query.get(param)
+                if not values:
+                    return 400, json.dumps({'error': f"Parâmetro obrigatório ausente: {param}"}), None
+                args.append(values[0])
+
+            key = (view.__name__, *args)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return 200, cached[0], cached[1]
+
+            generation = self.cache.begin()
+            with DatabaseManager(DB_CONFIG) as db:
+                payload, etag, tags = view(db, *args)
+            if payload is None:
+                return 404, json.dumps({'error': 'Não encontrado'}), None
+            body = json.dumps(payload, default=str, ensure_ascii=False)
+            self.cache.set(key, body, etag, tags, generation)
+            return 200, body, etag
+        return 404, json.dumps({'error': 'Rota desconhecida'}), None
+
+    def listen_for_invalidations(self, poll_timeout=5.0):
+        """
+        Remove do cache as visões do jogo, da temporada e das duas equipes a cada
+        mudança publicada pelo pipeline. Se a conexão de notificações cair, o
+        cache inteiro é descartado, pois mudanças podem ter sido perdidas.
+        """
+        notifications.listen(
+            lambda change: self.cache.invalidate(change_tags(change)),
+            on_reconnect=self.cache.clear,
+            poll_timeout=poll_timeout,
+        )
+
+def make_handler(service):
+
+    class ReadApiHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                status, body, etag = service.resolve(url.path, parse_qs(url.query))
+            except Exception as e:
+                logger.error(f"Erro ao resolver '{self.path}': {e}", exc_info=True)
+                status, body, etag = 500, json.dumps({'error': 'Erro interno'}), None
+
+            if etag and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            if etag:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return ReadApiHandler
+
+
+def serve(host, port):
+    service = ReadService()
+    threading.Thread(target=service.listen_for_invalidations, daemon=True).start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    logger.info(f"API de leitura ouvindo em http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API de leitura (JSON) com cache para jogos, elencos e arremessos.")
+    parser.add_argument('--host', default=os.environ.get('READ_API_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('READ_API_PORT', '8080')))
+    args = parser.parse_args()
+    serve(args.host, args.port)
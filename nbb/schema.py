@@ -0,0 +1,184 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG, close_pool
+import psycopg2
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+# Primeira linha das migrações que não podem rodar em transação (ex.: CREATE INDEX CONCURRENTLY);
+# são executadas comando a comando, em autocommit, e devem ser idempotentes (IF NOT EXISTS)
+NO_TRANSACTION = '-- nbb:no-transaction'
+CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+# Chave do advisory lock que serializa crawlers aplicando migrações ao mesmo tempo
+MIGRATION_LOCK = 6_226_274
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+
+
+class Migration:
+
+    def __init__(self, path):
+        match = MIGRATION_FILE.match(os.path.basename(path))
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        with open(path, encoding='utf-8') as f:
+            self.sql = f.read()
+        self.transactional = not self.sql.startswith(NO_TRANSACTION)
+
+    def statements(self):
+        """Comandos da migração, um por ';' no fim da linha (comentários de linha removidos)."""
+        code = '\n'.join(line for line in self.sql.splitlines() if not line.lstrip().startswith('--'))
+        return [statement.strip() for statement in re.split(r';\s*$', code, flags=re.MULTILINE) if statement.strip()]
+
+
+def migrations():
+    """Migrações do diretório nbb/migrations, em ordem de versão."""
+    found = [Migration(os.path.join(MIGRATIONS_DIR, name)) for name in os.listdir(MIGRATIONS_DIR) if MIGRATION_FILE.match(name)]
+    return sorted(found, key=lambda migration: migration.version)
+
+
+def latest_version():
+    return max((migration.version for migration in migrations()), default=0)
+
+
+def current_version(cur):
+    """Versão aplicada no banco (0 se schema_migrations ainda não existe)."""
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(max(version), 0) FROM schema_migrations;")
+    return cur.fetchone()[0]
+
+
+def ensure_schema(auto_migrate=True):
+    """
+    Verificação de abertura do crawl: uma consulta à versão do schema, sem DDL nem
+    locks nas tabelas. Se houver migrações pendentes, aplica-as (auto_migrate) ou
+    falha pedindo 'python -m nbb.schema migrate'. Retorna a versão do banco.
+    """
+    with DatabaseManager(DB_CONFIG) as db:
+        version = current_version(db.cur)
+    latest = latest_version()
+    if version >= latest:
+        return version
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Schema do banco na versão {version}, o código espera {latest}: rode 'python -m nbb.schema migrate'."
+        )
+    return migrate()
+
+
+def migrate(target=None):
+    """
+    Aplica as migrações pendentes (até target) em uma conexão dedicada, sob um
+    advisory lock: outros crawlers abrindo ao mesmo tempo esperam e encontram o
+    schema já atualizado. Cada migração transacional roda com o seu registro em
+    schema_migrations na mesma transação. Retorna a versão final.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            acquire_migration_lock(cur)
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                """
+            )
+            version = current_version(cur)
+            for migration in migrations():
+                if migration.version <= version or (target is not None and migration.version > target):
+                    continue
+                logger.info(f"Aplicando migração {migration.version:04d}_{migration.name}...")
+                if migration.transactional:
+                    apply_in_transaction(conn, migration)
+                else:
+                    apply_without_transaction(cur, migration)
+                version = migration.version
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK,))
+        return version
+    finally:
+        conn.close()
+
+
+def acquire_migration_lock(cur):
+    """
+    Espera o lock com pg_try_advisory_lock em vez de pg_advisory_lock: quem fica
+    bloqueado em pg_advisory_lock está dentro de uma transação, e o CREATE INDEX
+    CONCURRENTLY de quem detém o lock espera todas as transações abertas (deadlock).
+    """
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(%s);", (MIGRATION_LOCK,))
+        if cur.fetchone()[0]:
+            return
+        time.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+
+def apply_in_transaction(conn, migration):
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(migration.sql)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (migration.version, migration.name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def apply_without_transaction(cur, migration):
+    """
+    Executa os comandos um a um em autocommit. Um CREATE INDEX CONCURRENTLY
+    interrompido deixa o índice inválido, e o IF NOT EXISTS o manteria assim na
+    próxima tentativa: os índices inválidos da própria migração são removidos antes.
+    """
+    statements = migration.statements()
+    index_names = [match.group(1) for match in map(CONCURRENT_INDEX.search, statements) if match]
+    if index_names:
+        cur.execute(
+            """
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(%s);
+            """,
+            (index_names,)
+        )
+        for (name,) in cur.fetchall():
+            logger.warning(f"Removendo o índice inválido '{name}' deixado por uma tentativa anterior.")
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    for statement in statements:
+        cur.execute(statement)
+    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (migration.version, migration.name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versão do schema do banco e migrações (nbb/migrations).")
+    parser.add_argument('command', choices=['status', 'migrate'])
+    parser.add_argument('--target', type=int, help="Com 'migrate': para nesta versão.")
+    args = parser.parse_args()
+    try:
+        if args.command == 'migrate':
+            print(f"Schema na versão {migrate(args.target)}.")
+        else:
+            with DatabaseManager(DB_CONFIG) as db:
+                version = current_version(db.cur)
+            for migration in migrations():
+                state = 'aplicada' if migration.version <= version else 'pendente'
+                print(f"{migration.version:04d}_{migration.name}: {state}")
+    finally:
+        close_pool()
@@ -7,6 +7,8 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
 BOT_NAME = "nbb"
 
 SPIDER_MODULES = ["nbb.spiders"]
@@ -50,21 +52,69 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
+DOWNLOADER_MIDDLEWARES = {
 #    "nbb.middlewares.NbbDownloaderMiddleware": 543,
-#}
+    "nbb.middlewares.BackpressureMiddleware": 50,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "nbb.profiling.ProfilingExtension": 500,
+}
+
+# Perfilamento sob demanda (nbb.profiling): NBB_PROFILE=1 ou -s PROFILING_ENABLED=1
+PROFILING_ENABLED = os.environ.get("NBB_PROFILE", "0").lower() in ("1", "true", "yes")
+PROFILING_DIR = os.environ.get("NBB_PROFILE_DIR", "profiles")
+# Intervalo (segundos) entre amostras de pilha usadas no flamegraph
+PROFILING_SAMPLE_INTERVAL = 0.005
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
    "nbb.pipelines.NbbPipeline": 300,
+   # Depois do NbbPipeline: o download das imagens não atrasa a gravação de equipes e jogadores
+   "nbb.assets.AssetsPipeline": 400,
+}
+
+# Linhas acumuladas pelo NbbPipeline antes de cada gravação em lote no banco
+DB_BATCH_SIZE = 500
+
+# Na abertura, o NbbPipeline só confere a versão do schema; com migrações pendentes (nbb/migrations)
+# aplica-as sob um advisory lock, ou falha se DB_AUTO_MIGRATE=0 (rode `python -m nbb.schema migrate`)
+DB_AUTO_MIGRATE = os.environ.get("DB_AUTO_MIGRATE", "1").lower() in ("1", "true", "yes")
+
+# Crawl em duas fases (nbb.spool): com DB_SPOOL_DIR definido, os pipelines não acessam o banco e
+# só gravam as linhas em arquivos gzip por tabela, fechados a cada DB_SPOOL_ROTATE_ROWS linhas;
+# `python -m nbb.spool load` os carrega depois
+DB_SPOOL_DIR = os.environ.get("DB_SPOOL_DIR")
+DB_SPOOL_ROTATE_ROWS = int(os.environ.get("DB_SPOOL_ROTATE_ROWS", "50000"))
+
+# Backpressure (nbb.middlewares.BackpressureMiddleware): páginas de jogo esperam enquanto
+# a fila de escrita passar de qualquer um dos limites, até cair abaixo de RESUME_RATIO do limite
+DB_QUEUE_MAX_ROWS = int(os.environ.get("DB_QUEUE_MAX_ROWS", "20000"))
+DB_QUEUE_MAX_BYTES = int(os.environ.get("DB_QUEUE_MAX_BYTES", str(64 * 1024 * 1024)))
+DB_QUEUE_RESUME_RATIO = 0.5
+DB_QUEUE_POLL_INTERVAL = 0.2
+
+# Processos que analisam as páginas de jogo (0 = no próprio reactor, como antes)
+PARSE_PROCESSES = int(os.environ.get("PARSE_PROCESSES", "0"))
+
+# Tokens da classe CSS do arremesso que indicam acerto/erro (nbb.shot_enrichment); arremessos com
+# uma classe sem nenhum dos dois ficam com shot_made nulo e são contados em nbb/shots/unclassified
+SHOT_MADE_TOKENS = ["made"]
+SHOT_MISSED_TOKENS = ["miss"]
+
+# Download de logos e fotos de jogadores (nbb.assets.AssetsPipeline)
+# IMAGES_STORE aceita um diretório local ou um URI s3:// (ex.: MinIO como object store local)
+IMAGES_STORE = os.environ.get("ASSETS_STORE", "assets")
+IMAGES_THUMBS = {
+    "small": (64, 64),
+    "medium": (160, 160),
 }
+# Dias até uma URL já baixada ser verificada novamente
+ASSETS_EXPIRES = 90
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -0,0 +1,176 @@
+from nbb.shot_enrichment import ZONE_PAINT, ZONE_MID_RANGE, ZONE_CORNER_THREE, ZONE_ABOVE_BREAK_THREE, quarter_number
+from psycopg2.extras import execute_values
+import numpy as np
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+FORMAT_VERSION = 1
+
+# Um registro de 16 bytes por arremesso, little-endian e sem padding, na ordem de shots.id
+SHOT_DTYPE = np.dtype([
+    ('player_id', '<i4'),
+    ('x', '<i2'),          # shot_x_location * 100 (0..10000)
+    ('y', '<i2'),          # shot_y_location * 100
+    ('seconds', '<u2'),    # relógio do quarto em segundos (MISSING se desconhecido)
+    ('distance', '<u2'),   # centímetros (MISSING se desconhecido)
+    ('quarter', 'u1'),     # 0 se não numérico
+    ('team', 'u1'),        # TEAM_HOME, TEAM_AWAY ou TEAM_UNKNOWN
+    ('type', 'u1'),        # TYPE_UNKNOWN, TYPE_MADE ou TYPE_MISSED
+    ('zone', 'u1'),        # índice em ZONES
+])
+
+MISSING = np.iinfo(np.uint16).max
+TEAM_HOME, TEAM_AWAY, TEAM_UNKNOWN = 0, 1, 255
+TYPE_UNKNOWN, TYPE_MADE, TYPE_MISSED = 0, 1, 2
+ZONES = (None, ZONE_PAINT, ZONE_MID_RANGE, ZONE_CORNER_THREE, ZONE_ABOVE_BREAK_THREE)
+ZONE_CODES = {zone: code for code, zone in enumerate(ZONES)}
+
+
+def clock_seconds(value):
+    """
+    Segundos do relógio do quarto. O site publica 'mm:ss', que o PostgreSQL grava
+    na coluna TIME como HH:MM; por isso horas valem minutos e minutos valem segundos.
+    """
+    if value is None:
+        return MISSING
+    return value.hour * 60 + value.minute
+
+
+def pack(rows, home_team_id, away_team_id):
+    """
+    Empacota os arremessos de um jogo. rows: (player_id, team_id, shot_quarter,
+    shot_time, shot_x_location, shot_y_location, shot_made, shot_distance, shot_zone).
+    """
+    shots = np.zeros(len(rows), dtype=SHOT_DTYPE)
+    if not rows:
+        return shots.tobytes()
+    player_ids, team_ids, quarters, times, x, y, made, distance, zones = zip(*rows)
+    shots['player_id'] = player_ids
+    shots['x'] = np.round(np.asarray(x, dtype=np.float64) * 100)
+    shots['y'] = np.round(np.asarray(y, dtype=np.float64) * 100)
+    shots['seconds'] = [clock_seconds(value) for value in times]
+    shots['distance'] = [MISSING if value is None else round(value * 100) for value in distance]
+    shots['quarter'] = [quarter_number(value) for value in quarters]
+    shots['team'] = [
+        TEAM_HOME if team_id == home_team_id else TEAM_AWAY if team_id == away_team_id else TEAM_UNKNOWN
+        for team_id in team_ids
+    ]
+    shots['type'] = [TYPE_UNKNOWN if value is None else TYPE_MADE if value else TYPE_MISSED for value in made]
+    shots['zone'] = [ZONE_CODES.get(zone, 0) for zone in zones]
+    return shots.tobytes()
+
+
+def unpack(data):
+    """Visão NumPy (sem cópia, somente leitura) do valor empacotado."""
+    return np.frombuffer(data, dtype=SHOT_DTYPE)
+
+
+def refresh_games(db, game_ids):
+    """Reempacota, na transação do chamador, os arremessos dos jogos informados a partir de shots."""
+    game_ids = sorted(set(game_ids))
+    if not game_ids:
+        return
+    db.cur.execute(
+        """
+        SELECT g.id, g.home_team_id, g.away_team_id,
+               s.player_id, s.team_id, s.shot_quarter, s.shot_time,
+               s.shot_x_location, s.shot_y_location, s.shot_made, s.shot_distance, s.shot_zone
+        FROM games g
+        LEFT JOIN shots s ON s.game_id = g.id
+        WHERE g.id = ANY(%s)
+        ORDER BY g.id, s.id;
+        """,
+        (game_ids,)
+    )
+    games = {}
+    for game_id, home_team_id, away_team_id, *shot in db.cur.fetchall():
+        _, rows = games.setdefault(game_id, ((home_team_id, away_team_id), []))
+        if shot[0] is not None:
+            rows.append(shot)
+
+    values = []
+    for game_id, ((home_team_id, away_team_id), rows) in games.items():
+        values.append((game_id, len(rows), FORMAT_VERSION, pack(rows, home_team_id, away_team_id)))
+    if not values:
+        return
+    execute_values(
+        db.cur,
+        """
+        INSERT INTO game_shot_arrays (game_id, shot_count, format_version, shots)
+        VALUES %s
+        ON CONFLICT (game_id) DO UPDATE SET
+            shot_count = EXCLUDED.shot_count,
+            format_version = EXCLUDED.format_version,
+            shots = EXCLUDED.shots,
+            updated_at = now();
+        """,
+        values,
+        template="(%s, %s, %s, %s::bytea)",
+        page_size=len(values),
+    )
+
+
+def to_columns(shots):
+    """Converte a visão empacotada em colunas com os valores originais (para JSON)."""
+    seconds = shots['seconds']
+    distance = shots['distance']
+    return {
+        'player_id': shots['player_id'].tolist(),
+        'x': (shots['x'] / 100).tolist(),
+        'y': (shots['y'] / 100).tolist(),
+        'seconds': np.where(seconds == MISSING, None, seconds).tolist(),
+        'distance': np.where(distance == MISSING, None, distance / 100).tolist(),
+        'quarter': shots['quarter'].tolist(),
+        'team': np.array(['home', 'away', None], dtype=object)[np.minimum(shots['team'], 2)].tolist(),
+        'made': np.array([None, True, False], dtype=object)[shots['type']].tolist(),
+        'zone': np.array(ZONES, dtype=object)[shots['zone']].tolist(),
+    }
+
+
+def fetch_game(db, game_id):
+    """
+    Lê os arremessos de um jogo em uma única linha. Retorna (visão NumPy,
+    home_team_id, away_team_id) ou None se o jogo não tiver arremessos empacotados.
+    """
+    db.cur.execute(
+        """
+        SELECT a.format_version, a.shots, g.home_team_id, g.away_team_id
+        FROM game_shot_arrays a
+        JOIN games g ON g.id = a.game_id
+        WHERE a.game_id = %s;
+        """,
+        (game_id,)
+    )
+    row = db.cur.fetchone()
+    if row is None:
+        return None
+    format_version, data, home_team_id, away_team_id = row
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Formato de arremessos empacotados desconhecido: {format_version}")
+    return unpack(data), home_team_id, away_team_id
+
+
+if __name__ == "__main__":
+    from nbb.db_manager import DatabaseManager, DB_CONFIG, close_pool
+
+    parser = argparse.ArgumentParser(description="Reempacota os arremessos de todos os jogos a partir da tabela shots.")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--chunk-size', type=int, default=200, help="Jogos por comando.")
+    args = parser.parse_args()
+    try:
+        with DatabaseManager(DB_CONFIG) as db:
+            db.cur.execute("SELECT id FROM games ORDER BY id;")
+            game_ids = [row[0] for row in db.cur.fetchall()]
+            for start in range(0, len(game_ids), args.chunk_size):
+                refresh_games(db, game_ids[start:start + args.chunk_size])
+        print(f"Arremessos de {len(game_ids)} jogo(s) reempacotados.")
+    finally:
+        close_pool()
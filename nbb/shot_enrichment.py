@@ -0,0 +1,188 @@
+import numpy as np
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+# Quadra FIBA (metros). As coordenadas do site são percentuais: x ao longo do
+# comprimento (left) e y ao longo da largura (top).
+COURT_LENGTH = 28.0
+COURT_WIDTH = 15.0
+BASKET_FROM_BASELINE = 1.575
+THREE_POINT_RADIUS = 6.75
+CORNER_THREE_SIDELINE = 0.9
+CORNER_THREE_DEPTH = 2.99
+PAINT_WIDTH = 4.9
+PAINT_DEPTH = 5.8
+
+ZONE_PAINT = 'paint'
+ZONE_MID_RANGE = 'mid_range'
+ZONE_CORNER_THREE = 'corner_3'
+ZONE_ABOVE_BREAK_THREE = 'above_break_3'
+
+# Tokens da classe CSS do arremesso no gráfico da página do jogo ("shot made p2", "shot miss p3"; ver
+# tests/fixtures/game_report.html) que indicam acerto/erro (configuráveis em SHOT_MADE_TOKENS/SHOT_MISSED_TOKENS)
+MADE_TOKENS = ('made',)
+MISSED_TOKENS = ('miss',)
+
+
+class ShotEnricher:
+    """
+    Deriva, para todos os arremessos de um jogo de uma vez, se o arremesso foi
+    convertido, a distância até a cesta e a zona da quadra.
+
+    O lado da quadra atacado por cada equipe em cada tempo é inferido pela
+    mediana de x dos seus arremessos (a maioria é próxima da cesta atacada);
+    prorrogações seguem o lado do segundo tempo. Arremessos sem coordenadas
+    (0, 0) ficam sem distância e sem zona.
+    """
+
+    def __init__(self, made_tokens=MADE_TOKENS, missed_tokens=MISSED_TOKENS):
+        self.made_tokens = frozenset(token.lower() for token in made_tokens)
+        self.missed_tokens = frozenset(token.lower() for token in missed_tokens)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings.getlist('SHOT_MADE_TOKENS') or MADE_TOKENS,
+            settings.getlist('SHOT_MISSED_TOKENS') or MISSED_TOKENS,
+        )
+
+    def shot_made(self, shot_type):
+        """True/False pelos tokens da classe; None se ela não tiver nenhum dos dois (markup desconhecido)."""
+        tokens = set(str(shot_type or '').lower().split())
+        if tokens & self.made_tokens:
+            return True
+        if tokens & self.missed_tokens:
+            return False
+        return None
+
+    def enrich(self, x, y, quarters, teams, shot_types):
+        """
+        Recebe sequências paralelas (uma posição por arremesso) e retorna três
+        listas: shot_made (bool/None), shot_distance (metros/None) e shot_zone.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        # Classes repetem muito ("shot made p2"...): interpreta cada uma uma única vez
+        classes, class_index = np.unique(np.asarray([str(t or '') for t in shot_types]), return_inverse=True)
+        made = np.array([self.shot_made(c) for c in classes], dtype=object)[class_index]
+
+        # Grupo = (equipe, tempo); o lado atacado é o da mediana de x do grupo
+        second_half = np.array([quarter_number(q) >= 3 for q in quarters], dtype=bool)
+        _, team_index = np.unique(np.asarray([str(t) for t in teams]), return_inverse=True)
+        groups = team_index * 2 + second_half
+        located = (x != 0) | (y != 0)
+        attacks_left = np.zeros(len(x), dtype=bool)
+        for group in np.unique(groups):
+            members = groups == group
+            group_x = x[members & located]
+            attacks_left[members] = group_x.size > 0 and np.median(group_x) < 50.0
+
+        # Profundidade a partir da linha de fundo atacada e deslocamento lateral, em metros
+        x_m = x / 100.0 * COURT_LENGTH
+        depth = np.where(attacks_left, x_m, COURT_LENGTH - x_m)
+        lateral = np.abs(y / 100.0 * COURT_WIDTH - COURT_WIDTH / 2)
+        distance = np.hypot(depth - BASKET_FROM_BASELINE, lateral)
+
+        corner_three = (lateral >= COURT_WIDTH / 2 - CORNER_THREE_SIDELINE) & (depth <= CORNER_THREE_DEPTH)
+        three = corner_three | (distance >= THREE_POINT_RADIUS)
+        paint = (lateral <= PAINT_WIDTH / 2) & (depth <= PAINT_DEPTH) & ~three
+        zone = np.select(
+            [corner_three, three, paint],
+            [ZONE_CORNER_THREE, ZONE_ABOVE_BREAK_THREE, ZONE_PAINT],
+            default=ZONE_MID_RANGE,
+        ).astype(object)
+
+        zone[~located] = None
+        distance = np.round(distance, 2).astype(object)
+        distance[~located] = None
+        return made.tolist(), distance.tolist(), zone.tolist()
+
+    def enrich_items(self, shot_items):
+        """Preenche shot_made, shot_distance e shot_zone nos ShotItems de um jogo."""
+        if not shot_items:
+            return shot_items
+        made, distance, zone = self.enrich(
+            [item.get('shot_x_location') or 0.0 for item in shot_items],
+            [item.get('shot_y_location') or 0.0 for item in shot_items],
+            [item.get('shot_quarter') for item in shot_items],
+            [item.get('team_id') for item in shot_items],
+            [item.get('shot_type') for item in shot_items],
+        )
+        for item, shot_made, shot_distance, shot_zone in zip(shot_items, made, distance, zone):
+            item['shot_made'] = shot_made
+            item['shot_distance'] = shot_distance
+            item['shot_zone'] = shot_zone
+        return shot_items
+
+
+def quarter_number(quarter):
+    try:
+        return int(quarter)
+    except (TypeError, ValueError):
+        return 0
+
+
+def backfill(enricher=None):
+    """
+    Calcula as colunas derivadas dos arremessos já gravados que ainda não as
+    possuem, jogo a jogo. Retorna o número de arremessos atualizados.
+    """
+    # Importados aqui: o enriquecimento também roda nos processos de parsing
+    # (nbb.extraction.parse_game_report), que não devem abrir um pool de conexões.
+    from nbb.db_manager import DatabaseManager, DB_CONFIG
+    from nbb.batch_writer import refresh_games
+    from psycopg2.extras import execute_values
+
+    enricher = enricher or ShotEnricher()
+    updated = 0
+    with DatabaseManager(DB_CONFIG) as db:
+        db.cur.execute("SELECT DISTINCT game_id FROM shots WHERE shot_zone IS NULL AND shot_made IS NULL;")
+        game_ids = [row[0] for row in db.cur.fetchall()]
+        for game_id in game_ids:
+            db.cur.execute(
+                """
+                SELECT id, shot_x_location, shot_y_location, shot_quarter, team_id, shot_type
+                FROM shots WHERE game_id = %s;
+                """,
+                (game_id,)
+            )
+            rows = db.cur.fetchall()
+            ids, x, y, quarters, teams, shot_types = zip(*rows)
+            made, distance, zone = enricher.enrich(
+                [value or 0.0 for value in x], [value or 0.0 for value in y], quarters, teams, shot_types
+            )
+            execute_values(
+                db.cur,
+                """
+                UPDATE shots SET shot_made = v.shot_made, shot_distance = v.shot_distance, shot_zone = v.shot_zone
+                FROM (VALUES %s) AS v (id, shot_made, shot_distance, shot_zone)
+                WHERE shots.id = v.id;
+                """,
+                list(zip(ids, made, distance, zone)),
+                template="(%s, %s::boolean, %s::real, %s::text)",
+            )
+            updated += len(rows)
+        if game_ids:
+            refresh_games(db, game_ids)
+    return updated
+
+
+if __name__ == "__main__":
+    from nbb.db_manager import close_pool
+
+    parser = argparse.ArgumentParser(description="Calcula acerto, distância e zona dos arremessos já gravados.")
+    parser.add_argument('command', choices=['backfill'])
+    args = parser.parse_args()
+    try:
+        print(f"{backfill()} arremesso(s) atualizado(s).")
+    finally:
+        close_pool()
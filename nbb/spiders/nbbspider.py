@@ -1,11 +1,23 @@
 import scrapy
-from nbb.items import  GameItem, ShotItem, PlayerItem, TeamItem
-from nbb.item_loaders.games_loaders import GameLoader 
-from nbb.item_loaders.shots_loaders import ShotLoader
-from nbb.item_loaders.player_loader import PlayerLoader
-from nbb.item_loaders.team_loader import TeamLoader
-import hashlib
+from scrapy import signals
+from scrapy.exceptions import CloseSpider
+from nbb.extraction import HOME_TEAM, AWAY_TEAM, GAME, extract_players, extract_shots, parse_game_report
+from nbb.items import PlayerItem, ShotItem
+from nbb.shot_enrichment import ShotEnricher
+from nbb.identity import IdentityRegistry, snapshot_path
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import logging
 import os
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
 
 urls = {
     '2017/2018': 'https://lnb.com.br/nbb/tabela-de-jogos/?season%5B%5D=41',
@@ -38,46 +50,74 @@ class GameSpider(scrapy.Spider):
     name = 'games'
     start_urls=[url]
 
+    parse_pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.shot_enricher = ShotEnricher.from_settings(crawler.settings)
+        spider.unclassified_shot_types = set()
+        processes = crawler.settings.getint('PARSE_PROCESSES', 0)
+        if processes > 0:
+            # spawn: os workers não herdam o reactor nem as conexões do pool do processo principal
+            spider.parse_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        spider.spool_dir = crawler.settings.get('DB_SPOOL_DIR')
+        spider.identities = None
+        # spider_opened vem depois do open_spider dos pipelines, que garante o schema
+        crawler.signals.connect(spider.load_identities, signal=signals.spider_opened)
+        return spider
+
+    def load_identities(self, spider):
+        """
+        Carrega o registro de identidades uma vez por crawl: do banco ou, em modo
+        spool, do snapshot no diretório do spool. Se não der, o crawl é encerrado
+        no primeiro parse: com o registro vazio, uma equipe que trocou de logo
+        receberia um id novo, e ele ficaria registrado para sempre.
+        """
+        try:
+            if self.spool_dir:
+                self.identities = IdentityRegistry.load_snapshot(snapshot_path(self.spool_dir))
+            else:
+                self.identities = IdentityRegistry.load()
+        except Exception as e:
+            if self.spool_dir:
+                logger.error(
+                    f"Snapshot do registro de identidades indisponível em '{self.spool_dir}'; "
+                    f"gere-o com 'python -m nbb.spool snapshot': {e}"
+                )
+            else:
+                logger.error(f"Erro ao carregar o registro de identidades: {e}", exc_info=True)
+
+    def closed(self, reason):
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=True, cancel_futures=True)
+        if self.spool_dir and self.identities is not None:
+            # O próximo crawl em modo spool já conhece as chaves novas, mesmo antes do load
+            self.identities.save_snapshot(snapshot_path(self.spool_dir))
+
     def parse(self, response):
 
+        if self.identities is None:
+            raise CloseSpider('identity_registry_unavailable')
+
         games_table = response.css("table.table_matches_table tbody:nth-of-type(1) tr")
         
         for game in games_table:
             
-            away_team_loader = TeamLoader(item = TeamItem(), selector = game)
-            home_team_loader = TeamLoader(item = TeamItem(), selector = game)
-            away_team_loader.add_css('name','td.visitor_team_value.show-for-medium span.team-shortname::text')
-            away_team_loader.add_css('logo', 'td.logo_visitor_team.show-for-medium img::attr(src)')
-            home_team_loader.add_css('name','td.home_team_value.show-for-medium span.team-shortname::text')
-            home_team_loader.add_css('logo', 'td.logo_home_team.show-for-medium img::attr(src)')
+            away_team_item = AWAY_TEAM.extract(game)
+            home_team_item = HOME_TEAM.extract(game)
             
-            away_team_item = away_team_loader.load_item()
-            home_team_item = home_team_loader.load_item()
+            away_team_id = self.identities.team_id(away_team_item.get('logo'), away_team_item.get('name'))
+            home_team_id = self.identities.team_id(home_team_item.get('logo'), home_team_item.get('name'))
+            away_team_item['id'] = away_team_id
+            home_team_item['id'] = home_team_id
             yield away_team_item
             yield home_team_item
             
-            
-            away_team_id = self.generate_team_id(away_team_item.get('logo'))
-            home_team_id = self.generate_team_id(home_team_item.get('logo') )
-            
-            game_loader = GameLoader(item = GameItem(), selector = game)
-            
-            game_loader.add_css('game_id', 'td::attr(data-real-id)')
-            game_loader.add_value('home_team_id',home_team_id)
-            game_loader.add_value('away_team_id',away_team_id)
-            game_loader.add_css('game_date', 'td.date_value.show-for-medium span::text')
-            game_loader.add_css('game_time','td.date_value.show-for-medium span:nth-child(2)::text')
-            game_loader.add_css('home_team_score','td.score_value.show-for-medium span.home::text')
-            game_loader.add_css('away_team_score','td.score_value.show-for-medium span.away::text')
-            game_loader.add_css('round','td.game_value.hide_value span::text')
-            game_loader.add_css('stage','td.stage_value.hide_value::text')
-            game_loader.add_css('season','td.champ_value.hide_value::text')
-            game_loader.add_css('arena', 'td.gym_value.hide_value::text')
-            game_loader.add_css('link','td.score_value a.match_score_relatorio::attr(href)')
-            
-            game_item = game_loader.load_item()
+            game_item = GAME.extract(game, home_team_id=home_team_id, away_team_id=away_team_id)
 
             yield game_item
+            yield from self.identities.drain()
 
             game_link = game_item.get('link')
             game_id = game_item.get('game_id')
@@ -86,8 +126,8 @@ class GameSpider(scrapy.Spider):
             if game_link:
                 yield response.follow(
                     game_link,
-                    self.parse_athlete,
-                    meta={'game_id': game_id, 'season': season, 'home_team_id': home_team_id,'away_team_id': away_team_id, 'game_link': game_link}
+                    self.parse_athlete_in_pool if self.parse_pool else self.parse_athlete,
+                    meta={'game_id': game_id, 'season': season, 'home_team_id': home_team_id,'away_team_id': away_team_id, 'game_link': game_link, 'db_backpressure': True}
                 )         
             
     def parse_athlete(self, response):
@@ -95,58 +135,63 @@ class GameSpider(scrapy.Spider):
         home_team_id = response.meta['home_team_id']
         away_team_id = response.meta['away_team_id']
 
-        players_info = {"home": {}, "away": {}}
-
-        teams = [
-            ("away", away_team_id, response.css("div.graphic_move div.players_block.players_block_right li")),
-            ("home", home_team_id, response.css("div.graphic_move div.players_block.players_block_left li")),
-        ]
-
-        for side, team_id, players in teams:
-            for player in players:
-                player_loader = PlayerLoader(item=PlayerItem(), selector=player)
-                player_loader.add_css("player_number", "div.number::text")
-                player_loader.add_css("player_name", "div.name::text")
-                player_loader.add_css("player_id", "::attr(idj)")
-                player_loader.add_css("player_photo", "::attr(avatar)")
-                player_loader.add_value("player_team_id", team_id)
-                player_loader.add_value("season", season)
-
-                player_item = player_loader.load_item()
-                yield player_item
-
-                player_id = player_item.get("player_id")
-                player_name = player_item.get("player_name")
-
-                players_info[side][player_id] = player_name
-
-        # Se precisar usar players_info depois
-        yield from self.parse_shots(response)   
+        for item in extract_players(response, home_team_id, away_team_id, season):
+            yield self.resolve_player(item)
+        for item in self.parse_shots(response):
+            yield self.resolve_player(item)
+        yield from self.identities.drain()
     
     def parse_shots(self,response):
         game_id = response.meta['game_id']
         home_team_id = response.meta['home_team_id']
         away_team_id = response.meta['away_team_id']
-        shots = response.css('div.graphic_gym li')
-        
-        for shot in shots:
-            shot_loader = ShotLoader(item = ShotItem(), selector = shot)
-            
-            id_team =shot.css('::attr(ide)').get()
-            shot_loader.add_css('player_id','::attr(idj)')
-            shot_loader.add_css('shot_quarter','::attr(idp)')
-            shot_loader.add_css('shot_type','::attr(class)')
-            shot_loader.add_css('shot_time','::attr(time)')
-            shot_loader.add_css('shot_x_location','::attr(style)')
-            shot_loader.add_css('shot_y_location','::attr(style)')
-            shot_loader.add_value('game_id', game_id)
-            
-            if id_team == '1':
-                shot_loader.add_value('team_id',home_team_id)
-            elif id_team == '2':
-                shot_loader.add_value('team_id',away_team_id)
-            
-            yield shot_loader.load_item()
+        shot_items = extract_shots(response, game_id, home_team_id, away_team_id)
+
+        # Acerto, distância e zona são calculados para o jogo inteiro de uma vez
+        shot_items = self.shot_enricher.enrich_items(shot_items)
+        self.count_unclassified(shot_items)
+        yield from shot_items
+
+    async def parse_athlete_in_pool(self, response):
+        """
+        Variante de parse_athlete usada com PARSE_PROCESSES > 0: o HTML é analisado
+        em um processo do pool e o reactor só recebe os registros prontos.
+        """
+        meta = {key: response.meta[key] for key in ('game_id', 'season', 'home_team_id', 'away_team_id')}
+        players, shots = await asyncio.wrap_future(self.parse_pool.submit(
+            parse_game_report, response.body, response.encoding, meta,
+            tuple(self.shot_enricher.made_tokens), tuple(self.shot_enricher.missed_tokens),
+        ))
+        self.count_unclassified(shots)
+        for record in players:
+            yield self.resolve_player(PlayerItem(record))
+        for record in shots:
+            yield self.resolve_player(ShotItem(record))
+        for item in self.identities.drain():
+            yield item
+
+    def count_unclassified(self, shots):
+        """
+        Conta em nbb/shots/unclassified os arremessos cuja classe não tem token de
+        acerto nem de erro (shot_made nulo) e avisa uma vez por classe: uma
+        mudança no markup do site aparece nas estatísticas do crawl.
+        """
+        shot_types = [shot.get('shot_type') for shot in shots if shot.get('shot_made') is None]
+        if not shot_types:
+            return
+        self.crawler.stats.inc_value('nbb/shots/unclassified', len(shot_types))
+        new_types = set(shot_types) - self.unclassified_shot_types
+        if new_types:
+            self.unclassified_shot_types |= new_types
+            logger.warning(
+                f"Classe(s) de arremesso sem token de acerto ou erro: {sorted(map(str, new_types))}. "
+                f"Verifique SHOT_MADE_TOKENS/SHOT_MISSED_TOKENS."
+            )
+
+    def resolve_player(self, item):
+        """Troca o idj do site pelo id interno do jogador (registro de identidades)."""
+        item['player_id'] = self.identities.player_id(item.get('player_id'))
+        return item
          
     
     def transform_quarter(self,value):
@@ -159,8 +204,4 @@ class GameSpider(scrapy.Spider):
             return valor_int
         except ValueError:
             pass
-        return None 
-    
-    
-    def generate_team_id(self, logo_url):
-        return hashlib.md5(logo_url.encode('utf-8')).hexdigest()
+        return None
@@ -0,0 +1,340 @@
+from nbb.db_manager import DatabaseManager, DB_CONFIG, UPSERTS, TABLE_ORDER, close_pool
+from nbb.batch_writer import BatchWriter, refresh_games, written_rows, game_ids_of
+from nbb.schema import ensure_schema
+from nbb.identity import IdentityRegistry, snapshot_path
+import psycopg2
+import argparse
+import datetime
+import glob
+import gzip
+import itertools
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
+
+SPOOL_SUFFIX = '.tsv.gz'
+PARTIAL_SUFFIX = '.part'
+LOADED_DIR = 'loaded'
+
+# Colunas de cada tabela no spool, na ordem de carga: assets (do AssetsPipeline) e depois pais antes dos filhos
+SPOOL_COLUMNS = {
+    'assets': ('url', 'content_hash', 'storage_key'),
+    **{table: UPSERTS[table].columns for table in TABLE_ORDER},
+}
+SPOOL_TABLES = tuple(SPOOL_COLUMNS)
+
+# Numera os SpoolWriters do processo: o NbbPipeline e o AssetsPipeline abrem cada um o seu
+WRITER_NUMBERS = itertools.count(1)
+
+# Coluna com o id do jogo nas tabelas cujas cargas atualizam agregados, arremessos empacotados e notificações
+GAME_ID_COLUMNS = {'games': 'id', 'shots': 'game_id'}
+
+
+def copy_value(value):
+    """Valor no formato texto do COPY: \\N para nulo; barra, tab e quebras de linha escapados."""
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class SpoolFile:
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.file = gzip.open(path + PARTIAL_SUFFIX, 'wt', encoding='utf-8', newline='')
+        self.file.write('\t'.join(columns) + '\n')
+        self.rows = 0
+
+    def write(self, row):
+        self.file.write('\t'.join(copy_value(value) for value in row) + '\n')
+        self.rows += 1
+
+    def close(self):
+        """Fecha o arquivo e o publica com o nome final; só então o load passa a enxergá-lo."""
+        self.file.close()
+        os.replace(self.path + PARTIAL_SUFFIX, self.path)
+
+
+class SpoolWriter:
+    """
+    Grava as linhas em arquivos gzip por tabela, no formato texto do COPY
+    (<diretório>/<tabela>/<execução>-<sequência>.tsv.gz, com as colunas na
+    primeira linha). O arquivo em escrita tem o sufixo .part e é publicado ao ser
+    fechado: a cada rotate_rows linhas e no fim do crawl. Se o crawl cair, só o
+    arquivo aberto de cada tabela se perde. Cada writer tem a sua execução
+    (data, pid e número do writer no processo), então dois writers do mesmo crawl
+    nunca geram o mesmo nome de arquivo.
+    """
+
+    def __init__(self, directory, rotate_rows=50000, run_id=None):
+        self.directory = directory
+        self.rotate_rows = rotate_rows
+        self.run_id = run_id or f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{next(WRITER_NUMBERS)}"
+        self.files = {}
+        self.sequence = 0
+        self.rows = 0
+        self.completed = 0
+
+    def write(self, table, row):
+        spool = self.files.get(table)
+        if spool is None:
+            spool = self.files[table] = self.open(table)
+        spool.write(row)
+        self.rows += 1
+        if spool.rows >= self.rotate_rows:
+            self.rotate(table)
+
+    def open(self, table):
+        folder = os.path.join(self.directory, table)
+        os.makedirs(folder, exist_ok=True)
+        self.sequence += 1
+        path = os.path.join(folder, f"{self.run_id}-{self.sequence:05d}{SPOOL_SUFFIX}")
+        return SpoolFile(path, SPOOL_COLUMNS[table])
+
+    def rotate(self, table):
+        self.files.pop(table).close()
+        self.completed += 1
+
+    def close(self):
+        for table in list(self.files):
+            self.rotate(table)
+
+
+def completed_files(directory, table):
+    return sorted(glob.glob(os.path.join(directory, table, '*' + SPOOL_SUFFIX)))
+
+
+def load(directory, delete=False):
+    """
+    Carrega os arquivos completos do spool, tabela a tabela (pais antes dos
+    filhos) e um arquivo por transação. Os carregados vão para loaded/ (ou são
+    apagados). Para no primeiro arquivo que falhar, para que nenhum filho entre
+    antes do pai; rodar de novo retoma dali. No fim, atualiza o snapshot do
+    registro de identidades no spool. Retorna (arquivos, linhas, arquivo_com_falha).
+    """
+    ensure_schema()
+    result = load_files(directory, delete)
+    save_snapshot(directory)
+    return result
+
+
+def load_files(directory, delete):
+    files = rows = 0
+    for table in SPOOL_TABLES:
+        for path in completed_files(directory, table):
+            try:
+                rows += load_file(path, table)
+                loaded = is_loaded(table, os.path.basename(path))
+            except Exception as e:
+                logger.error(f"Falha ao carregar '{path}'; carga interrompida: {e}", exc_info=True)
+                return files, rows, path
+            if not loaded:
+                logger.error(f"'{path}' não está registrado em spool_loads para '{table}'; carga interrompida.")
+                return files, rows, path
+            archive(path, directory, table, delete)
+            files += 1
+    return files, rows, None
+
+
+def save_snapshot(directory):
+    """
+    Grava no spool a cópia do registro de identidades que os crawls em modo spool
+    usam para resolver os ids sem acessar o banco.
+    """
+    os.makedirs(directory, exist_ok=True)
+    IdentityRegistry.load().save_snapshot(snapshot_path(directory))
+
+
+def load_file(path, table):
+    """
+    Copia o arquivo para uma tabela temporária (COPY) e a aplica na tabela de
+    destino, em uma única transação. Retorna o número de linhas (0 se o arquivo
+    já havia sido carregado).
+    """
+    name = os.path.basename(path)
+    run_id = name[:-len(SPOOL_SUFFIX)].rsplit('-', 1)[0]
+    columns = SPOOL_COLUMNS[table]
+    with DatabaseManager(DB_CONFIG) as db:
+        if is_loaded(table, name, db):
+            logger.info(f"'{name}' já havia sido carregado.")
+            return 0
+
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as spool:
+            header = tuple(spool.readline().rstrip('\n').split('\t'))
+            if header != columns:
+                raise ValueError(f"Colunas inesperadas em '{name}': {header}")
+            db.cur.execute(
+                f"""
+                DROP TABLE IF EXISTS nbb_spool_stage;
+                CREATE TEMP TABLE nbb_spool_stage ON COMMIT DROP AS
+                SELECT {', '.join(columns)} FROM {table} WITH NO DATA;
+                ALTER TABLE nbb_spool_stage ADD COLUMN stage_seq BIGSERIAL;
+                """
+            )
+            db.cur.copy_expert(f"COPY nbb_spool_stage ({', '.join(columns)}) FROM STDIN;", spool)
+            row_count = db.cur.rowcount
+
+        if table == 'assets':
+            apply_assets(db)
+        else:
+            apply_rows(db, table, run_id)
+        db.cur.execute(
+            "INSERT INTO spool_loads (file_name, run_id, table_name, row_count) VALUES (%s, %s, %s, %s);",
+            (name, run_id, table, row_count)
+        )
+    logger.info(f"'{name}': {row_count} linha(s) carregada(s) em '{table}'.")
+    return row_count
+
+
+def is_loaded(table, name, db=None):
+    """Se o arquivo da tabela já está em spool_loads (o mesmo nome pode existir em outra tabela)."""
+    if db is None:
+        with DatabaseManager(DB_CONFIG) as db:
+            return is_loaded(table, name, db)
+    db.cur.execute("SELECT 1 FROM spool_loads WHERE table_name = %s AND file_name = %s;", (table, name))
+    return db.cur.fetchone() is not None
+
+
+def apply_assets(db):
+    db.cur.execute("SELECT url, content_hash, storage_key FROM nbb_spool_stage ORDER BY stage_seq;")
+    for url, content_hash, storage_key in db.cur.fetchall():
+        db.insert_asset(url, content_hash, storage_key)
+
+
+def apply_rows(db, table, run_id):
+    """
+    Aplica a tabela temporária com um único INSERT ... SELECT (a última linha de
+    cada chave vence, como no BatchWriter). Se o comando falhar, as linhas passam
+    pelo BatchWriter, que isola as rejeitadas em dead_letters.
+
+    Arremessos: os já gravados de um jogo são substituídos pelo primeiro arquivo
+    da execução que o contém (spool_games), como o BatchWriter faz por crawl.
+    """
+    upsert = UPSERTS[table]
+    columns = ', '.join(upsert.columns)
+    if upsert.conflict:
+        conflict = ', '.join(upsert.conflict)
+        source = f"SELECT DISTINCT ON ({conflict}) {columns} FROM nbb_spool_stage ORDER BY {conflict}, stage_seq DESC"
+    else:
+        source = f"SELECT {columns} FROM nbb_spool_stage ORDER BY stage_seq"
+
+    game_ids = stage_game_ids(db, table)
+    previous = previous_states(db, run_id, game_ids) if game_ids else {}
+    if table == 'shots' and game_ids:
+        db.cur.execute(
+            """
+            DELETE FROM shots
+            WHERE game_id = ANY(%s)
+              AND game_id NOT IN (SELECT game_id FROM spool_games WHERE run_id = %s);
+            """,
+            (game_ids, run_id)
+        )
+
+    db.cur.execute("SAVEPOINT nbb_spool;")
+    try:
+        db.cur.execute(f"INSERT INTO {table} ({columns}) {source}{upsert.on_conflict};")
+        db.cur.execute("RELEASE SAVEPOINT nbb_spool;")
+    except psycopg2.Error as e:
+        db.cur.execute("ROLLBACK TO SAVEPOINT nbb_spool;")
+        logger.warning(f"Carga em bloco de '{table}' falhou, gravando em lotes para isolar as linhas rejeitadas: {e}")
+        db.cur.execute(f"{source};")
+        rows = db.cur.fetchall()
+        rejected = BatchWriter().write_rows(db, table, rows)
+        for row, error in rejected:
+            db.insert_dead_letter(table, row, error)
+        if table == 'games':
+            # Um jogo rejeitado não existe em games; nos arremessos, todos os jogos do arquivo
+            # são atualizados, pois os arremessos antigos foram apagados
+            written_game_ids = game_ids_of(table, written_rows(rows, rejected))
+            game_ids = [game_id for game_id in game_ids if game_id in written_game_ids]
+
+    if table in ('teams', 'players'):
+        db.cur.execute("SELECT array_agg(DISTINCT id) FROM nbb_spool_stage;")
+        ids = db.cur.fetchone()[0] or []
+        db.link_assets(ids if table == 'teams' else [], ids if table == 'players' else [])
+    if game_ids:
+        changes = refresh_games(db, game_ids, previous)
+        if table == 'shots':
+            record_shot_counts(db, run_id, previous, changes)
+
+
+def stage_game_ids(db, table):
+    column = GAME_ID_COLUMNS.get(table)
+    if column is None:
+        return []
+    db.cur.execute(f"SELECT DISTINCT {column} FROM nbb_spool_stage WHERE {column} IS NOT NULL;")
+    return [row[0] for row in db.cur.fetchall()]
+
+
+def previous_states(db, run_id, game_ids):
+    """
+    game_states() antes da carga, com o número de arremessos elevado ao maior já
+    carregado nesta execução: um jogo dividido entre arquivos só é notificado
+    como 'shots_appended' quando passa do que já tinha.
+    """
+    previous = db.game_states(game_ids)
+    db.cur.execute(
+        "SELECT game_id, shot_count FROM spool_games WHERE run_id = %s AND game_id = ANY(%s);",
+        (run_id, game_ids)
+    )
+    for game_id, shot_count in db.cur.fetchall():
+        if game_id in previous:
+            season, home_score, away_score, current = previous[game_id]
+            previous[game_id] = (season, home_score, away_score, max(current, shot_count))
+    return previous
+
+
+def record_shot_counts(db, run_id, previous, changes):
+    counts = {game_id: state[3] for game_id, state in previous.items()}
+    for change in changes:
+        counts[change['game_id']] = max(change['shot_count'], counts.get(change['game_id'], 0))
+    db.cur.execute(
+        """
+        INSERT INTO spool_games (run_id, game_id, shot_count)
+        SELECT %s, game_id, shot_count FROM unnest(%s::int[], %s::int[]) AS counts (game_id, shot_count)
+        ON CONFLICT (run_id, game_id) DO UPDATE SET shot_count = greatest(spool_games.shot_count, EXCLUDED.shot_count);
+        """,
+        (run_id, list(counts), list(counts.values()))
+    )
+
+
+def archive(path, directory, table, delete):
+    if delete:
+        os.remove(path)
+        return
+    folder = os.path.join(directory, LOADED_DIR, table)
+    os.makedirs(folder, exist_ok=True)
+    os.replace(path, os.path.join(folder, os.path.basename(path)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega no banco os arquivos gravados por um crawl em modo spool.")
+    parser.add_argument('command', choices=['load', 'snapshot'],
+                        help="load: carrega os arquivos; snapshot: só grava o snapshot do registro de identidades.")
+    parser.add_argument('--spool-dir', default=os.environ.get('DB_SPOOL_DIR', 'spool'))
+    parser.add_argument('--delete', action='store_true', help="Apaga os arquivos carregados em vez de movê-los para loaded/.")
+    args = parser.parse_args()
+    if args.command == 'snapshot':
+        try:
+            ensure_schema()
+            save_snapshot(args.spool_dir)
+        finally:
+            close_pool()
+        sys.exit(0)
+
+    started = datetime.datetime.now()
+    try:
+        files, rows, failed = load(args.spool_dir, args.delete)
+    finally:
+        close_pool()
+    logger.info(f"{files} arquivo(s) e {rows} linha(s) carregados em {datetime.datetime.now() - started}.")
+    if failed:
+        logger.error(f"Carga interrompida em '{failed}'; corrija o problema e rode o load novamente.")
+        sys.exit(1)
@@ -0,0 +1,46 @@
+import os
+import pytest
+
+# Os testes gravam em um PostgreSQL de verdade (DB_HOST, DB_NAME, DB_USER, DB_PASS, como o crawler);
+# sem ele, nada é coletado
+collect_ignore_glob = [] if os.environ.get('DB_HOST') else ['test_*.py']
+# O módulo do spider exige TEMPORADA na importação
+os.environ.setdefault('TEMPORADA', '2023/2024')
+
+
+@pytest.fixture(scope='session')
+def database():
+    """Banco descartável no servidor de DB_HOST, com as migrações aplicadas; apagado no fim."""
+    from nbb.benchmark import create_database, drop_database
+    from nbb.db_manager import DB_CONFIG, close_pool
+    from nbb.schema import migrate
+
+    maintenance_database = DB_CONFIG['database']
+    name = f"nbb_test_{os.getpid()}"
+    create_database(name)
+    DB_CONFIG['database'] = name
+    try:
+        migrate()
+        yield name
+    finally:
+        close_pool()
+        DB_CONFIG['database'] = maintenance_database
+        drop_database(name, maintenance_database)
+
+
+@pytest.fixture
+def db(database):
+    """Esvazia as tabelas antes de cada teste e devolve um cursor em autocommit para as verificações."""
+    import psycopg2
+    from nbb.db_manager import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename <> 'schema_migrations';")
+    tables = [row[0] for row in cur.fetchall()]
+    cur.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE;")
+    try:
+        yield cur
+    finally:
+        conn.close()
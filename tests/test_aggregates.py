@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+
+from nbb import aggregates
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import DatabaseManager, DB_CONFIG
+
+SEASON = 'NBB 2023/2024'
+
+
+def game(game_id, home_team_id, away_team_id, home_team_score=80, away_team_score=75):
+    return (game_id, datetime.date(2023, 10, game_id), datetime.time(19, 0), home_team_id, away_team_id,
+            home_team_score, away_team_score, '1ª Rodada', 'Fase de Classificação', SEASON, 'Ginásio', None)
+
+
+def shot(game_id, player_id, team_id, zone='paint', made=True):
+    return (player_id, game_id, team_id, '1', datetime.time(9, 30), 'shot made p2', 50.0, 50.0, made, 1.5, zone)
+
+
+@pytest.fixture
+def writer(db):
+    writer = BatchWriter()
+    for team_id in ('a', 'b'):
+        writer.add('teams', (team_id, team_id.upper(), None))
+    for player_id in (1, 2):
+        writer.add('players', (player_id, f"Jogador {player_id}", None))
+    return writer
+
+
+def verify():
+    with DatabaseManager(DB_CONFIG) as db:
+        return aggregates.verify(db)
+
+
+def test_rewritten_games_keep_the_aggregates_exact(db, writer):
+    writer.add('games', game(1, 'a', 'b'))
+    writer.add('games', game(2, 'b', 'a', 70, 90))
+    writer.add('shots', shot(1, 1, 'a'))
+    writer.add('shots', shot(1, 2, 'b', made=False))
+    writer.add('shots', shot(2, 1, 'a', zone='mid_range'))
+    writer.flush()
+    assert set(verify().values()) == {0}
+    db.execute("SELECT team_id, games_played, wins FROM season_team_totals ORDER BY team_id;")
+    assert db.fetchall() == [('a', 2, 2), ('b', 2, 0)]
+
+    # O jogo 1 é recoletado em outro crawl: o jogador 2 some, o 1 muda de zona e o placar vira
+    writer = BatchWriter()
+    writer.add('games', game(1, 'a', 'b', 70, 75))
+    writer.add('shots', shot(1, 1, 'a', zone='corner_three'))
+    writer.flush()
+
+    assert set(verify().values()) == {0}
+    db.execute("SELECT player_id, shot_zone, attempts FROM season_player_shot_totals ORDER BY 1, 2;")
+    assert db.fetchall() == [(1, 'corner_three', 1), (1, 'mid_range', 1)]
+    db.execute("SELECT player_id, games_played FROM season_player_totals ORDER BY 1;")
+    assert db.fetchall() == [(1, 2)]
+    db.execute("SELECT team_id, wins FROM season_team_totals ORDER BY team_id;")
+    assert db.fetchall() == [('a', 1), ('b', 1)]
+
+
+def test_zero_rows_of_untouched_keys_are_left_alone(db, writer):
+    writer.add('games', game(1, 'a', 'b'))
+    writer.add('shots', shot(1, 1, 'a'))
+    writer.flush()
+    # Uma linha zerada de outra chave (não tocada pelo jogo) não é apagada pelo flush
+    db.execute("INSERT INTO season_team_totals (season, team_id, games_played, wins, points_for, points_against) "
+               "VALUES ('NBB 2022/2023', 'a', 0, 0, 0, 0);")
+
+    writer = BatchWriter()
+    writer.add('games', game(1, 'a', 'b', 90, 75))
+    writer.flush()
+
+    db.execute("SELECT season, games_played FROM season_team_totals WHERE team_id = 'a' ORDER BY season;")
+    assert db.fetchall() == [('NBB 2022/2023', 0), (SEASON, 1)]
+
+
+def test_verify_reports_and_rebuild_fixes_divergences(db, writer):
+    writer.add('games', game(1, 'a', 'b'))
+    writer.add('shots', shot(1, 1, 'a'))
+    writer.flush()
+    db.execute("UPDATE season_team_totals SET wins = wins + 1 WHERE team_id = 'b';")
+    db.execute("DELETE FROM season_player_totals;")
+
+    mismatches = verify()
+    assert mismatches == {'season_player_shot_totals': 0, 'season_player_totals': 1, 'season_team_totals': 2}
+
+    with DatabaseManager(DB_CONFIG) as manager:
+        assert aggregates.rebuild(manager) == 1
+    assert set(verify().values()) == {0}
@@ -0,0 +1,71 @@
+import pytest
+from scrapy.utils.test import get_crawler
+
+from nbb import batch_writer
+from nbb.assets import AssetsPipeline
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import DatabaseManager
+
+PHOTO_URL = 'https://x/jogador-1.png'
+PHOTO_KEY = 'full/abc.jpg'
+
+
+@pytest.fixture
+def assets(db, tmp_path):
+    pipeline = AssetsPipeline.from_crawler(get_crawler(settings_dict={'IMAGES_STORE': str(tmp_path)}))
+    pipeline.load_known_assets()
+    return pipeline
+
+
+@pytest.fixture
+def writer():
+    writer = BatchWriter()
+    writer.add('teams', ('home', 'Casa', 'https://x/casa.png'))
+    writer.add('players', (1, 'Jogador 1', PHOTO_URL))
+    return writer
+
+
+def photo_key(db):
+    db.execute("SELECT photo_key FROM players WHERE id = 1;")
+    return db.fetchone()[0]
+
+
+def test_asset_committed_while_the_batch_is_being_written(db, assets, writer, monkeypatch):
+    refresh_games = batch_writer.refresh_games
+
+    def record_asset_first(*args, **kwargs):
+        # O asset é confirmado depois da ligação feita na transação do lote, antes do seu commit
+        assets.record_asset(PHOTO_URL, PHOTO_KEY)
+        return refresh_games(*args, **kwargs)
+
+    monkeypatch.setattr(batch_writer, 'refresh_games', record_asset_first)
+    writer.add('games', (1, None, None, 'home', 'home', None, None, None, None, 'NBB 2023/2024', None, None))
+    writer.flush()
+
+    assert photo_key(db) == PHOTO_KEY
+
+
+def test_batch_committed_while_the_asset_is_being_written(db, assets, writer, monkeypatch):
+    insert_asset = DatabaseManager.insert_asset
+
+    def flush_first(self, *args, **kwargs):
+        # O lote inteiro é confirmado com o asset gravado e ainda não confirmado
+        insert_asset(self, *args, **kwargs)
+        writer.flush()
+
+    monkeypatch.setattr(DatabaseManager, 'insert_asset', flush_first)
+    assets.record_asset(PHOTO_URL, PHOTO_KEY)
+
+    assert photo_key(db) == PHOTO_KEY
+
+
+@pytest.mark.parametrize('asset_first', [True, False])
+def test_sequential_orders(db, assets, writer, asset_first):
+    if asset_first:
+        assets.record_asset(PHOTO_URL, PHOTO_KEY)
+        writer.flush()
+    else:
+        writer.flush()
+        assets.record_asset(PHOTO_URL, PHOTO_KEY)
+
+    assert photo_key(db) == PHOTO_KEY
@@ -0,0 +1,61 @@
+import datetime
+
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import DatabaseManager, DB_CONFIG
+from nbb import shot_arrays
+
+SEASON = 'NBB 2023/2024'
+
+
+def game(game_id, home_team_id, away_team_id):
+    return (game_id, datetime.date(2023, 10, 1), datetime.time(19, 0), home_team_id, away_team_id,
+            80, 75, '1ª Rodada', 'Fase de Classificação', SEASON, 'Ginásio', f"https://lnb.com.br/partidas/{game_id}/")
+
+
+def shot(game_id, player_id, team_id):
+    return (player_id, game_id, team_id, '1', datetime.time(9, 30), 'shot made p2', 50.0, 50.0, True, 1.5, 'paint')
+
+
+def fill_parents(writer):
+    writer.add('teams', ('home', 'Casa', 'https://x/casa.png'))
+    writer.add('teams', ('away', 'Fora', 'https://x/fora.png'))
+    writer.add('players', (1, 'Jogador 1', None))
+
+
+def test_refresh_of_unknown_games_is_a_no_op(db):
+    with DatabaseManager(DB_CONFIG) as manager:
+        shot_arrays.refresh_games(manager, [999])
+    db.execute("SELECT count(*) FROM game_shot_arrays;")
+    assert db.fetchone()[0] == 0
+
+
+def test_flush_with_foreign_key_violation_does_not_block_later_flushes(db):
+    writer = BatchWriter()
+    fill_parents(writer)
+    writer.add('games', game(1, 'home', 'away'))
+    writer.add('games', game(2, 'home', 'missing-team'))
+    writer.add('shots', shot(1, 1, 'home'))
+    writer.add('shots', shot(2, 1, 'home'))
+    writer.flush()
+
+    assert writer.dead_lettered == 2
+    assert writer.pending == 0
+    db.execute("SELECT table_name, count(*) FROM dead_letters GROUP BY 1 ORDER BY 1;")
+    assert db.fetchall() == [('games', 1), ('shots', 1)]
+    db.execute("SELECT game_id, shot_count FROM game_shot_arrays;")
+    assert db.fetchall() == [(1, 1)]
+
+    # Um lote só com o jogo rejeitado (recoletado) não falha nem fica pendente
+    writer.add('games', game(2, 'home', 'missing-team'))
+    writer.add('shots', shot(2, 1, 'home'))
+    writer.flush()
+    assert writer.pending == 0
+    assert writer.dead_lettered == 4
+
+    writer.add('games', game(3, 'home', 'away'))
+    writer.flush()
+    assert writer.pending == 0
+    db.execute("SELECT id FROM games ORDER BY id;")
+    assert db.fetchall() == [(1,), (3,)]
+    db.execute("SELECT game_id FROM game_shot_arrays ORDER BY game_id;")
+    assert db.fetchall() == [(1,), (3,)]
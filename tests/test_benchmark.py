@@ -0,0 +1,48 @@
+from nbb.benchmark import synthetic_season, season_subset, run, compare, VARIANTS, STATES, WRITE_METHODS
+
+
+def small_season(**kwargs):
+    return synthetic_season(**{'teams': 4, 'players_per_team': 5, 'games': 6, 'shots_per_game': 10, **kwargs})
+
+
+def test_synthetic_season_with_rosters_smaller_than_a_lineup():
+    season = small_season()
+
+    assert len(season['players']) == 20
+    # Elenco de 5: todos jogam, nos 5 quartos (1-4 e Total), pelas duas equipes
+    assert len(season['player_stats']) == 6 * 2 * 5 * 5
+    assert len(season['shots']) == 60
+    assert small_season() == season
+
+
+def test_season_subset_keeps_only_the_first_games():
+    season = small_season()
+    subset = season_subset(season, 2)
+
+    game_ids = {item['game_id'] for item in subset['games']}
+    assert len(game_ids) == 2
+    assert {item['game_id'] for item in subset['shots']} <= game_ids
+    assert {item['game_id'] for item in subset['player_stats']} == game_ids
+    assert subset['teams'] == season['teams']
+
+
+def test_run_writes_every_variant_state_and_table(db):
+    season = small_season()
+
+    results = run(season, batch_size=50, per_row_games=2)
+
+    assert [(result['variant'], result['state'], result['table']) for result in results] == [
+        (variant, state, table) for variant in VARIANTS for state in STATES for table in WRITE_METHODS
+    ]
+    rows = {(result['variant'], result['table']): result['rows'] for result in results}
+    assert rows[('copy', 'shots')] == 60
+    assert rows[('per_row', 'shots')] == len(season_subset(season, 2)['shots'])
+    assert all(result['commits'] > 0 for result in results)
+    # A última variante (copy) deixa a temporada inteira; warm reescreve as chaves e acrescenta os arremessos
+    db.execute("SELECT (SELECT count(*) FROM player_stats), (SELECT count(*) FROM shots);")
+    assert db.fetchone() == (300, 120)
+
+    report = {'results': results}
+    lines = compare(report, report)
+    assert len(lines) == len(results) + 1
+    assert all(line.split()[2] == '1.00' for line in lines[1:])
@@ -0,0 +1,65 @@
+import pytest
+
+from nbb import db_manager
+from nbb.db_manager import DatabaseManager, DB_CONFIG, UPSERTS, close_pool
+
+
+def prepared_on_server(manager):
+    manager.cur.execute("SELECT name FROM pg_prepared_statements ORDER BY name;")
+    return [row[0] for row in manager.cur.fetchall()]
+
+
+def test_upsert_is_prepared_once_per_pooled_connection(db):
+    # Pool novo: as conexões dos testes anteriores já prepararam outros comandos
+    close_pool()
+    with DatabaseManager(DB_CONFIG) as manager:
+        connection = manager.conn
+        manager.upsert('teams', ('home', 'Casa', 'https://x/casa.png'))
+        manager.upsert('teams', ('away', 'Fora', 'https://x/fora.png'))
+        assert prepared_on_server(manager) == ['nbb_upsert_teams']
+
+    # A mesma conexão volta do pool sabendo o que já preparou: um segundo PREPARE falharia
+    with DatabaseManager(DB_CONFIG) as manager:
+        assert manager.conn is connection
+        manager.upsert('teams', ('home', 'Casa Nova', 'https://x/casa.png'))
+        manager.upsert('players', (1, 'Jogador 1', None))
+        assert connection.prepared == {'nbb_upsert_teams', 'nbb_upsert_players'}
+        assert prepared_on_server(manager) == ['nbb_upsert_players', 'nbb_upsert_teams']
+
+    db.execute("SELECT id, name FROM teams ORDER BY id;")
+    assert db.fetchall() == [('away', 'Fora'), ('home', 'Casa Nova')]
+
+
+def test_prepared_statement_survives_a_rollback(db):
+    with pytest.raises(RuntimeError):
+        with DatabaseManager(DB_CONFIG) as manager:
+            manager.upsert('teams', ('home', 'Casa', 'https://x/casa.png'))
+            raise RuntimeError('falhou')
+
+    with DatabaseManager(DB_CONFIG) as manager:
+        manager.upsert('teams', ('away', 'Fora', 'https://x/fora.png'))
+
+    db.execute("SELECT id FROM teams;")
+    assert db.fetchall() == [('away',)]
+
+
+def test_write_batch_updates_or_keeps_existing_rows(db, monkeypatch):
+    monkeypatch.setattr(db_manager, 'BATCH_PAGE_SIZE', 2)
+    with DatabaseManager(DB_CONFIG) as manager:
+        manager.write_batch('teams', [(f"t{number}", f"Time {number}", None) for number in range(5)])
+        manager.write_batch('teams', [('t0', 'Renomeado', None)])
+        manager.write_batch('identity_registry', [('team', 'slug', 'casa', 't0')])
+        # update=False: o primeiro id associado a uma chave externa é definitivo
+        manager.write_batch('identity_registry', [('team', 'slug', 'casa', 't1')])
+
+    db.execute("SELECT count(*), min(name) FROM teams;")
+    assert db.fetchone() == (5, 'Renomeado')
+    db.execute("SELECT internal_id FROM identity_registry;")
+    assert db.fetchall() == [('t0',)]
+
+
+def test_prepared_and_textual_forms_match():
+    for spec in UPSERTS.values():
+        assert spec.prepare_sql.endswith(spec.on_conflict)
+        assert spec.sql.endswith(spec.on_conflict)
+        assert spec.execute_sql.count('%s') == spec.prepare_sql.count('$') == len(spec.columns)
@@ -0,0 +1,86 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+
+import pytest
+
+from nbb.batch_writer import BatchWriter
+from nbb.export import export
+
+SEASON = 'NBB 2023/2024'
+
+
+def game(game_id, season=SEASON):
+    return (game_id, datetime.date(2023, 10, game_id), datetime.time(19, 0), 'home', 'away',
+            80 + game_id, 75, '1ª Rodada', 'Fase de Classificação', season, 'Ginásio', f"https://lnb.com.br/partidas/{game_id}/")
+
+
+def shot(game_id, made):
+    return (1, game_id, 'home', '1', datetime.time(9, 30), 'shot made p2' if made else 'shot miss p2',
+            50.0, 25.0, made, 1.5, 'paint')
+
+
+@pytest.fixture
+def season(db):
+    writer = BatchWriter()
+    writer.add('teams', ('home', 'Casa', 'https://x/casa.png'))
+    writer.add('teams', ('away', 'Fora', 'https://x/fora.png'))
+    writer.add('players', (1, 'Jogador 1', None))
+    for game_id in (1, 2, 3):
+        writer.add('games', game(game_id))
+        for made in (True, False):
+            writer.add('shots', shot(game_id, made))
+    # Jogo e arremesso de outra temporada, fora da exportação
+    writer.add('games', game(4, 'NBB 2022/2023'))
+    writer.add('shots', shot(4, True))
+    writer.flush()
+
+
+def read_csv(paths):
+    rows = []
+    for path in paths:
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_csv_export_streams_every_shot_of_the_season(season, tmp_path, workers):
+    paths, rows = export('shots', 'csv', SEASON, str(tmp_path), workers=workers, chunk_size=2)
+
+    assert rows == 6
+    assert [os.path.basename(path) for path in paths] == (
+        ['shots-NBB_2023-2024.csv.gz'] if workers == 1
+        else ['shots-NBB_2023-2024.part-00.csv.gz', 'shots-NBB_2023-2024.part-01.csv.gz']
+    )
+    exported = sorted(read_csv(paths), key=lambda row: int(row['shot_id']))
+    assert [(row['game_id'], row['shot_made']) for row in exported] == [
+        (str(game_id), made) for game_id in (1, 2, 3) for made in ('True', 'False')
+    ]
+    assert {(row['team_name'], row['player_name'], row['season']) for row in exported} == {('Casa', 'Jogador 1', SEASON)}
+
+
+def test_jsonl_export_of_games(season, tmp_path):
+    (path,), rows = export('games', 'jsonl', SEASON, str(tmp_path))
+
+    assert rows == 3
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        games = [json.loads(line) for line in f]
+    assert [game['game_id'] for game in games] == [1, 2, 3]
+    assert games[0]['game_date'] == '2023-10-01'
+    assert (games[0]['home_team_name'], games[0]['away_team_name']) == ('Casa', 'Fora')
+    assert games[0]['round'] == '1ª Rodada'
+
+
+def test_parquet_export_keeps_the_column_types(season, tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    (path,), rows = export('shots', 'parquet', SEASON, str(tmp_path), chunk_size=4)
+
+    table = parquet.read_table(path)
+    assert rows == table.num_rows == 6
+    assert str(table.schema.field('game_id').type) == 'int32'
+    assert str(table.schema.field('shot_made').type) == 'bool'
+    assert str(table.schema.field('game_date').type) == 'date32[day]'
+    assert table.column('shot_made').to_pylist() == [True, False] * 3
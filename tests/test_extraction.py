@@ -0,0 +1,89 @@
+import datetime
+import os
+
+import pytest
+from parsel import Selector
+
+from nbb.extraction import (
+    HOME_TEAM, AWAY_TEAM, GAME, PLAYER, SHOT, SHOTS_CSS, HOME_PLAYERS_CSS, extract_players, extract_shots,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return Selector(text=f.read())
+
+
+def games():
+    return fixture('schedule.html').css("table.table_matches_table tbody:nth-of-type(1) tr")
+
+
+def loader_item(extractor, selector, **values):
+    """O mesmo item montado por um ItemLoader campo a campo, como antes das especificações compiladas."""
+    loader = extractor.loader_class(selector=selector)
+    for name, css in extractor.specs.items():
+        if css:
+            loader.add_css(name, css)
+        else:
+            loader.add_value(name, values.get(name))
+    return loader.load_item()
+
+
+@pytest.mark.parametrize('extractor', [HOME_TEAM, AWAY_TEAM, GAME])
+def test_schedule_rows_match_the_item_loaders(extractor):
+    for game in games():
+        values = {'home_team_id': 'home', 'away_team_id': 'away'}
+        assert dict(extractor.extract(game, **values)) == dict(loader_item(extractor, game, **values))
+
+
+def test_game_report_rows_match_the_item_loaders():
+    report = fixture('game_report.html')
+    for player in report.css(HOME_PLAYERS_CSS):
+        values = {'player_team_id': 'home', 'season': 'NBB 2023/2024'}
+        assert dict(PLAYER.extract(player, **values)) == dict(loader_item(PLAYER, player, **values))
+    for shot in report.css(SHOTS_CSS):
+        assert dict(SHOT.extract(shot, game_id=1, team_id='home')) == dict(loader_item(SHOT, shot, game_id=1, team_id='home'))
+
+
+def test_schedule_values():
+    unplayed, played = games()
+
+    assert dict(HOME_TEAM.extract(unplayed)) == {
+        'name': 'Flamengo', 'logo': 'https://lnb.com.br/wp-content/uploads/logos/flamengo.png',
+    }
+    assert dict(GAME.extract(played, home_team_id='home', away_team_id='away')) == {
+        'game_id': 80002,
+        'home_team_id': 'home',
+        'away_team_id': 'away',
+        'game_date': datetime.date(2023, 10, 2),
+        'game_time': datetime.time(20, 30),
+        'home_team_score': 81,
+        'away_team_score': 77,
+        'round': '2ª Rodada',
+        'stage': 'Fase de Classificação',
+        'season': 'NBB 2023/2024',
+        'arena': 'Arena Minas',
+        'link': 'https://lnb.com.br/partidas/80002/',
+    }
+    game = GAME.extract(unplayed, home_team_id='home', away_team_id='away')
+    assert 'home_team_score' not in game and 'arena' not in game
+
+
+def test_game_report_players_and_shots():
+    report = fixture('game_report.html')
+
+    players = extract_players(report, 'home', 'away', 'NBB 2023/2024')
+    assert [(p['player_id'], p['player_number'], p['player_name'], p['player_team_id']) for p in players] == [
+        (2210, '4', 'Yago Mateus', 'away'),
+        (2305, '22', 'Georginho', 'away'),
+        (1041, '7', 'Lucas Dias', 'home'),
+        (1187, '11', 'Alexey Borges', 'home'),
+    ]
+    shots = extract_shots(report, 1, 'home', 'away')
+    assert dict(shots[0]) == {
+        'player_id': 1041, 'shot_quarter': '1', 'shot_type': 'shot made p2', 'shot_time': '09:12',
+        'shot_x_location': 8.0, 'shot_y_location': 50.0, 'game_id': 1, 'team_id': 'home',
+    }
+    assert [shot['team_id'] for shot in shots] == ['home'] * 4 + ['away'] * 4
@@ -0,0 +1,98 @@
+import pytest
+from scrapy.exceptions import CloseSpider
+from scrapy.utils.test import get_crawler
+
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import identity_row
+from nbb.identity import IdentityRegistry, TEAM, PLAYER, LOGO_URL, SHORT_NAME, IDJ, fallback_team_id, snapshot_path
+from nbb.spiders.nbbspider import GameSpider
+from nbb.spool import save_snapshot
+
+OLD_LOGO = 'https://x/flamengo-2023.png'
+NEW_LOGO = 'https://x/flamengo-2024.png'
+
+
+def write(registry):
+    writer = BatchWriter()
+    for item in registry.drain():
+        writer.add('identity_registry', identity_row(item))
+    writer.flush()
+
+
+def spider(**settings):
+    return GameSpider.from_crawler(get_crawler(GameSpider, settings_dict=settings))
+
+
+def test_team_keeps_its_id_when_the_logo_changes(db):
+    first = IdentityRegistry()
+    team_id = first.team_id(OLD_LOGO, 'Flamengo')
+    assert team_id == fallback_team_id(OLD_LOGO)
+    assert first.player_id('123') == 123
+    write(first)
+
+    # Crawl seguinte: o registro vem do banco e o logo novo é encontrado pelo nome curto
+    second = IdentityRegistry.load()
+    assert second.team_id(NEW_LOGO, 'Flamengo') == team_id
+    assert [(item['key_type'], item['external_key']) for item in second.drain()] == [(LOGO_URL, NEW_LOGO)]
+    assert second.drain() == []
+    assert second.player_id(123) == 123
+
+
+def test_first_id_of_a_key_is_permanent(db):
+    registry = IdentityRegistry()
+    registry.register(TEAM, SHORT_NAME, 'Flamengo', 'a')
+    write(registry)
+    registry = IdentityRegistry()
+    registry.register(TEAM, SHORT_NAME, 'Flamengo', 'b')
+    write(registry)
+
+    assert IdentityRegistry.load().ids == {(TEAM, SHORT_NAME, 'Flamengo'): 'a'}
+
+
+def test_snapshot_round_trip(tmp_path):
+    registry = IdentityRegistry()
+    registry.team_id(OLD_LOGO, 'Flamengo\tRJ')
+    registry.player_id(7)
+    path = str(tmp_path / 'registry.tsv')
+
+    registry.save_snapshot(path)
+
+    assert IdentityRegistry.load_snapshot(path).ids == registry.ids
+    assert registry.ids[(PLAYER, IDJ, '7')] == '7'
+
+
+def test_spider_loads_the_registry_from_the_database(db):
+    registry = IdentityRegistry()
+    registry.team_id(OLD_LOGO, 'Flamengo')
+    write(registry)
+    game_spider = spider()
+
+    game_spider.load_identities(game_spider)
+
+    assert game_spider.identities.team_id(NEW_LOGO, 'Flamengo') == fallback_team_id(OLD_LOGO)
+
+
+def test_spool_crawl_without_a_snapshot_is_closed(tmp_path):
+    game_spider = spider(DB_SPOOL_DIR=str(tmp_path))
+
+    game_spider.load_identities(game_spider)
+
+    assert game_spider.identities is None
+    with pytest.raises(CloseSpider) as closed:
+        next(game_spider.parse(None))
+    assert closed.value.reason == 'identity_registry_unavailable'
+
+
+def test_spool_crawl_uses_the_snapshot_and_carries_new_keys(db, tmp_path):
+    registry = IdentityRegistry()
+    team_id = registry.team_id(OLD_LOGO, 'Flamengo')
+    write(registry)
+    save_snapshot(str(tmp_path))
+    game_spider = spider(DB_SPOOL_DIR=str(tmp_path))
+
+    game_spider.load_identities(game_spider)
+    assert game_spider.identities.team_id(NEW_LOGO, 'Flamengo') == team_id
+    game_spider.closed('finished')
+
+    # O próximo crawl em modo spool já conhece o logo novo, antes de qualquer load
+    assert IdentityRegistry.load_snapshot(snapshot_path(str(tmp_path))).ids[(TEAM, LOGO_URL, NEW_LOGO)] == team_id
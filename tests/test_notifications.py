@@ -0,0 +1,122 @@
+import datetime
+import queue
+import threading
+import time
+
+import pytest
+
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import CHANGE_NEW_GAME, CHANGE_SCORE_UPDATE, CHANGE_SHOTS_APPENDED, CHANGE_GAME_UPDATED
+from nbb.notifications import listen
+
+SEASON = 'NBB 2023/2024'
+
+
+def game(home_team_score):
+    return (1, datetime.date(2023, 10, 1), datetime.time(19, 0), 'home', 'away',
+            home_team_score, 75, '1ª Rodada', 'Fase de Classificação', SEASON, 'Ginásio', "https://lnb.com.br/partidas/1/")
+
+
+def shot():
+    return (1, 1, 'home', '1', datetime.time(9, 30), 'shot made p2', 50.0, 50.0, True, 1.5, 'paint')
+
+
+class Listener:
+    """Roda listen() em uma thread e guarda as mudanças entregues ao handler."""
+
+    def __init__(self, db, **kwargs):
+        self.db = db
+        self.changes = queue.Queue()
+        self.reconnects = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(
+            target=listen, args=(self.changes.put,),
+            kwargs=dict(on_reconnect=self.reconnected, poll_timeout=0.05, stop=self.stop, **kwargs),
+        )
+
+    def reconnected(self):
+        self.reconnects += 1
+
+    def backends(self):
+        self.db.execute("SELECT pid FROM pg_stat_activity WHERE query LIKE 'LISTEN %%' AND pid <> pg_backend_pid();")
+        return [row[0] for row in self.db.fetchall()]
+
+    def wait_listening(self, count=1):
+        deadline = time.monotonic() + 5
+        while len(self.backends()) < count:
+            assert time.monotonic() < deadline, "listen() não se conectou"
+            time.sleep(0.01)
+
+    def received(self, count):
+        return [(change['kind'], change['home_team_score'], change['shot_count'])
+                for change in (self.changes.get(timeout=5) for _ in range(count))]
+
+
+@pytest.fixture
+def listener(db):
+    listener = Listener(db)
+    listener.thread.start()
+    listener.wait_listening()
+    yield listener
+    listener.stop.set()
+    listener.thread.join()
+
+
+@pytest.fixture
+def writer(db):
+    writer = BatchWriter()
+    writer.add('teams', ('home', 'Casa', 'https://x/casa.png'))
+    writer.add('teams', ('away', 'Fora', 'https://x/fora.png'))
+    writer.add('players', (1, 'Jogador 1', None))
+    return writer
+
+
+def test_each_commit_publishes_the_kind_of_change(listener, writer):
+    writer.add('games', game(80))
+    writer.add('shots', shot())
+    writer.flush()
+    assert listener.received(2) == [(CHANGE_NEW_GAME, 80, 1), (CHANGE_SHOTS_APPENDED, 80, 1)]
+
+    writer.add('games', game(82))
+    writer.flush()
+    assert listener.received(1) == [(CHANGE_SCORE_UPDATE, 82, 1)]
+
+    writer.add('games', game(82))
+    writer.flush()
+    change = listener.changes.get(timeout=5)
+    assert (change['kind'], change['game_id'], change['season']) == (CHANGE_GAME_UPDATED, 1, SEASON)
+    assert (change['home_team_id'], change['away_team_id']) == ('home', 'away')
+    assert listener.changes.empty()
+
+
+def test_kinds_filter_the_changes_delivered(db, listener, writer):
+    scores = Listener(db, kinds=[CHANGE_SCORE_UPDATE])
+    scores.thread.start()
+    try:
+        scores.wait_listening(2)
+        writer.add('games', game(80))
+        writer.flush()
+        writer.add('games', game(82))
+        writer.flush()
+
+        assert listener.received(2) == [(CHANGE_NEW_GAME, 80, 0), (CHANGE_SCORE_UPDATE, 82, 0)]
+        assert scores.received(1) == [(CHANGE_SCORE_UPDATE, 82, 0)]
+        assert scores.changes.empty()
+    finally:
+        scores.stop.set()
+        scores.thread.join()
+
+
+def test_lost_connection_reconnects_and_asks_for_a_resync(db, listener, writer):
+    pid, = listener.backends()
+    db.execute("SELECT pg_terminate_backend(%s);", (pid,))
+    deadline = time.monotonic() + 5
+    while listener.reconnects == 0:
+        assert time.monotonic() < deadline, "listen() não reconectou"
+        time.sleep(0.01)
+    listener.wait_listening()
+
+    writer.add('games', game(80))
+    writer.flush()
+    assert listener.received(1) == [(CHANGE_NEW_GAME, 80, 0)]
+    assert listener.reconnects == 1
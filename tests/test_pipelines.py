@@ -0,0 +1,103 @@
+import asyncio
+import datetime
+import sys
+import threading
+
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from nbb.items import TeamItem, PlayerItem, GameItem, ShotItem
+from nbb.middlewares import BackpressureMiddleware
+from nbb.pipelines import NbbPipeline
+
+SEASON = 'NBB 2023/2024'
+
+
+class HeldExecutor:
+    """Executor que só guarda os lotes: a fila de escrita nunca drena."""
+
+    def __init__(self):
+        self.batches = []
+
+    def submit(self, function, batch, size):
+        self.batches.append(batch)
+
+
+def test_published_queue_depth_never_goes_backwards(monkeypatch):
+    stats = get_crawler().stats
+    pipeline = NbbPipeline(batch_size=3, stats=stats)
+    pipeline.executor = HeldExecutor()
+    seen = []
+    done = threading.Event()
+
+    def writer_thread():
+        # Como a thread de escrita, publica a profundidade enquanto o reactor entrega lotes
+        while not done.is_set():
+            pipeline.report_queue()
+            seen.append(stats.get_value('nbb/db_queue/rows'))
+
+    monkeypatch.setattr(sys, 'getswitchinterval', sys.getswitchinterval)
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=writer_thread)
+    thread.start()
+    try:
+        for number in range(3000):
+            pipeline.process_item(TeamItem(id=f"t{number}", name=f"Time {number}", logo=f"https://x/{number}.png"), None)
+    finally:
+        done.set()
+        thread.join()
+        sys.setswitchinterval(0.005)
+
+    assert all(before <= after for before, after in zip(seen, seen[1:]))
+    assert stats.get_value('nbb/db_queue/rows') == 3000
+    assert sum(len(batch) for batch in pipeline.executor.batches) == 3000
+
+
+def test_items_are_written_and_the_queue_drains(db):
+    stats = get_crawler().stats
+    pipeline = NbbPipeline(batch_size=2, stats=stats)
+    spider = get_crawler().spidercls
+    pipeline.open_spider(spider)
+    for team_id in ('home', 'away'):
+        pipeline.process_item(TeamItem(id=team_id, name=team_id, logo=f"https://x/{team_id}.png"), spider)
+    pipeline.process_item(PlayerItem(player_id=1, player_name='Jogador 1', player_team_id='home', season=SEASON), spider)
+    pipeline.process_item(GameItem(game_id=1, home_team_id='home', away_team_id='away', season=SEASON,
+                                   game_date=datetime.date(2023, 10, 1), home_team_score=80, away_team_score=70), spider)
+    for _ in range(3):
+        pipeline.process_item(ShotItem(player_id=1, game_id=1, team_id='home', shot_quarter='1', shot_type='shot made p2',
+                                       shot_x_location=50.0, shot_y_location=50.0), spider)
+    pipeline.close_spider(spider)
+
+    db.execute("SELECT (SELECT count(*) FROM teams), (SELECT count(*) FROM player_teams_by_season), "
+               "(SELECT count(*) FROM games), (SELECT count(*) FROM shots);")
+    assert db.fetchone() == (2, 1, 1, 3)
+    assert stats.get_value('nbb/db_queue/rows') == 0
+    assert stats.get_value('nbb/db_queue/bytes') == 0
+    assert stats.get_value('nbb/db_queue/max_rows') >= 2
+    # Equipes, jogador e vínculo com a equipe, jogo e arremessos
+    assert stats.get_value('nbb/db/rows_written') == 8
+
+
+def test_game_pages_wait_until_the_queue_drains():
+    crawler = get_crawler(settings_dict={'DB_QUEUE_MAX_ROWS': 100, 'DB_QUEUE_POLL_INTERVAL': 0.01})
+    middleware = BackpressureMiddleware.from_crawler(crawler)
+    stats = crawler.stats
+    spider = crawler.spidercls('games')
+    stats.set_value('nbb/db_queue/rows', 150)
+
+    async def scenario():
+        # Páginas sem db_backpressure (tabela, imagens) não esperam
+        assert await middleware.process_request(Request('https://x/tabela'), spider) is None
+        held = asyncio.ensure_future(middleware.process_request(Request('https://x/jogo', meta={'db_backpressure': True}), spider))
+        await asyncio.sleep(0.05)
+        assert not held.done()
+        # Abaixo do limite, mas acima de DB_QUEUE_RESUME_RATIO: continua segurando
+        stats.set_value('nbb/db_queue/rows', 80)
+        await asyncio.sleep(0.05)
+        assert not held.done()
+        stats.set_value('nbb/db_queue/rows', 40)
+        await asyncio.wait_for(held, 1)
+
+    asyncio.run(scenario())
+    assert stats.get_value('nbb/db_queue/pauses') == 1
+    assert not middleware.paused
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from nbb.pipelines import NbbPipeline
+from nbb.profiling import Profiler, ProfilingExtension
+from nbb.spiders.nbbspider import GameSpider
+
+
+def test_nested_calls_are_timed_exclusively():
+    profiler = Profiler()
+    inner = profiler.wrap('inner', lambda: time.sleep(0.1))
+
+    def outer_body():
+        time.sleep(0.05)
+        inner()
+    outer = profiler.wrap('outer', outer_body)
+    outer()
+
+    assert profiler.calls == {'outer': 1, 'inner': 1}
+    assert profiler.seconds['inner'] >= 0.1
+    assert 0.05 <= profiler.seconds['outer'] < 0.09
+
+
+def test_generator_is_timed_only_while_it_runs():
+    profiler = Profiler()
+
+    def callback():
+        for number in range(3):
+            time.sleep(0.01)
+            yield number
+    wrapped = profiler.wrap('callback', callback)
+
+    values = []
+    for value in wrapped():
+        # Tempo do consumidor (o engine do Scrapy), fora do callback
+        time.sleep(0.05)
+        values.append(value)
+
+    assert values == [0, 1, 2]
+    assert profiler.calls['callback'] == 1
+    assert 0.03 <= profiler.seconds['callback'] < 0.1
+
+
+def test_async_generator_does_not_count_awaited_time():
+    profiler = Profiler()
+
+    async def failing():
+        raise ValueError('falhou')
+
+    async def callback():
+        time.sleep(0.02)
+        # Espera fora do reactor, como o parse nos processos do pool
+        await asyncio.sleep(0.1)
+        try:
+            await failing()
+        except ValueError as error:
+            yield str(error)
+        yield 'fim'
+    wrapped = profiler.wrap('callback', callback)
+
+    async def consume():
+        return [value async for value in wrapped()]
+
+    assert asyncio.run(consume()) == ['falhou', 'fim']
+    assert profiler.calls['callback'] == 1
+    assert 0.02 <= profiler.seconds['callback'] < 0.08
+
+
+def test_extension_is_off_unless_enabled():
+    with pytest.raises(NotConfigured):
+        ProfilingExtension.from_crawler(get_crawler(GameSpider))
+
+
+def test_extension_wraps_callbacks_and_restores_them(tmp_path):
+    originals = {name: GameSpider.__dict__[name] for name in ('parse', 'parse_athlete_in_pool')}
+    process_item = NbbPipeline.process_item
+    crawler = get_crawler(GameSpider, settings_dict={'PROFILING_ENABLED': True, 'PROFILING_DIR': str(tmp_path)})
+    extension = ProfilingExtension.from_crawler(crawler)
+    try:
+        assert GameSpider.parse is not originals['parse']
+        assert GameSpider.parse_athlete_in_pool is not originals['parse_athlete_in_pool']
+        assert GameSpider.parse_athlete_in_pool.__wrapped__ is originals['parse_athlete_in_pool']
+        assert NbbPipeline.process_item is not process_item
+        extension.profiler.wrap('teste', lambda: None)()
+    finally:
+        extension.spider_closed(GameSpider)
+
+    assert {name: GameSpider.__dict__[name] for name in originals} == originals
+    assert NbbPipeline.process_item is process_item
+    directory, = os.listdir(tmp_path)
+    files = os.listdir(tmp_path / directory)
+    assert {'teste.prof', 'flamegraph.collapsed', 'summary.txt'} <= set(files)
+    with open(tmp_path / directory / 'summary.txt') as summary:
+        assert summary.read().startswith('teste\t1 chamadas\t')
@@ -0,0 +1,127 @@
+import datetime
+import json
+import select
+
+import psycopg2
+import pytest
+
+from nbb import read_api
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import DB_CONFIG, GAME_CHANGES_CHANNEL
+from nbb.read_api import ReadService, ViewCache, change_tags
+
+SEASON = 'NBB 2023/2024'
+
+
+def game(game_id, home_team_id, away_team_id, home_team_score=80):
+    return (game_id, datetime.date(2023, 10, game_id), datetime.time(19, 0), home_team_id, away_team_id,
+            home_team_score, 75, '1ª Rodada', 'Fase de Classificação', SEASON, 'Ginásio', None)
+
+
+def shot(game_id, player_id, team_id):
+    return (player_id, game_id, team_id, '1', datetime.time(9, 30), 'shot made p2', 50.0, 50.0, True, 1.5, 'paint')
+
+
+@pytest.fixture
+def writer(db):
+    writer = BatchWriter()
+    for team_id in ('a', 'b', 'c', 'd'):
+        writer.add('teams', (team_id, team_id.upper(), None))
+    for player_id, team_id in ((1, 'a'), (2, 'c')):
+        writer.add('players', (player_id, f"Jogador {player_id}", None))
+        writer.add('player_teams_by_season', (player_id, team_id, SEASON, '10'))
+    writer.add('games', game(1, 'a', 'b'))
+    writer.add('games', game(2, 'c', 'd'))
+    writer.add('shots', shot(1, 1, 'a'))
+    writer.add('shots', shot(2, 2, 'c'))
+    writer.flush()
+    return writer
+
+
+def get(service, path, **query):
+    status, body, etag = service.resolve(path, {key: [value] for key, value in query.items()})
+    return status, json.loads(body), etag
+
+
+def test_views_are_served_from_the_cache(writer):
+    service = ReadService(ViewCache())
+
+    status, schedule, etag = get(service, '/schedule', season=SEASON)
+    assert status == 200
+    assert [g['id'] for g in schedule['games']] == [1, 2]
+    assert get(service, '/schedule', season=SEASON) == (200, schedule, etag)
+    assert (service.cache.hits, service.cache.misses) == (1, 1)
+
+    assert get(service, '/schedule')[0] == 400
+    assert get(service, '/games/99')[0] == 404
+    assert get(service, '/unknown')[0] == 404
+
+
+def test_change_evicts_only_the_views_of_its_teams(writer):
+    service = ReadService(ViewCache())
+    get(service, '/teams/a/roster', season=SEASON)
+    get(service, '/teams/c/roster', season=SEASON)
+    get(service, '/players/1/shots', season=SEASON)
+    get(service, '/players/2/shots', season=SEASON)
+
+    # O pipeline reescreve o jogo 2 (c x d) com um arremesso a mais do jogador 2; a API recebe as mudanças pelo NOTIFY
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    conn.cursor().execute(f"LISTEN {GAME_CHANGES_CHANNEL};")
+    writer.add('games', game(2, 'c', 'd', home_team_score=90))
+    writer.add('shots', shot(2, 2, 'c'))
+    writer.flush()
+    select.select([conn], [], [], 5)
+    conn.poll()
+    changes = [json.loads(notify.payload) for notify in conn.notifies]
+    conn.close()
+
+    assert [change['kind'] for change in changes] == ['score_update', 'shots_appended']
+    assert change_tags(changes[0]) == {'game:2', f"season:{SEASON}", f"team:c:{SEASON}", f"team:d:{SEASON}"}
+    assert service.cache.invalidate(change_tags(changes[0])) == 2
+
+    assert service.cache.get(('team_roster', 'a', SEASON)) is not None
+    assert service.cache.get(('player_shot_chart', 1, SEASON)) is not None
+    assert service.cache.get(('team_roster', 'c', SEASON)) is None
+    assert len(get(service, '/players/2/shots', season=SEASON)[1]['shots']) == 2
+
+
+def test_invalidation_during_the_read_is_not_overwritten(writer, monkeypatch):
+    service = ReadService(ViewCache())
+    routes = list(read_api.ROUTES)
+    pattern, convert, query_params, view = next(route for route in routes if route[3] is read_api.game_detail)
+
+    def game_detail(db, game_id):
+        result = view(db, game_id)
+        # A mudança do jogo é confirmada e notificada depois da leitura, antes do cache.set
+        service.cache.invalidate({f"game:{game_id}"})
+        return result
+
+    game_detail.__name__ = 'game_detail'
+    routes[routes.index((pattern, convert, query_params, view))] = (pattern, convert, query_params, game_detail)
+    monkeypatch.setattr(read_api, 'ROUTES', routes)
+
+    assert get(service, '/games/1')[0] == 200
+    assert service.cache.get(('game_detail', 1)) is None
+
+    monkeypatch.undo()
+    get(service, '/games/1')
+    assert service.cache.get(('game_detail', 1)) is not None
+
+
+def test_set_after_clear_or_unrelated_invalidation():
+    cache = ViewCache(maxsize=2)
+
+    generation = cache.begin()
+    cache.invalidate({'game:2'})
+    assert cache.set('one', '{}', None, {'game:1'}, generation)
+
+    generation = cache.begin()
+    cache.clear()
+    assert not cache.set('two', '{}', None, {'game:1'}, generation)
+
+    # Com mais tags invalidadas do que cabem, as leituras em andamento deixam de ser guardadas
+    generation = cache.begin()
+    cache.invalidate({'game:3', 'game:4', 'game:5'})
+    assert not cache.set('three', '{}', None, {'game:1'}, generation)
+    assert cache.set('three', '{}', None, {'game:1'}, cache.begin())
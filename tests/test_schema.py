@@ -0,0 +1,92 @@
+import threading
+
+import psycopg2
+import pytest
+
+from nbb import schema
+from nbb.benchmark import create_database, drop_database
+from nbb.db_manager import DB_CONFIG, close_pool
+
+
+@pytest.fixture
+def empty_database(database):
+    """Banco vazio, sem nenhuma migração, no lugar do banco dos testes."""
+    name = f"{database}_schema"
+    close_pool()
+    create_database(name)
+    DB_CONFIG['database'] = name
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    try:
+        yield conn.cursor()
+    finally:
+        conn.close()
+        close_pool()
+        DB_CONFIG['database'] = database
+        drop_database(name, database)
+
+
+def applied(cur):
+    cur.execute("SELECT version FROM schema_migrations ORDER BY version;")
+    return [row[0] for row in cur.fetchall()]
+
+
+def test_concurrent_crawlers_apply_each_migration_once(empty_database, monkeypatch):
+    monkeypatch.setattr(schema, 'MIGRATION_LOCK_POLL_INTERVAL', 0.01)
+    latest = schema.latest_version()
+    start = threading.Barrier(4)
+    results, errors = [], []
+
+    def crawler_opening():
+        start.wait()
+        try:
+            results.append(schema.ensure_schema())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=crawler_opening) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == [latest] * 4
+    assert applied(empty_database) == [migration.version for migration in schema.migrations()]
+
+
+def test_migrate_waits_for_the_lock_holder(empty_database, monkeypatch):
+    monkeypatch.setattr(schema, 'MIGRATION_LOCK_POLL_INTERVAL', 0.01)
+    empty_database.execute("SELECT pg_advisory_lock(%s);", (schema.MIGRATION_LOCK,))
+    thread = threading.Thread(target=schema.migrate)
+    thread.start()
+    thread.join(0.3)
+    assert thread.is_alive()
+    assert schema.current_version(empty_database) == 0
+
+    empty_database.execute("SELECT pg_advisory_unlock(%s);", (schema.MIGRATION_LOCK,))
+    thread.join(10)
+    assert not thread.is_alive()
+    assert schema.current_version(empty_database) == schema.latest_version()
+
+
+def test_pending_migrations_without_auto_migrate_fail(empty_database):
+    assert schema.migrate(target=1) == 1
+
+    with pytest.raises(RuntimeError):
+        schema.ensure_schema(auto_migrate=False)
+    assert schema.current_version(empty_database) == 1
+    assert schema.ensure_schema() == schema.latest_version()
+
+
+def test_invalid_index_from_an_interrupted_migration_is_rebuilt(empty_database):
+    schema.migrate(target=1)
+    # Estado de um CREATE INDEX CONCURRENTLY interrompido: o índice existe, mas inválido
+    empty_database.execute("CREATE INDEX shots_game_idx ON shots (game_id);")
+    empty_database.execute("UPDATE pg_index SET indisvalid = false WHERE indexrelid = 'shots_game_idx'::regclass;")
+
+    schema.migrate()
+
+    empty_database.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = 'shots_game_idx'::regclass;")
+    assert empty_database.fetchone() == (True,)
+    assert applied(empty_database) == [migration.version for migration in schema.migrations()]
@@ -0,0 +1,91 @@
+import datetime
+
+import pytest
+
+from nbb import shot_arrays
+from nbb.batch_writer import BatchWriter
+from nbb.db_manager import DatabaseManager, DB_CONFIG
+from nbb.shot_enrichment import ZONE_PAINT, ZONE_CORNER_THREE
+
+SEASON = 'NBB 2023/2024'
+
+
+def game(game_id):
+    return (game_id, datetime.date(2023, 10, 1), datetime.time(19, 0), 'home', 'away',
+            80, 75, '1ª Rodada', 'Fase de Classificação', SEASON, 'Ginásio', f"https://lnb.com.br/partidas/{game_id}/")
+
+
+SHOTS = [
+    (1, 1, 'home', '1', datetime.time(9, 30), 'shot made p2', 12.34, 56.78, True, 1.5, ZONE_PAINT),
+    (2, 1, 'away', '4', datetime.time(0, 5), 'shot miss p3', 99.99, 0.01, False, 7.25, ZONE_CORNER_THREE),
+    # Quarto não numérico, relógio, distância e resultado desconhecidos
+    (2, 1, 'away', 'PR', None, 'foul', 50.0, 50.0, None, None, None),
+]
+
+
+@pytest.fixture
+def writer(db):
+    writer = BatchWriter()
+    writer.add('teams', ('home', 'Casa', 'https://x/casa.png'))
+    writer.add('teams', ('away', 'Fora', 'https://x/fora.png'))
+    writer.add('players', (1, 'Jogador 1', None))
+    writer.add('players', (2, 'Jogador 2', None))
+    writer.add('games', game(1))
+    return writer
+
+
+def fetch(game_id):
+    with DatabaseManager(DB_CONFIG) as manager:
+        return shot_arrays.fetch_game(manager, game_id)
+
+
+def test_packed_shots_round_trip_to_the_original_values(writer):
+    for shot in SHOTS:
+        writer.add('shots', shot)
+    writer.flush()
+
+    shots, home_team_id, away_team_id = fetch(1)
+
+    assert shots.dtype.itemsize == 16
+    assert (home_team_id, away_team_id) == ('home', 'away')
+    assert shot_arrays.to_columns(shots) == {
+        'player_id': [1, 2, 2],
+        'x': [12.34, 99.99, 50.0],
+        'y': [56.78, 0.01, 50.0],
+        'seconds': [570, 5, None],
+        'distance': [1.5, 7.25, None],
+        'quarter': [1, 4, 0],
+        'team': ['home', 'away', 'away'],
+        'made': [True, False, None],
+        'zone': [ZONE_PAINT, ZONE_CORNER_THREE, None],
+    }
+
+
+def test_array_follows_the_shots_table(writer, db):
+    writer.add('shots', SHOTS[0])
+    writer.flush()
+    assert len(fetch(1)[0]) == 1
+
+    # Um lote posterior só com arremessos do mesmo jogo reempacota o jogo inteiro
+    writer.add('shots', SHOTS[1])
+    writer.flush()
+    shots = fetch(1)[0]
+    assert shots['player_id'].tolist() == [1, 2]
+    db.execute("SELECT shot_count, format_version FROM game_shot_arrays WHERE game_id = 1;")
+    assert db.fetchone() == (2, shot_arrays.FORMAT_VERSION)
+
+
+def test_game_without_shots_has_an_empty_array(writer):
+    writer.flush()
+
+    shots, _, _ = fetch(1)
+    assert len(shots) == 0
+    assert fetch(2) is None
+
+
+def test_unknown_format_version_is_rejected(writer, db):
+    writer.flush()
+    db.execute("UPDATE game_shot_arrays SET format_version = %s;", (shot_arrays.FORMAT_VERSION + 1,))
+
+    with pytest.raises(ValueError):
+        fetch(1)
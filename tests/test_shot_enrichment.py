@@ -0,0 +1,64 @@
+import os
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from nbb import settings
+from nbb.extraction import extract_shots, parse_game_report
+from nbb.shot_enrichment import ShotEnricher, MADE_TOKENS, MISSED_TOKENS
+from nbb.spiders.nbbspider import GameSpider
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'game_report.html')
+META = {'game_id': 1, 'season': 'NBB 2023/2024', 'home_team_id': 'home', 'away_team_id': 'away'}
+
+
+def game_report(replace=None):
+    with open(FIXTURE, 'rb') as f:
+        body = f.read()
+    if replace:
+        body = body.replace(*replace)
+    url = 'https://lnb.com.br/partidas/1/'
+    return HtmlResponse(url, body=body, encoding='utf-8', request=Request(url, meta=META))
+
+
+def test_settings_use_the_module_tokens():
+    assert tuple(settings.SHOT_MADE_TOKENS) == MADE_TOKENS
+    assert tuple(settings.SHOT_MISSED_TOKENS) == MISSED_TOKENS
+
+
+def test_every_shot_of_the_game_report_is_classified():
+    shots = ShotEnricher().enrich_items(extract_shots(game_report(), 1, 'home', 'away'))
+
+    assert [(shot['player_id'], shot['team_id'], shot['shot_made'], shot['shot_zone']) for shot in shots] == [
+        (1041, 'home', True, 'paint'),
+        (1041, 'home', False, 'corner_3'),
+        (1187, 'home', True, 'above_break_3'),
+        (1187, 'home', False, 'paint'),
+        (2210, 'away', True, 'paint'),
+        (2210, 'away', False, 'corner_3'),
+        (2305, 'away', True, 'above_break_3'),
+        (2305, 'away', False, None),
+    ]
+    assert shots[0]['shot_distance'] == 0.67
+    assert shots[-1]['shot_distance'] is None
+
+
+def test_process_pool_parsing_matches_the_spider():
+    response = game_report()
+    players, shots = parse_game_report(response.body, response.encoding, META, MADE_TOKENS, MISSED_TOKENS)
+
+    assert [player['player_id'] for player in players] == [2210, 2305, 1041, 1187]
+    assert shots == [dict(shot) for shot in ShotEnricher().enrich_items(extract_shots(response, 1, 'home', 'away'))]
+
+
+def test_unclassified_shots_are_counted_in_the_stats():
+    crawler = get_crawler(GameSpider)
+    spider = GameSpider.from_crawler(crawler)
+
+    # O site passa a marcar os acertos com outra classe
+    shots = list(spider.parse_shots(game_report((b'shot made', b'shot scored'))))
+    shots += list(spider.parse_shots(game_report((b'shot made', b'shot scored'))))
+
+    assert [shot['shot_made'] for shot in shots[:4]] == [None, False, None, False]
+    assert crawler.stats.get_value('nbb/shots/unclassified') == 8
+    assert spider.unclassified_shot_types == {'shot scored p2', 'shot scored p3'}
@@ -0,0 +1,33 @@
+import os
+
+from nbb.spool import SpoolWriter, load, LOADED_DIR
+
+
+def test_writers_of_one_crawl_get_distinct_runs(tmp_path):
+    assert SpoolWriter(str(tmp_path)).run_id != SpoolWriter(str(tmp_path)).run_id
+
+
+def test_same_file_name_in_two_tables_is_loaded_for_both(db, tmp_path):
+    directory = str(tmp_path)
+    # Dois writers com a mesma execução e a mesma sequência: assets/<run>-00001 e teams/<run>-00001
+    assets = SpoolWriter(directory, run_id='20240101T000000-1')
+    teams = SpoolWriter(directory, run_id='20240101T000000-1')
+    assets.write('assets', ('https://x/casa.png', 'abc', 'full/abc.jpg'))
+    teams.write('teams', ('home', 'Casa', 'https://x/casa.png'))
+    assets.close()
+    teams.close()
+    names = {table: os.listdir(os.path.join(directory, table)) for table in ('assets', 'teams')}
+    assert names['assets'] == names['teams']
+
+    files, rows, failed = load(directory)
+
+    assert (files, rows, failed) == (2, 2, None)
+    db.execute("SELECT id, logo_key FROM teams;")
+    assert db.fetchall() == [('home', 'full/abc.jpg')]
+    db.execute("SELECT table_name FROM spool_loads ORDER BY table_name;")
+    assert db.fetchall() == [('assets',), ('teams',)]
+    for table in ('assets', 'teams'):
+        assert os.listdir(os.path.join(directory, LOADED_DIR, table)) == names[table]
+
+    # Rodar de novo não recarrega nada
+    assert load(directory) == (0, 0, None)